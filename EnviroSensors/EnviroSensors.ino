@@ -42,6 +42,15 @@ static unsigned long lastReconnectAttempt = 0;
 unsigned long reconnectInterval = 3000; // Start with 3 seconds
 const unsigned long maxReconnectInterval = 60000; // Max 1 minute between attempts
 bool wasConnected = false;
+bool serverRetryHint = false; // Set when the server asks us to come back later
+
+// Adaptive sampling, adjusted by {"type": "control"} messages when the server is under load
+const unsigned long DEFAULT_SEND_INTERVAL = 2000; // 2 seconds between sends
+const unsigned long KEEPALIVE_SEND_INTERVAL = 60000; // Send at least once a minute even inside the deadband
+const int MAX_BATCH_SIZE = 20;
+unsigned long sendInterval = DEFAULT_SEND_INTERVAL;
+int sendBatchSize = 1;
+float sendDeadband = 0;
 
 // Memory monitoring
 static unsigned long lastMemReport = 0;
@@ -57,6 +66,7 @@ void webSocketEvent(WStype_t type, uint8_t * payload, size_t length) {
 
       // Reset reconnect interval on successful connection
       reconnectInterval = 3000;
+      webSocket.setReconnectInterval(reconnectInterval);
       wasConnected = true;
 
       // Report memory
@@ -65,6 +75,17 @@ void webSocketEvent(WStype_t type, uint8_t * payload, size_t length) {
 
     case WStype_DISCONNECTED:
       Serial.println("⚠️ WebSocket disconnected!");
+
+      // During a reconnect storm the server tells each device when to retry;
+      // let the library reconnect after that randomized delay instead of our backoff
+      if (serverRetryHint) {
+        serverRetryHint = false;
+        wasConnected = false;
+        lastReconnectAttempt = currentTime;
+        webSocket.setReconnectInterval(reconnectInterval);
+        Serial.printf("⏳ Server busy, reconnecting in %lu ms\n", reconnectInterval);
+        break;
+      }
       Serial.println("🔄 Will attempt to reconnect automatically...");
 
       // Implement exponential backoff for reconnection
@@ -127,6 +148,24 @@ void webSocketEvent(WStype_t type, uint8_t * payload, size_t length) {
             Serial.println("⚠️ Server reported an issue with the data");
           }
         }
+        // Check if the server turned us away and suggested when to retry
+        else if (doc.containsKey("type") && doc["type"] == "retry") {
+          reconnectInterval = min((unsigned long)(doc["retry_after"].as<float>() * 1000), maxReconnectInterval * 2);
+          serverRetryHint = true;
+          Serial.printf("⏳ Server busy, asked to retry in %lu ms\n", reconnectInterval);
+        }
+        // Check if the server wants us to sample less (or more) often
+        else if (doc.containsKey("type") && doc["type"] == "control") {
+          sendInterval = doc["send_interval_ms"] | DEFAULT_SEND_INTERVAL;
+          sendBatchSize = constrain((int)(doc["batch_size"] | 1), 1, MAX_BATCH_SIZE);
+          sendDeadband = doc["deadband"] | 0.0;
+          Serial.printf("🎚️ Sampling control (level %d): every %lu ms, batches of %d, deadband %.2f\n",
+                        (int)(doc["level"] | 0), sendInterval, sendBatchSize, sendDeadband);
+        }
+        // Check if this is an ack for a batch of readings
+        else if (doc.containsKey("type") && doc["type"] == "ack") {
+          Serial.println("✅ Batch of readings acknowledged by server");
+        }
         // Check if this is a pong response
         else if (doc.containsKey("type") && doc["type"] == "pong") {
           Serial.println("📡 Pong response received from server");
@@ -286,9 +325,34 @@ float lastTemp = 0;
 float lastHumid = 0;
 bool lastObstacle = false;
 unsigned long lastSendTime = 0;
-const unsigned long SEND_INTERVAL = 2000; // 2 seconds between sends (reduced from 3 seconds)
 bool firstReading = true;
 
+// Last reading actually sent, for the deadband check
+float lastSentTemp = 0;
+float lastSentHumid = 0;
+bool lastSentObstacle = false;
+unsigned long lastSentAt = 0;
+bool sentAnyReading = false;
+
+// Readings waiting to go out as one {"type": "readings"} message
+String pendingBatch = "";
+int pendingBatchCount = 0;
+
+void flushReadingBatch() {
+  if (pendingBatchCount == 0) {
+    return;
+  }
+  String payload = "{\"type\":\"readings\",\"readings\":[" + pendingBatch + "]}";
+  if (WiFi.status() == WL_CONNECTED) {
+    Serial.printf("📤 Sending batch of %d readings to server\n", pendingBatchCount);
+    webSocket.sendTXT(payload);
+  } else {
+    Serial.println("❌ Cannot send batch - WiFi not connected");
+  }
+  pendingBatch = "";
+  pendingBatchCount = 0;
+}
+
 void loop() {
   // Get current time
   unsigned long currentTime = millis();
@@ -357,7 +421,7 @@ void loop() {
   }
 
   // Only send data at the specified interval
-  if (currentTime - lastSendTime >= SEND_INTERVAL) {
+  if (currentTime - lastSendTime >= sendInterval) {
     lastSendTime = currentTime;
 
     // IR Sensor Reading
@@ -421,6 +485,39 @@ void loop() {
       // Use the test value instead of the actual sensor reading
       doc["obstacle"] = testObstacle;
 
+      // Skip readings inside the server-requested deadband, but never an obstacle change
+      float sentTemp = doc["temperature"];
+      float sentHumid = doc["humidity"];
+      bool obstacleChanged = sentAnyReading && testObstacle != lastSentObstacle;
+      bool inDeadband = sentAnyReading && sendDeadband > 0 && !obstacleChanged &&
+                        fabs(sentTemp - lastSentTemp) <= sendDeadband &&
+                        fabs(sentHumid - lastSentHumid) <= sendDeadband &&
+                        currentTime - lastSentAt < KEEPALIVE_SEND_INTERVAL;
+      if (inDeadband) {
+        Serial.println("ℹ️ Reading within deadband, not sending");
+        return;
+      }
+      lastSentTemp = sentTemp;
+      lastSentHumid = sentHumid;
+      lastSentObstacle = testObstacle;
+      lastSentAt = currentTime;
+      sentAnyReading = true;
+
+      // When asked to batch, queue the reading; obstacle changes flush the batch right away
+      if (sendBatchSize > 1 || pendingBatchCount > 0) {
+        String item;
+        serializeJson(doc, item);
+        if (pendingBatchCount > 0) {
+          pendingBatch += ",";
+        }
+        pendingBatch += item;
+        pendingBatchCount++;
+        if (pendingBatchCount >= sendBatchSize || obstacleChanged) {
+          flushReadingBatch();
+        }
+        return;
+      }
+
       // Add a timestamp in ISO8601 format (the server will override this with its own timestamp)
       // This is just to ensure the JSON structure matches what the app expects
       unsigned long epochTime = currentTime / 1000; // Convert milliseconds to seconds
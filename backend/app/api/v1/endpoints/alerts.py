@@ -0,0 +1,129 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+import logging
+from datetime import datetime, timezone
+
+from app.core.auth import get_current_active_user
+from app.core.alerts import alert_engine, ALERT_METRICS, ALERT_OPERATORS, ALERT_MAX_RULES_PER_USER
+from app.core.db_utils import (
+    get_device, list_alert_rules, get_alert_rule, count_alert_rules,
+    create_alert_rule, update_alert_rule, delete_alert_rule
+)
+from app.db.database import get_db
+from app.schemas.alert import AlertRuleCreate, AlertRuleUpdate
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+def _cors_headers(methods: str) -> dict:
+    return {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": methods,
+        "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+    }
+
+def _validate_rule(operator=None, duration_seconds=None, name=None):
+    if operator is not None and operator not in ALERT_OPERATORS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"operator must be one of {', '.join(ALERT_OPERATORS)}")
+    if duration_seconds is not None and duration_seconds < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="duration_seconds must not be negative")
+    if name is not None and not 1 <= len(name.strip()) <= 64:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Rule name must be 1-64 characters")
+
+@router.options("/rules", status_code=status.HTTP_200_OK)
+async def alert_rules_options():
+    """Handle CORS preflight requests for alert rules"""
+    from app.core.serialization import JSONResponse
+
+    return JSONResponse(content={}, headers=dict(_cors_headers("GET, POST, OPTIONS"), **{"Access-Control-Max-Age": "86400"}))
+
+@router.get("/rules")
+async def get_alert_rules(current_user: dict = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    """List the current user's alert rules"""
+    from app.core.serialization import JSONResponse
+
+    return JSONResponse(
+        content={"rules": list_alert_rules(db, current_user['id'])},
+        headers=_cors_headers("GET, POST, OPTIONS")
+    )
+
+@router.post("/rules", status_code=status.HTTP_201_CREATED)
+async def create_rule(
+    rule: AlertRuleCreate,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Create an alert rule, e.g. temperature > 30 for 300 seconds"""
+    from app.core.serialization import JSONResponse
+
+    if rule.metric not in ALERT_METRICS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"metric must be one of {', '.join(ALERT_METRICS)}")
+    _validate_rule(rule.operator, rule.duration_seconds, rule.name)
+    if rule.device_id is not None and not get_device(db, rule.device_id, current_user['id']):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
+    if count_alert_rules(db, current_user['id']) >= ALERT_MAX_RULES_PER_USER:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {ALERT_MAX_RULES_PER_USER} alert rules per user")
+
+    values = rule.model_dump()
+    values["name"] = rule.name.strip()
+    created = create_alert_rule(db, current_user['id'], values, datetime.now(timezone.utc))
+    if not created:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not create alert rule")
+    alert_engine.add_rule(created)
+
+    logger.info(f"Created alert rule {created['id']} for user {current_user['id']}: {created['metric']} {created['operator']} {created['threshold']} for {created['duration_seconds']}s")
+    return JSONResponse(status_code=status.HTTP_201_CREATED, content=created, headers=_cors_headers("GET, POST, OPTIONS"))
+
+@router.options("/rules/{rule_id}", status_code=status.HTTP_200_OK)
+async def alert_rule_options(rule_id: int):
+    """Handle CORS preflight requests for a single alert rule"""
+    from app.core.serialization import JSONResponse
+
+    return JSONResponse(content={}, headers=dict(_cors_headers("GET, PATCH, DELETE, OPTIONS"), **{"Access-Control-Max-Age": "86400"}))
+
+@router.get("/rules/{rule_id}")
+async def get_rule(rule_id: int, current_user: dict = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    """Get one of the current user's alert rules"""
+    from app.core.serialization import JSONResponse
+
+    rule = get_alert_rule(db, rule_id, current_user['id'])
+    if not rule:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Alert rule not found")
+    return JSONResponse(content=rule, headers=_cors_headers("GET, PATCH, DELETE, OPTIONS"))
+
+@router.patch("/rules/{rule_id}")
+async def update_rule(
+    rule_id: int,
+    changes: AlertRuleUpdate,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Change an alert rule's name, condition, duration or active flag"""
+    from app.core.serialization import JSONResponse
+
+    values = changes.model_dump(exclude_none=True)
+    _validate_rule(values.get("operator"), values.get("duration_seconds"), values.get("name"))
+    if "name" in values:
+        values["name"] = values["name"].strip()
+
+    updated = update_alert_rule(db, rule_id, current_user['id'], values)
+    if not updated:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Alert rule not found")
+    alert_engine.add_rule(updated)
+
+    logger.info(f"Updated alert rule {rule_id} for user {current_user['id']}: {values}")
+    return JSONResponse(content=updated, headers=_cors_headers("GET, PATCH, DELETE, OPTIONS"))
+
+@router.delete("/rules/{rule_id}")
+async def delete_rule(rule_id: int, current_user: dict = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    """Delete an alert rule"""
+    from app.core.serialization import JSONResponse
+
+    if not delete_alert_rule(db, rule_id, current_user['id']):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Alert rule not found")
+    alert_engine.remove_rule(rule_id)
+
+    logger.info(f"Deleted alert rule {rule_id} for user {current_user['id']}")
+    return JSONResponse(content={"message": "Alert rule deleted", "id": rule_id}, headers=_cors_headers("GET, PATCH, DELETE, OPTIONS"))
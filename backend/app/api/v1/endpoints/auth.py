@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 from datetime import timedelta, datetime, timezone
 from pydantic import BaseModel, EmailStr
 import secrets
@@ -11,11 +12,14 @@ from app.core.auth import (
     authenticate_user,
     create_access_token,
     get_current_active_user,
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_password_async,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from app.core import db_utils
+from app.core.user_cache import user_cache
+from app.core.login_throttle import client_ip, login_throttle, persist_lockout
+from app.core.device_tokens import create_device_token, decode_device_token, device_token_denylist
 from app.core.email import send_token_email, send_password_reset_email
 from app.db.database import get_db
 from app.models.user import User
@@ -37,6 +41,12 @@ class ResetPasswordRequest(BaseModel):
 class EmailTokenRequest(BaseModel):
     email: EmailStr
 
+class DeviceTokenRequest(BaseModel):
+    device_id: int
+
+class RevokeDeviceTokenRequest(BaseModel):
+    device_token: str
+
 router = APIRouter()
 
 @router.post("/register", status_code=status.HTTP_201_CREATED)
@@ -52,7 +62,7 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(username=user.username, email=user.email, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
@@ -60,15 +70,46 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
 
     return {"message": "User created successfully"}
 
+def _client_ip(request: Request) -> str:
+    # Behind Render's proxy the socket peer is the proxy, so use the hop it appended
+    return client_ip(request.headers.get("x-forwarded-for"), request.client.host if request.client else None)
+
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: Session = Depends(get_db)
+):
+    # Reject throttled usernames and IPs before spending any bcrypt time on them
+    client_ip = _client_ip(request)
+    retry_after = login_throttle.check(form_data.username, client_ip)
+    if retry_after is not None:
+        logger.warning(f"Login throttled for username '{form_data.username}' from {client_ip}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts, please try again later",
+            headers={"Retry-After": str(max(int(retry_after), 1))},
+        )
+
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
+        failed_attempts = login_throttle.record_failure(form_data.username, client_ip)
+        if failed_attempts is not None:
+            # Background tasks only run with a returned response, not a raised HTTPException
+            from starlette.background import BackgroundTask
+            from app.core.responses import CORSJSONResponse
+            return CORSJSONResponse(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                content={"detail": "Incorrect username or password"},
+                headers={"WWW-Authenticate": "Bearer"},
+                background=BackgroundTask(persist_lockout, sessionmaker(bind=db.get_bind()), form_data.username, failed_attempts)
+            )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    login_throttle.record_success(form_data.username)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user['username']}, expires_delta=access_token_expires
@@ -98,7 +139,7 @@ async def update_user_profile_options():
     Handle OPTIONS requests for the update_user_profile endpoint.
     This is needed for CORS preflight requests.
     """
-    from fastapi.responses import JSONResponse
+    from app.core.serialization import JSONResponse
 
     # Return a response with CORS headers
     return JSONResponse(
@@ -117,7 +158,7 @@ async def update_user_profile(
     current_user: dict = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    from fastapi.responses import JSONResponse
+    from app.core.serialization import JSONResponse
 
     try:
         # Check if username is being changed and if it already exists
@@ -160,6 +201,7 @@ async def update_user_profile(
             "user_id": current_user['id']
         })
         db.commit()
+        user_cache.invalidate_user(current_user['id'])
 
         # Return updated user data with CORS headers
         return JSONResponse(
@@ -193,7 +235,7 @@ async def change_password_options():
     Handle OPTIONS requests for the change-password endpoint.
     This is needed for CORS preflight requests.
     """
-    from fastapi.responses import JSONResponse
+    from app.core.serialization import JSONResponse
 
     # Return a response with CORS headers
     return JSONResponse(
@@ -212,11 +254,11 @@ async def change_password(
     current_user: dict = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    from fastapi.responses import JSONResponse
+    from app.core.serialization import JSONResponse
 
     try:
         # Verify current password
-        if not verify_password(password_change.current_password, current_user['hashed_password']):
+        if not await verify_password_async(password_change.current_password, current_user['hashed_password']):
             # Return a response with CORS headers
             return JSONResponse(
                 status_code=400,
@@ -229,7 +271,7 @@ async def change_password(
             )
 
         # Generate new password hash
-        hashed_password = get_password_hash(password_change.new_password)
+        hashed_password = await get_password_hash_async(password_change.new_password)
 
         # Update password using raw SQL
         query = text("UPDATE users SET hashed_password = :hashed_password WHERE id = :user_id")
@@ -238,6 +280,7 @@ async def change_password(
             "user_id": current_user['id']
         })
         db.commit()
+        user_cache.invalidate_user(current_user['id'])
 
         # Return a response with CORS headers
         return JSONResponse(
@@ -248,6 +291,8 @@ async def change_password(
                 "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
             }
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error changing password: {e}")
 
@@ -425,13 +470,14 @@ async def reset_password(
         # Update the user's password
         try:
             # Generate new password hash
-            hashed_password = get_password_hash(request.new_password)
+            hashed_password = await get_password_hash_async(request.new_password)
 
             # Update password using our safe function
             success = db_utils.update_user_password(db, user['id'], hashed_password)
 
             if success:
                 logger.info(f"Password reset successful for user: {user['username']}")
+                user_cache.invalidate_user(user['id'])
 
                 # Try to clear the reset token if it exists
                 db_utils.store_reset_token(db, user['id'], None, None)
@@ -439,6 +485,8 @@ async def reset_password(
                 return {"message": "Password has been reset successfully"}
             else:
                 raise Exception("Failed to update password")
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error updating password: {e}")
             raise HTTPException(
@@ -454,3 +502,63 @@ async def reset_password(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred"
         )
+
+@router.post("/device-token", status_code=status.HTTP_201_CREATED)
+async def issue_device_token(
+    request: DeviceTokenRequest,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Issue a long-lived device credential for one of the user's registered devices.
+    The token is verified with an HMAC alone, so device reconnects never hit the database.
+    """
+    device = db_utils.get_device(db, request.device_id, current_user['id'])
+    if not device:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device not found"
+        )
+
+    token, token_id = create_device_token(current_user['id'], device['id'])
+    logger.info(f"Issued device token {token_id} for device {device['id']} ('{device['name']}') of user {current_user['id']}")
+    return {"device_token": token, "token_id": token_id, "device_id": device['id']}
+
+@router.post("/device-token/revoke", status_code=status.HTTP_200_OK)
+async def revoke_device_token(
+    request: RevokeDeviceTokenRequest,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Revoke a device token. It is rejected on this worker immediately and on
+    other workers after their next denylist refresh.
+    """
+    claims = decode_device_token(request.device_token)
+    if claims is None or claims['user_id'] != current_user['id']:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid device token"
+        )
+
+    if not device_token_denylist.is_revoked(claims['token_id']):
+        try:
+            db.execute(
+                text("""
+                INSERT INTO revoked_device_tokens (token_id, user_id, revoked_at)
+                VALUES (:token_id, :user_id, :revoked_at)
+                """),
+                {
+                    "token_id": claims['token_id'],
+                    "user_id": current_user['id'],
+                    "revoked_at": datetime.now(timezone.utc)
+                }
+            )
+            db.commit()
+        except IntegrityError:
+            # Already revoked on another worker
+            db.rollback()
+        device_token_denylist.add(claims['token_id'])
+
+    logger.info(f"Revoked device token {claims['token_id']} for device {claims['device_id']}")
+    return {"message": "Device token revoked", "token_id": claims['token_id']}
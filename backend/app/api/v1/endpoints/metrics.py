@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.core.auth import get_current_active_user
+from app.core.user_cache import user_cache
+from app.core.password_pool import password_pool
+from app.core.login_throttle import login_throttle
+from app.core.admission import admission
+from app.core.sampling import sampling
+from app.core.ingest_deadband import ingest_deadband
+from app.core.obstacle_events import obstacle_tracker
+from app.core.anomaly import anomaly_detector
+from app.core.alerts import alert_engine
+from app.core.response_cache import response_cache
+from app.core.day_archive import day_archive
+from app.core.single_flight import single_flight
+from app.core.ingest_profile import INGEST_PROFILE_ADMINS, ingest_profile
+
+router = APIRouter()
+
+@router.get("/")
+async def get_metrics(current_user: dict = Depends(get_current_active_user)):
+    """Runtime cache and performance counters for this worker process"""
+    return {
+        "user_cache": user_cache.stats(),
+        "password_pool": password_pool.stats(),
+        "login_throttle": login_throttle.stats(),
+        "ws_admission": admission.stats(),
+        "adaptive_sampling": sampling.stats(),
+        "ingest_deadband": ingest_deadband.stats(),
+        "obstacle_events": obstacle_tracker.stats(),
+        "anomaly_detection": anomaly_detector.stats(),
+        "alerts": alert_engine.stats(),
+        "response_cache": response_cache.stats(),
+        "day_archive": day_archive.stats(),
+        "single_flight": single_flight.stats(),
+        "ingest_profile": {"enabled": ingest_profile.enabled}
+    }
+
+@router.get("/ingest-profile")
+async def get_ingest_profile(current_user: dict = Depends(get_current_active_user)):
+    """Per-stage latency histograms of the WebSocket ingest loop in this worker"""
+    return ingest_profile.stats()
+
+@router.put("/ingest-profile")
+async def set_ingest_profile(enabled: bool, reset: bool = False, current_user: dict = Depends(get_current_active_user)):
+    """Turn ingest stage timing on or off in this worker, optionally clearing the histograms (operators only)"""
+    if current_user["username"] not in INGEST_PROFILE_ADMINS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Ingest profiling can only be switched by users in INGEST_PROFILE_ADMINS"
+        )
+    ingest_profile.set_enabled(enabled, reset=reset)
+    return ingest_profile.stats()
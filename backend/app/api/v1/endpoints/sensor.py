@@ -1,36 +1,110 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy import text
 import json
 import logging
 import asyncio
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 
 from app.core.auth import get_current_active_user, verify_token
+from app.core.device_tokens import verify_device_token, WS_ALLOW_EMAIL_AUTH
+from app.core.admission import admission, WS_TRY_AGAIN_LATER
 from app.core.websocket import manager
-from app.core.db_utils import get_user_by_email
+from app.core.sampling import sampling
+from app.core.ingest_deadband import ingest_deadband, step_series
+from app.core.obstacle_events import obstacle_tracker, occupied_intervals
+from app.core.anomaly import anomaly_detector
+from app.core.alerts import alert_engine
+from app.core.conditions import condition_periods, CONDITION_METRICS, CONDITION_OPERATORS
+from app.core.gaps import reading_gaps
+from app.core.dashboard import dashboard_snapshot, DASHBOARD_POINTS, DASHBOARD_MAX_POINTS
+from app.core.day_archive import accepts_gzip, day_archive, day_readings
+from app.core.streams import streams, format_event
+from app.core.recent import parse_timestamp
+from app.core.response_cache import response_cache
+from app.core.single_flight import single_flight
+from app.core.serialization import ReadingRow, dumps, dumps_text, loads
+from app.core.page_json import SENSOR_PAGE_SQL_JSON_MIN, page_json
+from app.core.ingest_profile import ingest_profile
+from app.core.gateway import GatewaySession, GATEWAY_MAX_BATCH, parse_gateway_message, insert_readings
+from app.core.db_utils import get_user_by_email, get_device, list_devices, create_device, update_device_deadband
 
 # Configure logging
 logger = logging.getLogger(__name__)
 from app.db.database import get_db
 from app.models.sensor import SensorData
 from app.schemas.sensor import SensorDataCreate
+from app.schemas.device import DeviceCreate, DeviceUpdate
 
 router = APIRouter()
 
+SERIES_MAX_POINTS = 10000
+
+async def _reject_handshake(websocket: WebSocket, retry_after: float):
+    """
+    Turn away an over-limit handshake with a retry hint. The hint is sent as a
+    JSON message too, since most device WebSocket libraries drop the close reason.
+    """
+    await websocket.accept()
+    await websocket.send_text(dumps_text({
+        "type": "retry",
+        "message": "Server busy, please reconnect later",
+        "retry_after": retry_after
+    }))
+    await websocket.close(code=WS_TRY_AGAIN_LATER, reason=f"retry_after={retry_after}")
+
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db), token: str = None, email: str = None):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    db: Session = Depends(get_db),
+    token: str = None,
+    email: str = None,
+    device_token: str = None,
+    device_id: int = None,
+    gateway: bool = False,
+    max_rate: float = None,
+    deadband: float = None,
+    heartbeat: str = None,
+    since_id: int = None,
+    since_ts: str = None
+):
     # Initialize user variable
     user = None
+    gateway_session = None
+    batch_session = None
     client_host = websocket.client.host if hasattr(websocket, 'client') and hasattr(websocket.client, 'host') else "unknown"
 
     try:
         # Log connection attempt with client info
         logger.info(f"WebSocket connection attempt from {client_host}")
-        logger.info(f"WebSocket connection parameters - token: {'provided' if token else 'not provided'}, email: {email if email else 'not provided'}")
 
+        # Shed reconnect storms before doing any authentication work
+        retry_after = admission.admit()
+        if retry_after is not None:
+            logger.warning(f"WebSocket handshake from {client_host} over admission limit, retry in {retry_after}s")
+            await _reject_handshake(websocket, retry_after)
+            return
+        logger.info(f"WebSocket connection parameters - token: {'provided' if token else 'not provided'}, device_token: {'provided' if device_token else 'not provided'}, email: {email if email else 'not provided'}")
+
+        # Device credentials are checked first: verifying them is an HMAC, not a DB query
+        if device_token:
+            user = verify_device_token(device_token)
+
+            if not user:
+                logger.warning(f"WebSocket connection rejected: Invalid or revoked device token from {client_host}")
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+
+            logger.info(f"WebSocket authenticated for user {user['id']} (device: {user['device_id']}) from {client_host}")
         # Check if we have an email parameter
-        if email:
+        elif email:
+            if not WS_ALLOW_EMAIL_AUTH:
+                logger.warning(f"WebSocket connection rejected: Email authentication is disabled ({client_host})")
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                return
+
             # Authenticate using email
             logger.info(f"WebSocket connection attempt with email: {email}")
             user = get_user_by_email(db, email)
@@ -60,42 +134,113 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
 
+        # Device tokens are bound to one device; other clients may scope themselves with ?device_id=
+        if gateway and (device_token or device_id is not None):
+            logger.warning(f"WebSocket connection rejected: Gateway mode can't be bound to one device ({client_host})")
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        elif device_token:
+            device_id = user['device_id']
+        elif device_id is not None and not get_device(db, device_id, user['id']):
+            logger.warning(f"WebSocket connection rejected: Device {device_id} does not belong to user {user['id']} ({client_host})")
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
         # Accept connection through the manager
-        await manager.connect(websocket, user['id'])
+        # Old firmware can opt into server-initiated JSON pings with ?heartbeat=json
+        # Gateways (?gateway=true) carry tagged readings for many devices over this one connection
+        # Reconnecting clients (?since_id= / ?since_ts=) have live broadcasts held back until the replay is done
+        if gateway:
+            gateway_session = GatewaySession.load(websocket, db, user['id'])
+        resuming = since_id is not None or bool(since_ts)
+        await manager.connect(websocket, user['id'], json_heartbeat=(heartbeat == "json"), device_id=device_id, gateway=gateway, replay=resuming)
+
+        # Viewers can ask for coalesced updates at a bounded rate
+        if max_rate or deadband is not None:
+            try:
+                manager.subscribe(websocket, max_rate=max_rate, deadband=deadband)
+            except ValueError as subscription_error:
+                await manager.send_personal_message(
+                    dumps_text({
+                        "status": "error",
+                        "message": f"Invalid subscription: {str(subscription_error)}"
+                    }),
+                    websocket
+                )
+
+        # Reconnecting clients get what they missed before live broadcasts resume
+        if resuming:
+            await _replay_missed_readings(websocket, db, user, since_id=since_id, since_ts=since_ts, device_id=device_id)
 
         # Main message processing loop
         while True:
-            # Receive JSON data with timeout handling
-            try:
-                # Receive data with a timeout
-                data = await asyncio.wait_for(
-                    websocket.receive_text(),
-                    timeout=300  # 5 minute timeout
-                )
-            except asyncio.TimeoutError:
-                # Handle timeout - send a ping to check if client is still there
-                logger.info(f"WebSocket timeout for user {user['id']}, sending ping")
-                try:
-                    await manager.send_personal_message(
-                        json.dumps({"type": "ping", "message": "Connection check"}),
-                        websocket
-                    )
-                    continue
-                except Exception:
-                    # If ping fails, client is disconnected
-                    logger.info(f"Ping failed for user {user['id']}, closing connection")
-                    raise WebSocketDisconnect()
+            # Receive JSON data. Idle connections are closed by the manager's heartbeat
+            # scheduler and dead transports by the server's protocol-level pings.
+            data = await websocket.receive_text()
+            # Stage timings (a no-op unless ingest profiling is on)
+            mark = ingest_profile.start()
+            manager.touch(websocket)
 
             # Process the received data
             try:
                 # Parse JSON data
-                json_data = json.loads(data)
+                json_data = loads(data)
+                mark = ingest_profile.lap("parse", mark)
                 logger.debug(f"Received WebSocket message from user {user['id']}: {json_data}")
+                mark = ingest_profile.lap("log", mark)
 
                 # Check if this is a ping message
                 if json_data.get("type") == "ping":
                     logger.debug(f"Ping received from user {user['id']}")
                     await manager.handle_ping(websocket)
+                    ingest_profile.lap("ping", mark)
+                    continue
+
+                # Check if this is a viewer updating its subscription throttle
+                if json_data.get("type") == "subscribe":
+                    try:
+                        manager.subscribe(
+                            websocket,
+                            max_rate=json_data.get("max_rate"),
+                            deadband=json_data.get("deadband")
+                        )
+                        await manager.send_personal_message(
+                            dumps_text({"status": "success", "message": "Subscription updated"}),
+                            websocket
+                        )
+                    except (ValueError, TypeError) as subscription_error:
+                        await manager.send_personal_message(
+                            dumps_text({
+                                "status": "error",
+                                "message": f"Invalid subscription: {str(subscription_error)}"
+                            }),
+                            websocket
+                        )
+                    continue
+
+                # Check if this is a gateway sending readings for its devices
+                if gateway_session is not None:
+                    gateway_readings = parse_gateway_message(json_data)
+                    if gateway_readings is not None:
+                        await _ingest_gateway_readings(db, user, gateway_session, gateway_readings)
+                        mark = ingest_profile.lap("gateway", mark)
+                        await _apply_sampling_control(websocket, user)
+                        ingest_profile.lap("control", mark)
+                        continue
+
+                # Devices told to batch (see the sampling control message) send their
+                # readings as one message, stored and acked the same way as a gateway's
+                if json_data.get("type") == "readings" and isinstance(json_data.get("readings"), list):
+                    if batch_session is None:
+                        batch_session = GatewaySession(websocket, user['id'], [device_id])
+                    batch_readings = [
+                        dict(item, device_id=device_id) if isinstance(item, dict) else item
+                        for item in json_data["readings"]
+                    ]
+                    await _ingest_gateway_readings(db, user, batch_session, batch_readings)
+                    mark = ingest_profile.lap("batch", mark)
+                    await _apply_sampling_control(websocket, user)
+                    ingest_profile.lap("control", mark)
                     continue
 
                 # Check if we have sensor data
@@ -113,63 +258,101 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
                             humidity=humidity,
                             obstacle=obstacle
                         )
+                        mark = ingest_profile.lap("validate", mark)
+
+                        manager.mark_seen(user['id'], device_id)
+
+                        # Readings that haven't moved past the device's deadband are acked but not stored
+                        tolerance = ingest_deadband.tolerance_for(db, device_id)
+                        store = ingest_deadband.should_store(user['id'], device_id, temperature, humidity, obstacle, tolerance)
+                        mark = ingest_profile.lap("deadband", mark)
+                        if not store:
+                            covering_id = ingest_deadband.last_stored_id(user['id'], device_id)
+                            await manager.send_personal_message(
+                                dumps_text({
+                                    "status": "success",
+                                    "message": "Data received, unchanged since the last stored reading",
+                                    "id": covering_id,
+                                    "stored": False
+                                }),
+                                websocket
+                            )
+                            mark = ingest_profile.lap("ack", mark)
+                            # Duration alerts still need to see time pass while readings aren't stored
+                            await _evaluate_alert_rules(_unstored_reading(user['id'], device_id, temperature, humidity, obstacle, covering_id))
+                            ingest_profile.lap("alerts", mark)
+                            continue
 
                         # Log the data being saved
                         logger.info(f"Saving sensor data for user {user['id']}: T={temperature}°C, H={humidity}%, O={obstacle}")
+                        mark = ingest_profile.lap("log", mark)
 
+                        sampling.ingest_started()
                         try:
                             # Save sensor data to database using raw SQL with error handling
                             query = text("""
                                 INSERT INTO sensor_data
-                                (temperature, humidity, obstacle, user_id, timestamp)
-                                VALUES (:temperature, :humidity, :obstacle, :user_id, NOW())
+                                (temperature, humidity, obstacle, user_id, device_id, timestamp)
+                                VALUES (:temperature, :humidity, :obstacle, :user_id, :device_id, NOW())
                                 RETURNING id, timestamp
                             """)
 
+                            db_started = time.perf_counter()
                             result = db.execute(query, {
                                 "temperature": sensor_data.temperature,
                                 "humidity": sensor_data.humidity,
                                 "obstacle": sensor_data.obstacle,
-                                "user_id": user['id']
+                                "user_id": user['id'],
+                                "device_id": device_id
                             })
 
                             # Get the inserted row's id and timestamp
                             row = result.fetchone()
+                            obstacle_tracker.record(db, user['id'], device_id, sensor_data.obstacle, row[1])
                             db.commit()
+                            sampling.record_db_latency(time.perf_counter() - db_started)
+                            response_cache.bump(user['id'])
 
                             sensor_id = row[0]
                             timestamp = row[1]
+                            ingest_deadband.remember(user['id'], device_id, temperature, humidity, obstacle, sensor_id)
+                            mark = ingest_profile.lap("insert", mark)
 
                             logger.info(f"Sensor data saved successfully for user {user['id']}, id={sensor_id}")
+                            mark = ingest_profile.lap("log", mark)
 
                             # Send acknowledgment
                             await manager.send_personal_message(
-                                json.dumps({
+                                dumps_text({
                                     "status": "success",
                                     "message": "Data received and saved",
                                     "id": sensor_id
                                 }),
                                 websocket
                             )
+                            mark = ingest_profile.lap("ack", mark)
 
-                            # Broadcast to all connections for this user
-                            await manager.broadcast(
-                                json.dumps({
-                                    "temperature": sensor_data.temperature,
-                                    "humidity": sensor_data.humidity,
-                                    "obstacle": sensor_data.obstacle,
-                                    "timestamp": timestamp.isoformat(),
-                                    "id": sensor_id,
-                                    "user_id": user['id']
-                                }),
-                                user['id']
-                            )
+                            # Broadcast to all connections for this user (throttled viewers get it coalesced)
+                            reading = {
+                                "temperature": sensor_data.temperature,
+                                "humidity": sensor_data.humidity,
+                                "obstacle": sensor_data.obstacle,
+                                "timestamp": timestamp.isoformat(),
+                                "id": sensor_id,
+                                "user_id": user['id'],
+                                "device_id": device_id
+                            }
+                            await manager.broadcast_reading(reading, user['id'])
+                            mark = ingest_profile.lap("broadcast", mark)
+                            await _annotate_anomalies(reading)
+                            await _evaluate_alert_rules(reading)
+                            mark = ingest_profile.lap("alerts", mark)
 
                         except Exception as db_error:
                             # Handle database errors
                             logger.error(f"Database error saving sensor data for user {user['id']}: {db_error}")
                             await manager.send_personal_message(
-                                json.dumps({
+                                dumps_text({
                                     "status": "error",
                                     "message": "Database error, could not save data"
                                 }),
@@ -180,12 +363,19 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
                                 db.rollback()
                             except:
                                 pass
+                            obstacle_tracker.forget(user['id'], device_id)
+
+                        finally:
+                            sampling.ingest_finished()
+
+                        await _apply_sampling_control(websocket, user)
+                        ingest_profile.lap("control", mark)
 
                     except (ValueError, TypeError) as validation_error:
                         # Handle data validation errors
                         logger.warning(f"Invalid sensor data from user {user['id']}: {validation_error}")
                         await manager.send_personal_message(
-                            json.dumps({
+                            dumps_text({
                                 "status": "error",
                                 "message": f"Invalid sensor data: {str(validation_error)}"
                             }),
@@ -196,7 +386,7 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
                     # Unknown message type
                     logger.warning(f"Unknown message type received from user {user['id']}: {json_data}")
                     await manager.send_personal_message(
-                        json.dumps({
+                        dumps_text({
                             "status": "error",
                             "message": "Unknown message type"
                         }),
@@ -207,7 +397,7 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
                 # Handle invalid JSON
                 logger.warning(f"Invalid JSON received from user {user['id']}: {json_error}")
                 await manager.send_personal_message(
-                    json.dumps({
+                    dumps_text({
                         "status": "error",
                         "message": "Invalid JSON data"
                     }),
@@ -218,7 +408,7 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
                 # Handle other errors during message processing
                 logger.error(f"Error processing message from user {user['id']}: {processing_error}")
                 await manager.send_personal_message(
-                    json.dumps({
+                    dumps_text({
                         "status": "error",
                         "message": f"Server error: {str(processing_error)}"
                     }),
@@ -242,6 +432,11 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
             logger.error(f"Unexpected error in WebSocket connection before authentication: {connection_error}")
 
     finally:
+        if gateway_session is not None:
+            gateway_session.acks.close()
+        if batch_session is not None:
+            batch_session.acks.close()
+
         # Ensure connection is properly cleaned up
         if user:
             try:
@@ -256,13 +451,359 @@ async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)
         except:
             pass
 
+async def _ingest_gateway_readings(db: Session, user: dict, session: GatewaySession, items: list):
+    """
+    Validate, store and broadcast a batch of readings from a gateway or a batching device.
+    The whole batch is one INSERT and one commit, and acks are batched per device.
+    """
+    acks = session.acks
+    if len(items) > GATEWAY_MAX_BATCH:
+        acks.add_error(None, None, f"Batch too large, at most {GATEWAY_MAX_BATCH} readings per message")
+        await acks.flush()
+        return
+
+    valid = []
+    for item in items:
+        seq = item.get("seq") if isinstance(item, dict) else None
+        try:
+            device_id = item["device_id"]
+            if device_id is not None:
+                device_id = int(device_id)
+            valid_reading = {
+                "device_id": device_id,
+                "temperature": float(item["temperature"]),
+                "humidity": float(item.get("humidity", 0)),
+                "obstacle": bool(item.get("obstacle", False)),
+                "seq": seq
+            }
+        except (KeyError, ValueError, TypeError, AttributeError) as validation_error:
+            acks.add_error(item.get("device_id") if isinstance(item, dict) else None, seq, f"Invalid sensor data: {str(validation_error)}")
+            continue
+
+        if not session.owns(db, device_id):
+            acks.add_error(device_id, seq, "Unknown device")
+            continue
+
+        manager.mark_seen(user['id'], device_id)
+
+        # Unchanged readings are acked without being stored
+        tolerance = ingest_deadband.tolerance_for(db, device_id)
+        if not ingest_deadband.should_store(user['id'], device_id, valid_reading["temperature"], valid_reading["humidity"], valid_reading["obstacle"], tolerance):
+            acks.add_skipped(device_id, seq)
+            await _evaluate_alert_rules(_unstored_reading(
+                user['id'], device_id, valid_reading["temperature"], valid_reading["humidity"], valid_reading["obstacle"],
+                ingest_deadband.last_stored_id(user['id'], device_id)
+            ))
+            continue
+        ingest_deadband.remember(user['id'], device_id, valid_reading["temperature"], valid_reading["humidity"], valid_reading["obstacle"])
+        valid.append(valid_reading)
+
+    session.readings_received += len(items)
+    if valid:
+        sampling.ingest_started(len(valid))
+        # Released even if the fan-out raises, or sampling would stay raised for good
+        try:
+            try:
+                db_started = time.perf_counter()
+                rows = insert_readings(db, user['id'], valid)
+                sampling.record_db_latency(time.perf_counter() - db_started)
+                response_cache.bump(user['id'])
+            except Exception as db_error:
+                logger.error(f"Database error saving gateway readings for user {user['id']}: {db_error}")
+                try:
+                    db.rollback()
+                except:
+                    pass
+                for failed in valid:
+                    ingest_deadband.forget(user['id'], failed["device_id"])
+                    obstacle_tracker.forget(user['id'], failed["device_id"])
+                    acks.add_error(failed["device_id"], failed["seq"], "Database error, could not save data")
+                rows = []
+
+            for stored, row in zip(valid, rows):
+                acks.add(stored["device_id"], row[0], stored["seq"])
+                ingest_deadband.remember(user['id'], stored["device_id"], stored["temperature"], stored["humidity"], stored["obstacle"], row[0])
+                timestamp = row[1]
+                reading = {
+                    "temperature": stored["temperature"],
+                    "humidity": stored["humidity"],
+                    "obstacle": stored["obstacle"],
+                    "timestamp": timestamp.isoformat() if hasattr(timestamp, "isoformat") else str(timestamp),
+                    "id": row[0],
+                    "user_id": user['id'],
+                    "device_id": stored["device_id"]
+                }
+                await manager.broadcast_reading(reading, user['id'])
+                await _annotate_anomalies(reading)
+                await _evaluate_alert_rules(reading)
+        finally:
+            sampling.ingest_finished(len(valid))
+
+    await acks.maybe_flush()
+
+async def _annotate_anomalies(reading: dict):
+    """Run a stored reading through the streaming anomaly detector and push any annotations to viewers"""
+    anomalies = anomaly_detector.check(reading["user_id"], reading["device_id"], reading)
+    if anomalies:
+        logger.warning(f"Anomalous reading {reading['id']} from user {reading['user_id']}, device {reading['device_id']}: {anomalies}")
+        await manager.broadcast_event(
+            {
+                "type": "anomaly",
+                "reading_id": reading["id"],
+                "user_id": reading["user_id"],
+                "device_id": reading["device_id"],
+                "timestamp": reading["timestamp"],
+                "anomalies": anomalies
+            },
+            reading["user_id"],
+            reading["device_id"]
+        )
+
+async def _evaluate_alert_rules(reading: dict):
+    """Advance the alert rules a reading touches and deliver any firing or resolved events"""
+    for event in alert_engine.evaluate(reading):
+        logger.info(f"Alert rule {event['rule_id']} {event['state']} for user {event['user_id']}, device {event['device_id']}: {event['metric']}={event['value']}")
+        await manager.broadcast_event(event, event["user_id"], event["device_id"])
+
+def _unstored_reading(user_id: int, device_id, temperature: float, humidity: float, obstacle: bool, covering_id) -> dict:
+    """A reading skipped by the ingest deadband, identified by the stored row that covers it"""
+    return {
+        "temperature": temperature,
+        "humidity": humidity,
+        "obstacle": obstacle,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "id": covering_id,
+        "user_id": user_id,
+        "device_id": device_id
+    }
+
+async def _apply_sampling_control(websocket: WebSocket, user: dict):
+    """
+    Re-evaluate backend load after an ingest. A level change is pushed to every
+    publishing connection; a publisher seen for the first time while the backend
+    is already under load is sent the current control message.
+    """
+    control = sampling.evaluate()
+    if control is not None:
+        await manager.push_control(control)
+    if manager.mark_publisher(websocket, user['id']) and sampling.level > 0:
+        await manager.send_personal_message(dumps_text(sampling.control_message()), websocket)
+
+def _row_to_reading(row):
+    """Convert an (id, temperature, humidity, obstacle, user_id, timestamp, device_id) row to a reading dict"""
+    timestamp = row[5]
+    if timestamp is None:
+        timestamp = datetime.now().isoformat()
+    elif hasattr(timestamp, "isoformat"):
+        timestamp = timestamp.isoformat()
+    else:
+        timestamp = str(timestamp)
+
+    return {
+        "id": row[0] if row[0] is not None else 0,
+        "temperature": float(row[1]) if row[1] is not None else 0.0,
+        "humidity": float(row[2]) if row[2] is not None else 0.0,
+        "obstacle": bool(row[3]) if row[3] is not None else False,
+        "user_id": int(row[4]) if row[4] is not None else 0,
+        "timestamp": timestamp,
+        "device_id": row[6]
+    }
+
+# Page size and overall cap when replaying readings a reconnecting client missed
+REPLAY_PAGE_SIZE = 200
+REPLAY_LIMIT = 1000
+
+def _missed_reading_pages(db: Session, user_id: int, since_id: int = None, since_ts: datetime = None, device_id: int = None):
+    """
+    Yield pages of a user's readings after since_id (or since_ts), oldest first,
+    limited to one device's readings if device_id is given.
+
+    Served from the recent-readings buffer when it covers the whole gap,
+    otherwise with keyset queries on id (or timestamp, id) so no page needs an OFFSET scan.
+    """
+    if since_id is not None:
+        buffered = manager.recent_readings.since_id(user_id, since_id)
+    else:
+        buffered = manager.recent_readings.since_timestamp(user_id, since_ts)
+
+    if buffered is not None:
+        if device_id is not None:
+            buffered = [reading for reading in buffered if reading.get("device_id") == device_id]
+        buffered = buffered[:REPLAY_LIMIT]
+        for start in range(0, len(buffered), REPLAY_PAGE_SIZE):
+            yield buffered[start:start + REPLAY_PAGE_SIZE]
+        return
+
+    replayed = 0
+    last_id = since_id
+    last_ts = since_ts
+    device_clause = "AND device_id = :device_id" if device_id is not None else ""
+    while replayed < REPLAY_LIMIT:
+        params = {"user_id": user_id, "device_id": device_id, "limit": min(REPLAY_PAGE_SIZE, REPLAY_LIMIT - replayed)}
+        if since_id is not None:
+            key_clause = "id > :last_id"
+            order_clause = "id"
+            params["last_id"] = last_id
+        elif replayed == 0:
+            key_clause = "timestamp > :last_ts"
+            order_clause = "timestamp, id"
+            params["last_ts"] = last_ts
+        else:
+            key_clause = "(timestamp > :last_ts OR (timestamp = :last_ts AND id > :last_id))"
+            order_clause = "timestamp, id"
+            params["last_ts"] = last_ts
+            params["last_id"] = last_id
+
+        query = text(f"""
+            SELECT id, temperature, humidity, obstacle, user_id, timestamp, device_id
+            FROM sensor_data
+            WHERE user_id = :user_id {device_clause} AND {key_clause}
+            ORDER BY {order_clause}
+            LIMIT :limit
+        """)
+        rows = db.execute(query, params).fetchall()
+        if not rows:
+            return
+
+        yield [_row_to_reading(row) for row in rows]
+        replayed += len(rows)
+        if len(rows) < params["limit"]:
+            return
+        last_id = rows[-1][0]
+        last_ts = rows[-1][5]
+
+async def _replay_missed_readings(websocket: WebSocket, db: Session, user: dict, since_id: int = None, since_ts: str = None, device_id: int = None):
+    """
+    Send a reconnecting client the readings it missed as `backfill` frames, then
+    switch it over to live broadcasts without gaps or duplicates.
+    """
+    since_dt = parse_timestamp(since_ts) if since_id is None else None
+    if since_id is None and since_dt is None:
+        await manager.send_personal_message(
+            dumps_text({"status": "error", "message": "Invalid since_ts, expected an ISO 8601 timestamp"}),
+            websocket
+        )
+        await manager.end_replay(websocket)
+        return
+
+    # Live readings broadcast while we replay are held back and released afterwards
+    manager.begin_replay(websocket)
+    last_replayed_id = 0
+    replayed = 0
+    try:
+        for page in _missed_reading_pages(db, user['id'], since_id=since_id, since_ts=since_dt, device_id=device_id):
+            replayed += len(page)
+            last_replayed_id = max(last_replayed_id, max(reading["id"] for reading in page))
+            await manager.send_personal_message(
+                dumps_text({"type": "backfill", "data": page, "complete": False}),
+                websocket
+            )
+    except Exception as e:
+        logger.error(f"Error replaying missed readings for user {user['id']}: {e}")
+    finally:
+        await manager.send_personal_message(
+            dumps_text({
+                "type": "backfill",
+                "data": [],
+                "complete": True,
+                "count": replayed,
+                "truncated": replayed >= REPLAY_LIMIT
+            }),
+            websocket
+        )
+        await manager.end_replay(websocket, last_replayed_id)
+
+    logger.info(f"Replayed {replayed} missed readings to user {user['id']}")
+
+@router.get("/stream")
+async def stream_sensor_data(
+    request: Request,
+    db: Session = Depends(get_db),
+    token: str = None,
+    last_event_id: int = None
+):
+    """
+    Server-Sent Events stream of live sensor readings for read-only dashboards.
+
+    Browsers' EventSource can't set headers, so the token may be passed as
+    ?token=... as well as an Authorization header. On reconnect the browser
+    sends Last-Event-ID and every reading after that id is replayed first.
+    """
+    auth_header = request.headers.get("authorization", "")
+    if auth_header.lower().startswith("bearer "):
+        token = auth_header[7:]
+
+    user = verify_token(token, db) if token else None
+    if not user or not user['is_active']:
+        from app.core.serialization import JSONResponse
+        return JSONResponse(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            content={"detail": "Could not validate credentials"},
+            headers={
+                "WWW-Authenticate": "Bearer",
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Methods": "GET, OPTIONS",
+                "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+            }
+        )
+
+    header_event_id = request.headers.get("last-event-id")
+    if header_event_id:
+        try:
+            last_event_id = int(header_event_id)
+        except ValueError:
+            logger.warning(f"Ignoring invalid Last-Event-ID header: {header_event_id}")
+
+    # Register before the backfill query so nothing inserted in between is missed
+    queue = streams.subscribe(user['id'])
+
+    backfill = []
+    try:
+        if last_event_id is not None:
+            for page in _missed_reading_pages(db, user['id'], since_id=last_event_id):
+                backfill.extend(page)
+            logger.info(f"Replaying {len(backfill)} readings after id {last_event_id} for user {user['id']}")
+    except Exception as e:
+        logger.error(f"Error loading stream backfill for user {user['id']}: {e}")
+    finally:
+        # Open streams must not hold on to a pooled connection
+        db.close()
+
+    async def event_stream():
+        # Disconnects cancel the generator, so the queue is released here rather than after the response
+        try:
+            last_sent_id = last_event_id or 0
+            yield b"retry: 5000\n\n"
+            for reading in backfill:
+                last_sent_id = reading["id"]
+                yield format_event(reading)
+            while True:
+                reading_id, event = await queue.get()
+                if reading_id is not None:
+                    # Skip live events already covered by the backfill
+                    if reading_id <= last_sent_id:
+                        continue
+                    last_sent_id = reading_id
+                yield event
+        finally:
+            streams.unsubscribe(user['id'], queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
 @router.options("/data", status_code=status.HTTP_200_OK)
 async def sensor_data_options():
     """
     Handle OPTIONS requests for the sensor data endpoint.
     This is needed for CORS preflight requests.
     """
-    from fastapi.responses import JSONResponse
+    from app.core.serialization import JSONResponse
 
     # Return a response with CORS headers
     return JSONResponse(
@@ -282,16 +823,63 @@ async def get_sensor_data(
     start_date: str = None,
     end_date: str = None,
     page: int = 1,
-    page_size: int = 10
+    page_size: int = 10,
+    device_id: int = None
 ):
+    # Identical pages are served from the encoded response until the user's data changes
+    cache_params = (start_date, end_date, page, page_size, device_id)
+    cached = response_cache.get(current_user['id'], cache_params)
+    if cached is not None:
+        from fastapi.responses import Response
+        return Response(
+            content=cached,
+            media_type="application/json",
+            headers={
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Methods": "GET, OPTIONS",
+                "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+            }
+        )
+    data_version = response_cache.version(current_user['id'])
+
+    # Open dashboards all ask for the first page at once; let them share one query
+    if page == 1:
+        return await single_flight.run(
+            "data", (current_user['id'], data_version, cache_params),
+            _in_own_session, sessionmaker(bind=db.get_bind()), _sensor_data_page,
+            current_user, start_date, end_date, page, page_size, device_id, data_version
+        )
+    return _sensor_data_page(current_user, db, start_date, end_date, page, page_size, device_id, data_version)
+
+def _in_own_session(session_factory, fn, current_user: dict, *args):
+    """
+    Run `fn(current_user, db, *args)` on a session opened and closed here. Shared
+    queries can outlive the request that started them, so they must not borrow
+    that request's session.
+    """
+    db = session_factory()
+    try:
+        return fn(current_user, db, *args)
+    finally:
+        db.close()
+
+def _sensor_data_page(current_user: dict, db: Session, start_date: str, end_date: str, page: int, page_size: int,
+                      device_id: int, data_version: int):
+    """Build a /data page, caching its encoded response under the data version it was read at"""
+    cache_params = (start_date, end_date, page, page_size, device_id)
     try:
         # Log the request with query parameters
-        logger.info(f"Getting sensor data for user {current_user['id']} with params: start_date={start_date}, end_date={end_date}, page={page}, page_size={page_size}")
+        logger.info(f"Getting sensor data for user {current_user['id']} with params: start_date={start_date}, end_date={end_date}, page={page}, page_size={page_size}, device_id={device_id}")
 
         # Validate and parse date parameters if provided
         date_filter_clause = ""
         query_params = {"user_id": current_user['id']}
 
+        # Scoping to one device lets the (device_id, timestamp) index serve the query
+        if device_id is not None:
+            date_filter_clause = "AND device_id = :device_id "
+            query_params["device_id"] = device_id
+
         if start_date and end_date:
             try:
                 # Parse ISO format dates
@@ -320,7 +908,7 @@ async def get_sensor_data(
                 except Exception as future_check_error:
                     logger.error(f"Error checking future dates: {future_check_error}")
 
-                date_filter_clause = "AND timestamp BETWEEN :start_date AND :end_date"
+                date_filter_clause += "AND timestamp BETWEEN :start_date AND :end_date"
                 query_params["start_date"] = start_date
                 query_params["end_date"] = end_date
             except Exception as date_error:
@@ -343,7 +931,7 @@ async def get_sensor_data(
 
             # Use raw SQL to get sensor data with pagination and date filtering
             query = text(f"""
-                SELECT id, temperature, humidity, obstacle, user_id, timestamp
+                SELECT id, temperature, humidity, obstacle, user_id, timestamp, device_id
                 FROM sensor_data
                 WHERE user_id = :user_id {date_filter_clause}
                 ORDER BY timestamp DESC
@@ -354,45 +942,61 @@ async def get_sensor_data(
             query_params["limit"] = page_size
             query_params["offset"] = offset
 
+            # Large pages come back from the database as a rendered JSON array
+            if page_size >= SENSOR_PAGE_SQL_JSON_MIN:
+                try:
+                    data_json = page_json(db, date_filter_clause, query_params)
+                except Exception as json_error:
+                    logger.error(f"Database JSON rendering failed, converting rows instead: {json_error}")
+                    db.rollback()
+                else:
+                    total_pages = (total_count + page_size - 1) // page_size
+                    pagination = {
+                        "page": page,
+                        "page_size": page_size,
+                        "total_count": total_count,
+                        "total_pages": total_pages,
+                        "has_next": page < total_pages,
+                        "has_prev": page > 1
+                    }
+                    from fastapi.responses import Response
+                    response = Response(
+                        content=b'{"data":' + data_json + b',"pagination":' + dumps(pagination) + b'}',
+                        media_type="application/json",
+                        headers={
+                            "Access-Control-Allow-Origin": "*",
+                            "Access-Control-Allow-Methods": "GET, OPTIONS",
+                            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+                        }
+                    )
+                    if data_version is not None:
+                        response_cache.put(current_user['id'], cache_params, data_version, response.body)
+                    return response
+
             # Execute with error handling
             try:
                 logger.debug(f"Executing query with params: {query_params}")
                 result = db.execute(query, query_params)
             except Exception as db_error:
                 logger.error(f"Database error in get_sensor_data: {db_error}")
+                # The fallback ignores the date filter, so its page must not be cached
+                data_version = None
                 # Try a simpler query as fallback without date filtering
-                fallback_query = text("""
+                fallback_query = text(f"""
                     SELECT * FROM sensor_data
-                    WHERE user_id = :user_id
+                    WHERE user_id = :user_id {"AND device_id = :device_id" if device_id is not None else ""}
                     ORDER BY timestamp DESC
                     LIMIT :limit OFFSET :offset
                 """)
-                fallback_params = {"user_id": current_user['id'], "limit": page_size, "offset": offset}
+                fallback_params = {"user_id": current_user['id'], "device_id": device_id, "limit": page_size, "offset": offset}
                 logger.info(f"Trying fallback query: {fallback_query}")
                 result = db.execute(fallback_query, fallback_params)
 
-            # Convert to list of dictionaries with error handling
+            # Rows go to the serializer as they are, timestamps included
             sensor_data = []
             for row in result:
                 try:
-                    data_point = {}
-                    data_point["id"] = row[0] if row[0] is not None else 0
-                    data_point["temperature"] = float(row[1]) if row[1] is not None else 0.0
-                    data_point["humidity"] = float(row[2]) if row[2] is not None else 0.0
-                    data_point["obstacle"] = bool(row[3]) if row[3] is not None else False
-                    data_point["user_id"] = int(row[4]) if row[4] is not None else 0
-
-                    # Handle timestamp with extra care
-                    if row[5] is not None:
-                        try:
-                            data_point["timestamp"] = row[5].isoformat()
-                        except AttributeError:
-                            # If timestamp is not a datetime object
-                            data_point["timestamp"] = str(row[5])
-                    else:
-                        data_point["timestamp"] = datetime.now().isoformat()
-
-                    sensor_data.append(data_point)
+                    sensor_data.append(ReadingRow.from_row(row))
                 except Exception as conversion_error:
                     logger.error(f"Error converting sensor data row: {conversion_error}")
                     # Skip this row and continue with the next one
@@ -406,8 +1010,8 @@ async def get_sensor_data(
             logger.info(f"Successfully retrieved {len(sensor_data)} sensor data points for user {current_user['id']} (page {page}/{total_pages})")
 
             # Return data with pagination metadata and CORS headers
-            from fastapi.responses import JSONResponse
-            return JSONResponse(
+            from app.core.serialization import JSONResponse
+            response = JSONResponse(
                 content={
                     "data": sensor_data,
                     "pagination": {
@@ -425,12 +1029,17 @@ async def get_sensor_data(
                     "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
                 }
             )
+            if data_version is not None:
+                response_cache.put(current_user['id'], cache_params, data_version, response.body)
+            return response
 
         except Exception as inner_error:
             logger.error(f"Inner error in get_sensor_data: {inner_error}")
             # Try a different approach - use ORM with pagination
             try:
                 query = db.query(SensorData).filter(SensorData.user_id == current_user['id'])
+                if device_id is not None:
+                    query = query.filter(SensorData.device_id == device_id)
 
                 # Apply date filtering if provided
                 if start_date and end_date:
@@ -451,7 +1060,8 @@ async def get_sensor_data(
                         "humidity": data.humidity,
                         "obstacle": data.obstacle,
                         "user_id": data.user_id,
-                        "timestamp": data.timestamp.isoformat() if data.timestamp else datetime.now().isoformat()
+                        "timestamp": data.timestamp.isoformat() if data.timestamp else datetime.now().isoformat(),
+                        "device_id": data.device_id
                     }
                     for data in sensor_data_list
                 ]
@@ -461,7 +1071,7 @@ async def get_sensor_data(
                 has_next = page < total_pages
                 has_prev = page > 1
 
-                from fastapi.responses import JSONResponse
+                from app.core.serialization import JSONResponse
                 return JSONResponse(
                     content={
                         "data": data,
@@ -487,7 +1097,7 @@ async def get_sensor_data(
     except Exception as e:
         logger.error(f"Error getting sensor data: {e}")
         # Return an empty result with pagination structure and CORS headers
-        from fastapi.responses import JSONResponse
+        from app.core.serialization import JSONResponse
         return JSONResponse(
             content={
                 "data": [],
@@ -507,13 +1117,106 @@ async def get_sensor_data(
             }
         )
 
+@router.options("/dashboard", status_code=status.HTTP_200_OK)
+async def dashboard_options():
+    """
+    Handle OPTIONS requests for the dashboard snapshot endpoint.
+    This is needed for CORS preflight requests.
+    """
+    return _device_cors_options("GET, OPTIONS")
+
+@router.get("/dashboard")
+async def get_dashboard(
+    device_id: int = None,
+    points: int = DASHBOARD_POINTS,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Everything the dashboard shows on load in one request: the latest reading, the
+    last 24 hours downsampled to about `points` buckets, summary statistics for that
+    window and reading counts per day. Replaces calling /data/latest, /data and
+    /data/check one after another.
+    """
+    from app.core.serialization import JSONResponse
+
+    if not 1 <= points <= DASHBOARD_MAX_POINTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"points must be between 1 and {DASHBOARD_MAX_POINTS}")
+
+    logger.info(f"Getting dashboard snapshot for user {current_user['id']} (device_id: {device_id}, points: {points})")
+    return JSONResponse(
+        content=dashboard_snapshot(db, current_user['id'], device_id=device_id, points=points),
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+        }
+    )
+
+# Completed days never change, so clients and proxies may keep them for a year
+HISTORY_IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+@router.options("/history/{day}", status_code=status.HTTP_200_OK)
+async def history_day_options(day: str):
+    """
+    Handle OPTIONS requests for the per-day history endpoint.
+    This is needed for CORS preflight requests.
+    """
+    return _device_cors_options("GET, OPTIONS")
+
+@router.get("/history/{day}")
+async def get_history_day(
+    day: str,
+    request: Request,
+    device_id: int = None,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    All readings of one UTC day (YYYY-MM-DD), oldest first. Completed days are written
+    once to a gzipped file on disk and served from it with a long-lived Cache-Control;
+    only the current day is read from the database.
+    """
+    from fastapi.responses import FileResponse, Response
+    from app.core.serialization import JSONResponse
+    import gzip
+
+    try:
+        day_date = datetime.strptime(day, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="day must be a date in YYYY-MM-DD format")
+    headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "GET, OPTIONS",
+        "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+    }
+
+    if not day_archive.is_complete(day_date):
+        day_archive.live_queries += 1
+        return JSONResponse(
+            content=day_readings(db, current_user['id'], day_date, device_id),
+            headers=dict(headers, **{"Cache-Control": "no-cache"})
+        )
+
+    headers["Cache-Control"] = HISTORY_IMMUTABLE_CACHE_CONTROL
+    path, empty = day_archive.file_for(db, current_user['id'], day_date, device_id)
+    if path is None:
+        return JSONResponse(content=empty, headers=headers)
+
+    if not accepts_gzip(request.headers.get("accept-encoding", "")):
+        with open(path, "rb") as file:
+            return Response(content=gzip.decompress(file.read()), media_type="application/json", headers=headers)
+    headers["Content-Encoding"] = "gzip"
+    headers["Vary"] = "Accept-Encoding"
+    return FileResponse(path, media_type="application/json", headers=headers)
+
 @router.options("/data/latest", status_code=status.HTTP_200_OK)
 async def latest_sensor_data_options():
     """
     Handle OPTIONS requests for the latest sensor data endpoint.
     This is needed for CORS preflight requests.
     """
-    from fastapi.responses import JSONResponse
+    from app.core.serialization import JSONResponse
 
     # Return a response with CORS headers
     return JSONResponse(
@@ -527,17 +1230,27 @@ async def latest_sensor_data_options():
     )
 
 @router.get("/data/latest")
-async def get_latest_sensor_data(current_user: dict = Depends(get_current_active_user), db: Session = Depends(get_db)):
-    """Get the latest sensor data for the current user"""
+async def get_latest_sensor_data(current_user: dict = Depends(get_current_active_user), db: Session = Depends(get_db), device_id: int = None):
+    """Get the latest sensor data for the current user, or for one of their devices"""
+    # Concurrent identical requests (several tabs, the app) share one query
+    return await single_flight.run(
+        "latest", (current_user['id'], response_cache.version(current_user['id']), device_id),
+        _in_own_session, sessionmaker(bind=db.get_bind()), _latest_sensor_data, current_user, device_id
+    )
+
+def _latest_sensor_data(current_user: dict, db: Session, device_id: int = None):
     try:
         # Log the request with more details
-        logger.info(f"Getting latest sensor data for user {current_user['id']} (username: {current_user.get('username', 'unknown')})")
+        logger.info(f"Getting latest sensor data for user {current_user['id']} (username: {current_user.get('username', 'unknown')}, device_id: {device_id})")
+
+        device_filter_clause = "AND device_id = :device_id" if device_id is not None else ""
+        query_params = {"user_id": current_user['id'], "device_id": device_id}
 
         # First, check if the user has any sensor data at all
         try:
             # Use a simple count query first to check if data exists
-            count_query = text("SELECT COUNT(*) FROM sensor_data WHERE user_id = :user_id")
-            count_result = db.execute(count_query, {"user_id": current_user['id']}).scalar()
+            count_query = text(f"SELECT COUNT(*) FROM sensor_data WHERE user_id = :user_id {device_filter_clause}")
+            count_result = db.execute(count_query, query_params).scalar()
 
             logger.info(f"User {current_user['id']} has {count_result} sensor data records")
 
@@ -555,16 +1268,17 @@ async def get_latest_sensor_data(current_user: dict = Depends(get_current_active
                 }
 
             # Use raw SQL to get latest sensor data with explicit column selection
-            query = text("""
+            query = text(f"""
                 SELECT
                     id,
                     temperature,
                     humidity,
                     obstacle,
                     user_id,
-                    timestamp
+                    timestamp,
+                    device_id
                 FROM sensor_data
-                WHERE user_id = :user_id
+                WHERE user_id = :user_id {device_filter_clause}
                 ORDER BY timestamp DESC
                 LIMIT 1
             """)
@@ -572,15 +1286,15 @@ async def get_latest_sensor_data(current_user: dict = Depends(get_current_active
             # Execute with detailed error handling
             try:
                 logger.debug(f"Executing query for user {current_user['id']}")
-                result = db.execute(query, {"user_id": current_user['id']})
+                result = db.execute(query, query_params)
                 row = result.fetchone()
                 logger.debug(f"Query executed successfully, row: {row is not None}")
             except Exception as db_error:
                 logger.error(f"Database error in get_latest_sensor_data: {db_error}")
                 # Try a simpler query as fallback
-                fallback_query = text("SELECT * FROM sensor_data WHERE user_id = :user_id ORDER BY timestamp DESC LIMIT 1")
+                fallback_query = text(f"SELECT * FROM sensor_data WHERE user_id = :user_id {device_filter_clause} ORDER BY timestamp DESC LIMIT 1")
                 logger.info(f"Trying fallback query for user {current_user['id']}")
-                result = db.execute(fallback_query, {"user_id": current_user['id']})
+                result = db.execute(fallback_query, query_params)
                 row = result.fetchone()
                 logger.debug(f"Fallback query executed, row: {row is not None}")
 
@@ -661,12 +1375,15 @@ async def get_latest_sensor_data(current_user: dict = Depends(get_current_active
                     logger.warning(f"Error processing timestamp: {e}, value: {row[5]}")
                     latest_data["timestamp"] = datetime.now().isoformat()
 
+                # Process device_id (older databases may not have the column)
+                latest_data["device_id"] = row[6] if len(row) > 6 else None
+
             except Exception as conversion_error:
                 logger.error(f"Error converting sensor data: {conversion_error}, row: {row}")
                 # We'll continue with the default values already set in latest_data
 
             logger.info(f"Successfully retrieved latest sensor data for user {current_user['id']}")
-            from fastapi.responses import JSONResponse
+            from app.core.serialization import JSONResponse
             return JSONResponse(
                 content=latest_data,
                 headers={
@@ -681,14 +1398,15 @@ async def get_latest_sensor_data(current_user: dict = Depends(get_current_active
             # Try a different approach - use ORM with explicit error handling
             try:
                 logger.info(f"Trying ORM approach for user {current_user['id']}")
-                sensor_data = db.query(SensorData).filter(
-                    SensorData.user_id == current_user['id']
-                ).order_by(SensorData.timestamp.desc()).first()
+                orm_query = db.query(SensorData).filter(SensorData.user_id == current_user['id'])
+                if device_id is not None:
+                    orm_query = orm_query.filter(SensorData.device_id == device_id)
+                sensor_data = orm_query.order_by(SensorData.timestamp.desc()).first()
 
                 if not sensor_data:
                     logger.info(f"No sensor data found using ORM for user {current_user['id']}")
                     # Return empty data instead of 404 error with CORS headers
-                    from fastapi.responses import JSONResponse
+                    from app.core.serialization import JSONResponse
                     return JSONResponse(
                         content={
                             "id": 0,
@@ -747,8 +1465,10 @@ async def get_latest_sensor_data(current_user: dict = Depends(get_current_active
                 except Exception as e:
                     logger.warning(f"Error getting timestamp from ORM: {e}")
 
+                result_data["device_id"] = sensor_data.device_id
+
                 logger.info(f"Successfully retrieved latest sensor data using ORM for user {current_user['id']}")
-                from fastapi.responses import JSONResponse
+                from app.core.serialization import JSONResponse
                 return JSONResponse(
                     content=result_data,
                     headers={
@@ -765,7 +1485,7 @@ async def get_latest_sensor_data(current_user: dict = Depends(get_current_active
 
     except HTTPException as http_exc:
         # Return HTTP exceptions with CORS headers
-        from fastapi.responses import JSONResponse
+        from app.core.serialization import JSONResponse
         return JSONResponse(
             status_code=http_exc.status_code,
             content={"detail": http_exc.detail},
@@ -778,7 +1498,7 @@ async def get_latest_sensor_data(current_user: dict = Depends(get_current_active
     except Exception as e:
         logger.error(f"Error getting latest sensor data: {e}")
         # Return a default response instead of an error with CORS headers
-        from fastapi.responses import JSONResponse
+        from app.core.serialization import JSONResponse
         return JSONResponse(
             content={
                 "id": 0,
@@ -796,6 +1516,379 @@ async def get_latest_sensor_data(current_user: dict = Depends(get_current_active
             }
         )
 
+@router.options("/obstacle/intervals", status_code=status.HTTP_200_OK)
+async def obstacle_intervals_options():
+    """
+    Handle OPTIONS requests for the obstacle intervals endpoint.
+    This is needed for CORS preflight requests.
+    """
+    return _device_cors_options("GET, OPTIONS")
+
+@router.get("/obstacle/intervals")
+async def get_obstacle_intervals(
+    start_date: str,
+    end_date: str,
+    device_id: int = None,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    When an obstacle was present between start_date and end_date, and for how long in total.
+    Read from the obstacle_events transitions table rather than the raw readings.
+    """
+    from app.core.serialization import JSONResponse
+
+    start = parse_timestamp(start_date)
+    end = parse_timestamp(end_date)
+    if start is None or end is None or end < start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date and end_date must be ISO 8601 timestamps, start first")
+
+    logger.info(f"Getting obstacle intervals for user {current_user['id']} from {start} to {end} (device_id: {device_id})")
+    return JSONResponse(
+        content=occupied_intervals(db, current_user['id'], start, end, device_id=device_id),
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+        }
+    )
+
+@router.options("/conditions/periods", status_code=status.HTTP_200_OK)
+async def condition_periods_options():
+    """
+    Handle OPTIONS requests for the condition periods endpoint.
+    This is needed for CORS preflight requests.
+    """
+    return _device_cors_options("GET, OPTIONS")
+
+@router.get("/conditions/periods")
+async def get_condition_periods(
+    metric: str,
+    operator: str,
+    threshold: float,
+    start_date: str,
+    end_date: str,
+    min_duration: float = 0,
+    device_id: int = None,
+    max_gap: float = None,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Periods where a condition held for at least `min_duration` seconds, e.g.
+    metric=temperature&operator=>&threshold=30&min_duration=600. A device silent for
+    more than `max_gap` seconds (default: two heartbeat intervals) breaks a period.
+    """
+    from app.core.serialization import JSONResponse
+
+    start = parse_timestamp(start_date)
+    end = parse_timestamp(end_date)
+    if start is None or end is None or end < start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date and end_date must be ISO 8601 timestamps, start first")
+    if metric not in CONDITION_METRICS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"metric must be one of {', '.join(CONDITION_METRICS)}")
+    if operator not in CONDITION_OPERATORS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"operator must be one of {', '.join(CONDITION_OPERATORS)}")
+    if min_duration < 0 or (max_gap is not None and max_gap <= 0):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="min_duration must not be negative and max_gap must be positive")
+    if max_gap is None:
+        max_gap = 2 * ingest_deadband.heartbeat_interval
+
+    logger.info(f"Searching {metric} {operator} {threshold} for {min_duration}s for user {current_user['id']} from {start} to {end} (device_id: {device_id})")
+    return JSONResponse(
+        content=condition_periods(
+            db, current_user['id'], metric, operator, threshold, min_duration, start, end, max_gap, device_id=device_id
+        ),
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+        }
+    )
+
+def _device_cors_options(methods: str):
+    from app.core.serialization import JSONResponse
+
+    # Return a response with CORS headers
+    return JSONResponse(
+        content={},
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": methods,
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+            "Access-Control-Max-Age": "86400",  # Cache preflight requests for 24 hours
+        }
+    )
+
+@router.options("/devices", status_code=status.HTTP_200_OK)
+async def devices_options():
+    """Handle CORS preflight requests for the device registry"""
+    return _device_cors_options("GET, POST, OPTIONS")
+
+@router.get("/devices")
+async def get_devices(current_user: dict = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    """List the current user's registered devices"""
+    from app.core.serialization import JSONResponse
+
+    return JSONResponse(
+        content={"devices": list_devices(db, current_user['id'])},
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+        }
+    )
+
+@router.post("/devices", status_code=status.HTTP_201_CREATED)
+async def register_device(
+    device: DeviceCreate,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Register a device so its readings get their own stream"""
+    from app.core.serialization import JSONResponse
+
+    name = device.name.strip()
+    if not name or len(name) > 64:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Device name must be 1-64 characters")
+
+    if device.ingest_deadband is not None and device.ingest_deadband < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ingest_deadband must not be negative")
+
+    created = create_device(db, current_user['id'], name, datetime.now(timezone.utc), device.ingest_deadband)
+    if not created:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A device with this name already exists")
+
+    logger.info(f"Registered device {created['id']} ('{name}') for user {current_user['id']}")
+    return JSONResponse(
+        status_code=status.HTTP_201_CREATED,
+        content=created,
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+        }
+    )
+
+@router.options("/devices/silent", status_code=status.HTTP_200_OK)
+async def silent_devices_options():
+    """Handle CORS preflight requests for the silent devices view"""
+    return _device_cors_options("GET, OPTIONS")
+
+@router.get("/devices/silent")
+async def get_silent_devices(
+    min_silence: float = 300,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Devices that haven't sent a reading for at least `min_silence` seconds, from the
+    last-seen times this worker keeps in memory. Registered devices that haven't
+    reported since the worker started are listed with a null last_seen.
+    """
+    from app.core.serialization import JSONResponse
+
+    if min_silence < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="min_silence must not be negative")
+
+    silent = manager.silent_devices(current_user['id'], min_silence)
+    seen = manager.last_seen.get(current_user['id'], {})
+    devices = list_devices(db, current_user['id'])
+    names = {device["id"]: device["name"] for device in devices}
+    for entry in silent:
+        entry["name"] = names.get(entry["device_id"])
+    for device in devices:
+        if device["id"] not in seen:
+            silent.append({
+                "device_id": device["id"],
+                "name": device["name"],
+                "last_seen": None,
+                "silent_seconds": None,
+                "connected": device["id"] in manager.device_connections
+            })
+
+    return JSONResponse(
+        content={
+            "min_silence": min_silence,
+            "tracking_since": datetime.utcfromtimestamp(manager.tracking_since).isoformat(),
+            "devices": silent,
+            "count": len(silent)
+        },
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+        }
+    )
+
+@router.options("/devices/{device_id}", status_code=status.HTTP_200_OK)
+async def device_options(device_id: int):
+    """Handle CORS preflight requests for device settings"""
+    return _device_cors_options("PATCH, OPTIONS")
+
+@router.patch("/devices/{device_id}")
+async def update_device(
+    device_id: int,
+    settings: DeviceUpdate,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Change a device's ingest deadband (null reverts to the server default)"""
+    from app.core.serialization import JSONResponse
+
+    if settings.ingest_deadband is not None and settings.ingest_deadband < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ingest_deadband must not be negative")
+
+    updated = update_device_deadband(db, device_id, current_user['id'], settings.ingest_deadband)
+    if not updated:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
+    ingest_deadband.set_tolerance(device_id, settings.ingest_deadband)
+
+    logger.info(f"Device {device_id} ingest deadband set to {settings.ingest_deadband} for user {current_user['id']}")
+    return JSONResponse(
+        content=updated,
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "PATCH, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+        }
+    )
+
+@router.options("/devices/{device_id}/series", status_code=status.HTTP_200_OK)
+async def device_series_options(device_id: int):
+    """Handle CORS preflight requests for a device's step-wise series"""
+    return _device_cors_options("GET, OPTIONS")
+
+@router.get("/devices/{device_id}/series")
+async def get_device_series(
+    device_id: int,
+    start_date: str,
+    end_date: str,
+    step: float = 60,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    A device's readings resampled every `step` seconds. Deadband-compressed rows are
+    carried forward until the next stored row; points more than two heartbeat intervals
+    after the last row (the device was silent) are null.
+    """
+    from app.core.serialization import JSONResponse
+
+    start = parse_timestamp(start_date)
+    end = parse_timestamp(end_date)
+    if start is None or end is None or end < start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date and end_date must be ISO 8601 timestamps, start first")
+    if step <= 0 or (end - start).total_seconds() / step > SERIES_MAX_POINTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"step must be positive and give at most {SERIES_MAX_POINTS} points")
+    if not get_device(db, device_id, current_user['id']):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
+
+    params = {"user_id": current_user['id'], "device_id": device_id, "start": start, "end": end}
+    # The row in force at `start` is the last one stored at or before it
+    previous = db.execute(text("""
+        SELECT timestamp, temperature, humidity, obstacle FROM sensor_data
+        WHERE user_id = :user_id AND device_id = :device_id AND timestamp <= :start
+        ORDER BY timestamp DESC
+        LIMIT 1
+    """), params).fetchall()
+    rows = db.execute(text("""
+        SELECT timestamp, temperature, humidity, obstacle FROM sensor_data
+        WHERE user_id = :user_id AND device_id = :device_id AND timestamp > :start AND timestamp <= :end
+        ORDER BY timestamp
+    """), params).fetchall()
+    rows = [(parse_timestamp(row[0]), row[1], row[2], row[3]) for row in previous + rows]
+
+    points = step_series(rows, start, end, step, max_gap=2 * ingest_deadband.heartbeat_interval)
+    return JSONResponse(
+        content={"device_id": device_id, "step": step, "points": points},
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+        }
+    )
+
+@router.options("/devices/{device_id}/gaps", status_code=status.HTTP_200_OK)
+async def device_gaps_options(device_id: int):
+    """Handle CORS preflight requests for a device's reporting gaps"""
+    return _device_cors_options("GET, OPTIONS")
+
+@router.get("/devices/{device_id}/gaps")
+async def get_device_gaps(
+    device_id: int,
+    start_date: str,
+    end_date: str,
+    min_gap: float = 600,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Periods of at least `min_gap` seconds in which a device stored no readings, i.e.
+    when it stopped reporting and for how long. A device still silent at end_date
+    gets a final ongoing gap.
+    """
+    from app.core.serialization import JSONResponse
+
+    start = parse_timestamp(start_date)
+    end = parse_timestamp(end_date)
+    if start is None or end is None or end < start:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date and end_date must be ISO 8601 timestamps, start first")
+    if min_gap <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="min_gap must be positive")
+    if not get_device(db, device_id, current_user['id']):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
+
+    logger.info(f"Getting gaps over {min_gap}s for device {device_id} of user {current_user['id']} from {start} to {end}")
+    return JSONResponse(
+        content=reading_gaps(db, current_user['id'], device_id, start, end, min_gap),
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
+        }
+    )
+
+@router.options("/devices/{device_id}/data", status_code=status.HTTP_200_OK)
+async def device_sensor_data_options(device_id: int):
+    """Handle CORS preflight requests for device-scoped sensor data"""
+    return _device_cors_options("GET, OPTIONS")
+
+@router.get("/devices/{device_id}/data")
+async def get_device_sensor_data(
+    device_id: int,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+    start_date: str = None,
+    end_date: str = None,
+    page: int = 1,
+    page_size: int = 10
+):
+    """Paginated sensor data from a single device, same format as /data"""
+    return await get_sensor_data(
+        current_user=current_user,
+        db=db,
+        start_date=start_date,
+        end_date=end_date,
+        page=page,
+        page_size=page_size,
+        device_id=device_id
+    )
+
+@router.options("/devices/{device_id}/data/latest", status_code=status.HTTP_200_OK)
+async def device_latest_sensor_data_options(device_id: int):
+    """Handle CORS preflight requests for a device's latest reading"""
+    return _device_cors_options("GET, OPTIONS")
+
+@router.get("/devices/{device_id}/data/latest")
+async def get_device_latest_sensor_data(
+    device_id: int,
+    current_user: dict = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Latest reading from a single device, same format as /data/latest"""
+    return await get_latest_sensor_data(current_user=current_user, db=db, device_id=device_id)
+
 @router.get("/data/check")
 async def check_sensor_data(current_user: dict = Depends(get_current_active_user), db: Session = Depends(get_db)):
     """Check if the user has any sensor data and return diagnostic information"""
@@ -0,0 +1,89 @@
+"""
+Admission control for new WebSocket handshakes.
+
+After a deploy or a network outage the whole fleet reconnects at once, and
+every handshake costs authentication plus `manager.connect`. A token bucket
+caps how many handshakes we accept per second. Devices over the limit are
+told when to come back: each one is booked a future slot at the admission
+rate and given a randomized delay around it, so the retries arrive spread
+out instead of as a second stampede.
+"""
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+WS_ADMISSION_RATE = float(os.getenv("WS_ADMISSION_RATE", "50"))
+WS_ADMISSION_BURST = float(os.getenv("WS_ADMISSION_BURST", "100"))
+WS_RETRY_MIN_DELAY = float(os.getenv("WS_RETRY_MIN_DELAY", "1"))
+WS_RETRY_MAX_DELAY = float(os.getenv("WS_RETRY_MAX_DELAY", "60"))
+
+# "Try Again Later" close code from the IANA WebSocket registry
+WS_TRY_AGAIN_LATER = 1013
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated: Optional[float] = None
+
+    def try_acquire(self, now: float) -> bool:
+        if self.updated is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+class AdmissionController:
+    def __init__(
+        self,
+        rate: float = WS_ADMISSION_RATE,
+        burst: float = WS_ADMISSION_BURST,
+        min_retry_delay: float = WS_RETRY_MIN_DELAY,
+        max_retry_delay: float = WS_RETRY_MAX_DELAY,
+        rng: Optional[random.Random] = None
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.min_retry_delay = min_retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.random = rng or random.Random()
+        # Time of the last retry slot handed out to a rejected client
+        self.next_slot = 0.0
+        self.admitted = 0
+        self.rejected = 0
+
+    def admit(self, now: Optional[float] = None) -> Optional[float]:
+        """Return None if the handshake may proceed, otherwise the suggested retry delay in seconds"""
+        now = time.monotonic() if now is None else now
+        if self.bucket.try_acquire(now):
+            self.admitted += 1
+            return None
+
+        self.rejected += 1
+        return self.retry_delay(now)
+
+    def retry_delay(self, now: float) -> float:
+        # Book the next free slot at the admission rate, so the backlog drains at the
+        # rate we can accept, then jitter +/-50% around it to break up synchronized clients
+        slot = max(self.next_slot, now) + 1.0 / self.bucket.rate
+        self.next_slot = min(slot, now + self.max_retry_delay / 1.5)
+        delay = (self.next_slot - now) * self.random.uniform(0.5, 1.5)
+        return round(max(delay, self.min_retry_delay), 1)
+
+    def stats(self) -> dict:
+        return {
+            "rate_per_second": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "tokens": round(self.bucket.tokens, 2),
+            "admitted": self.admitted,
+            "rejected": self.rejected
+        }
+
+# Create a global admission controller instance
+admission = AdmissionController()
@@ -0,0 +1,217 @@
+"""
+Threshold alert rules evaluated at ingest.
+
+Rules ("temperature > 30 for 300 seconds", "humidity < 20") are indexed by
+(user, device, metric), and within that by operator in lists sorted by
+threshold. A reading therefore finds the rules it satisfies with a binary
+search instead of testing every rule. Each satisfied rule moves through a
+small state machine per device: pending when its condition starts holding,
+firing once it has held for the rule's duration, and cleared (with a
+"resolved" event if it had fired) on the first reading where it no longer
+holds. Rules without a device apply to all of the user's devices, with
+separate state per device.
+
+The index is kept up to date by the CRUD endpoints in this process and
+reloaded from the database every ALERT_RULES_REFRESH seconds to pick up
+changes made on other workers.
+"""
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+ALERT_RULES_REFRESH = float(os.getenv("ALERT_RULES_REFRESH", "60"))
+ALERT_MAX_RULES_PER_USER = int(os.getenv("ALERT_MAX_RULES_PER_USER", "100"))
+
+ALERT_METRICS = ("temperature", "humidity", "obstacle")
+ALERT_OPERATORS = (">", ">=", "<", "<=")
+
+class ThresholdIndex:
+    """The rules on one metric in one scope, kept sorted by threshold per operator"""
+    __slots__ = ("entries",)
+
+    def __init__(self):
+        # operator -> sorted [(threshold, rule_id)]
+        self.entries: Dict[str, List[Tuple[float, int]]] = {operator: [] for operator in ALERT_OPERATORS}
+
+    def add(self, operator: str, threshold: float, rule_id: int):
+        insort(self.entries[operator], (threshold, rule_id))
+
+    def remove(self, operator: str, threshold: float, rule_id: int):
+        entries = self.entries[operator]
+        index = bisect_left(entries, (threshold, rule_id))
+        if index < len(entries) and entries[index] == (threshold, rule_id):
+            del entries[index]
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.entries.values())
+
+    def matching(self, value: float) -> Iterator[int]:
+        """Ids of the rules whose condition holds for `value`"""
+        # Sentinels on the rule id sort before/after every real entry with the same threshold
+        entries = self.entries[">"]
+        for _, rule_id in entries[:bisect_left(entries, (value, -1))]:
+            yield rule_id
+        entries = self.entries[">="]
+        for _, rule_id in entries[:bisect_right(entries, (value, float("inf")))]:
+            yield rule_id
+        entries = self.entries["<"]
+        for _, rule_id in entries[bisect_right(entries, (value, float("inf"))):]:
+            yield rule_id
+        entries = self.entries["<="]
+        for _, rule_id in entries[bisect_left(entries, (value, -1)):]:
+            yield rule_id
+
+class AlertEngine:
+    def __init__(self, refresh_interval: float = ALERT_RULES_REFRESH):
+        self.refresh_interval = refresh_interval
+        self.rules: Dict[int, dict] = {}
+        # (user_id, device_id or None for all devices, metric) -> rules on that metric
+        self._index: Dict[Tuple[int, Optional[int], str], ThresholdIndex] = {}
+        # (user_id, device_id of the reading, metric) -> {rule_id: [condition_since, firing]}
+        self._states: Dict[Tuple[int, Optional[int], str], Dict[int, list]] = {}
+        self.evaluations = 0
+        self.events = 0
+
+    def add_rule(self, rule: dict):
+        """Index an active rule, replacing any older version of it"""
+        self.remove_rule(rule["id"])
+        if not rule.get("is_active", True):
+            return
+        self.rules[rule["id"]] = rule
+        key = (rule["user_id"], rule["device_id"], rule["metric"])
+        index = self._index.get(key)
+        if index is None:
+            index = self._index[key] = ThresholdIndex()
+        index.add(rule["operator"], rule["threshold"], rule["id"])
+
+    def remove_rule(self, rule_id: int):
+        rule = self.rules.pop(rule_id, None)
+        if rule is None:
+            return
+        key = (rule["user_id"], rule["device_id"], rule["metric"])
+        index = self._index.get(key)
+        if index is not None:
+            index.remove(rule["operator"], rule["threshold"], rule_id)
+            if not len(index):
+                del self._index[key]
+        for states in self._states.values():
+            states.pop(rule_id, None)
+
+    def load(self, rules: List[dict]):
+        """Replace the whole index, keeping the state of rules that still exist unchanged"""
+        old_rules = self.rules
+        self.rules = {}
+        self._index = {}
+        for rule in rules:
+            self.add_rule(rule)
+        for states in self._states.values():
+            for rule_id in list(states):
+                if self.rules.get(rule_id) != old_rules.get(rule_id):
+                    del states[rule_id]
+
+    def evaluate(self, reading: dict, now: Optional[float] = None) -> List[dict]:
+        """Advance the rules a reading touches and return the alert events it causes"""
+        now = time.time() if now is None else now
+        user_id = reading["user_id"]
+        device_id = reading.get("device_id")
+        scopes = (device_id, None) if device_id is not None else (None,)
+        self.evaluations += 1
+
+        events = []
+        for metric in ALERT_METRICS:
+            value = float(reading[metric])
+            state_key = (user_id, device_id, metric)
+            states = self._states.get(state_key)
+
+            matched = []
+            for scope in scopes:
+                index = self._index.get((user_id, scope, metric))
+                if index is not None:
+                    matched.extend(index.matching(value))
+            if not matched and not states:
+                continue
+            if states is None:
+                states = self._states[state_key] = {}
+
+            for rule_id in matched:
+                state = states.get(rule_id)
+                if state is None:
+                    state = states[rule_id] = [now, False]
+                rule = self.rules[rule_id]
+                if not state[1] and now - state[0] >= rule["duration_seconds"]:
+                    state[1] = True
+                    events.append(self._event("firing", rule, reading, value))
+
+            if len(states) > len(matched):
+                still_holding = set(matched)
+                for rule_id in [rule_id for rule_id in states if rule_id not in still_holding]:
+                    if states.pop(rule_id)[1]:
+                        events.append(self._event("resolved", self.rules[rule_id], reading, value))
+            if not states:
+                del self._states[state_key]
+
+        self.events += len(events)
+        return events
+
+    def _event(self, state: str, rule: dict, reading: dict, value: float) -> dict:
+        return {
+            "type": "alert",
+            "state": state,
+            "rule_id": rule["id"],
+            "name": rule["name"],
+            "metric": rule["metric"],
+            "operator": rule["operator"],
+            "threshold": rule["threshold"],
+            "duration_seconds": rule["duration_seconds"],
+            "value": value,
+            "user_id": reading["user_id"],
+            "device_id": reading.get("device_id"),
+            "reading_id": reading.get("id"),
+            "timestamp": reading.get("timestamp")
+        }
+
+    def refresh(self, db: Session):
+        """Reload every active rule"""
+        from app.core.db_utils import list_active_alert_rules
+        self.load(list_active_alert_rules(db))
+
+    def _fetch_from_new_session(self) -> List[dict]:
+        from app.core.db_utils import list_active_alert_rules
+        db = SessionLocal()
+        try:
+            return list_active_alert_rules(db)
+        finally:
+            db.close()
+
+    async def run(self):
+        """Refresh the rule index forever; started from the application lifespan"""
+        while True:
+            try:
+                # Only the query runs in a thread. The index is swapped on the event loop,
+                # so an evaluate() never sees it half rebuilt.
+                self.load(await asyncio.to_thread(self._fetch_from_new_session))
+            except Exception as e:
+                logger.error(f"Error refreshing alert rules: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def stats(self) -> dict:
+        return {
+            "rules": len(self.rules),
+            "indexes": len(self._index),
+            "tracked_conditions": sum(len(states) for states in self._states.values()),
+            "evaluations": self.evaluations,
+            "events": self.events
+        }
+
+# Create a global alert engine instance
+alert_engine = AlertEngine()
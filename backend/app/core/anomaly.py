@@ -0,0 +1,120 @@
+"""
+Streaming anomaly detection on ingested readings.
+
+Each device keeps an exponentially weighted mean and variance per metric,
+updated in O(1) per reading with no history queries. Once a device has seen
+enough readings to trust its baseline, a reading more than
+ANOMALY_Z_THRESHOLD standard deviations from the mean is flagged as a spike,
+and values outside the DHT22's physical range are flagged as sensor faults
+straight away. Spikes are clamped to the threshold before being folded into
+the statistics, so one bad reading doesn't blow up the variance and hide the
+next one, while a genuine level shift is still followed over time.
+"""
+import logging
+import math
+import os
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ANOMALY_ALPHA = float(os.getenv("ANOMALY_ALPHA", "0.05"))
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "4"))
+ANOMALY_WARMUP = int(os.getenv("ANOMALY_WARMUP", "30"))
+ANOMALY_MAX_DEVICES = int(os.getenv("ANOMALY_MAX_DEVICES", "10000"))
+
+# Noise floor per metric, so a perfectly flat series doesn't flag a 0.1 step as infinite z
+MIN_STD = {"temperature": 0.1, "humidity": 0.3}
+# DHT22 measurement range; anything outside is a sensor or wiring fault
+VALID_RANGE = {"temperature": (-40.0, 80.0), "humidity": (0.0, 100.0)}
+
+class EwmaStats:
+    """Exponentially weighted mean and variance of one metric"""
+    __slots__ = ("mean", "var", "count")
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def update(self, value: float, alpha: float):
+        if self.count == 0:
+            self.mean = value
+        else:
+            delta = value - self.mean
+            self.mean += alpha * delta
+            self.var = (1 - alpha) * (self.var + alpha * delta * delta)
+        self.count += 1
+
+class AnomalyDetector:
+    metrics = ("temperature", "humidity")
+
+    def __init__(
+        self,
+        alpha: float = ANOMALY_ALPHA,
+        z_threshold: float = ANOMALY_Z_THRESHOLD,
+        warmup: int = ANOMALY_WARMUP,
+        max_devices: int = ANOMALY_MAX_DEVICES
+    ):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.max_devices = max_devices
+        # (user_id, device_id) -> one EwmaStats per metric
+        self._stats: "OrderedDict[Tuple[int, Optional[int]], Tuple[EwmaStats, ...]]" = OrderedDict()
+        self.checked = 0
+        self.flagged = 0
+
+    def check(self, user_id: int, device_id: Optional[int], reading: dict) -> List[dict]:
+        """Update the device's statistics with a reading and return its anomalies, if any"""
+        key = (user_id, device_id)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = tuple(EwmaStats() for _ in self.metrics)
+            while len(self._stats) > self.max_devices:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(key)
+        self.checked += 1
+
+        anomalies = []
+        for metric, metric_stats in zip(self.metrics, stats):
+            value = reading[metric]
+            low, high = VALID_RANGE[metric]
+            if not low <= value <= high:
+                # Faulty values (NaN included) say nothing about the environment, so keep them out of the baseline
+                anomalies.append({"metric": metric, "kind": "out_of_range", "value": value})
+                continue
+
+            if metric_stats.count < self.warmup:
+                metric_stats.update(value, self.alpha)
+                continue
+
+            std = max(math.sqrt(metric_stats.var), MIN_STD[metric])
+            z_score = (value - metric_stats.mean) / std
+            if abs(z_score) > self.z_threshold:
+                anomalies.append({
+                    "metric": metric,
+                    "kind": "spike",
+                    "value": value,
+                    "z_score": round(z_score, 2),
+                    "mean": round(metric_stats.mean, 2),
+                    "std": round(std, 3)
+                })
+                value = metric_stats.mean + math.copysign(self.z_threshold * std, z_score)
+            metric_stats.update(value, self.alpha)
+
+        if anomalies:
+            self.flagged += 1
+        return anomalies
+
+    def stats(self) -> dict:
+        return {
+            "devices": len(self._stats),
+            "checked": self.checked,
+            "flagged": self.flagged,
+            "z_threshold": self.z_threshold
+        }
+
+# Create a global anomaly detector instance
+anomaly_detector = AnomalyDetector()
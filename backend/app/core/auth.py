@@ -11,6 +11,8 @@ from dotenv import load_dotenv
 from app.db.database import get_db
 from app.models.user import User
 from app.core import db_utils
+from app.core.user_cache import user_cache
+from app.core.password_pool import password_pool, PasswordPoolSaturated
 from app.schemas.token import TokenData
 
 # Load environment variables
@@ -35,20 +37,51 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-# Get user by username
+def _password_pool_busy():
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many password operations in progress, please try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+# Verify password on the bounded hash pool so bcrypt doesn't block the event loop
+async def verify_password_async(plain_password, hashed_password):
+    try:
+        return await password_pool.run(verify_password, plain_password, hashed_password)
+    except PasswordPoolSaturated:
+        raise _password_pool_busy()
+
+# Hash password on the bounded hash pool so bcrypt doesn't block the event loop
+async def get_password_hash_async(password):
+    try:
+        return await password_pool.run(get_password_hash, password)
+    except PasswordPoolSaturated:
+        raise _password_pool_busy()
+
+# Get user by username, served from the user cache when possible
 def get_user(db: Session, username: str):
+    user = user_cache.get(username)
+    if user is not None:
+        return user
+
     # Use our safe db_utils function
-    return db_utils.get_user_by_username(db, username)
+    user = db_utils.get_user_by_username(db, username)
+    if user is not None:
+        user_cache.set(username, user)
+    return user
 
 # Authenticate user
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user(db, username)
+async def authenticate_user(db: Session, username: str, password: str):
+    # Always check credentials against the database, but refresh the cache while we're at it
+    user = db_utils.get_user_by_username(db, username)
+    if user:
+        user_cache.set(username, user)
     if not user:
         # Don't reveal that the user doesn't exist
         return False
 
     # Basic authentication
-    if not verify_password(password, user['hashed_password']):
+    if not await verify_password_async(password, user['hashed_password']):
         return False
 
     return user
@@ -0,0 +1,166 @@
+"""
+Condition-duration search over stored readings.
+
+Answers "when was the temperature above 30 for at least 10 minutes" without
+shipping the raw rows to the client. A period is a run of one device's
+consecutive readings that satisfy the condition. It ends at the first reading
+that doesn't, or at the last matching reading if the device went silent for
+more than `max_gap` seconds. Because a deadband-compressed row stands for
+every reading until the next one, the period runs up to that next reading.
+
+On Postgres the runs are found in the database with window functions
+(gaps-and-islands) and only the periods come back. Elsewhere (SQLite) the
+rows are streamed in CONDITION_SCAN_CHUNK chunks through a run-length pass
+that only keeps the current run in memory.
+"""
+import logging
+import operator
+import os
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.recent import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+CONDITION_SCAN_CHUNK = int(os.getenv("CONDITION_SCAN_CHUNK", "5000"))
+CONDITION_MAX_PERIODS = int(os.getenv("CONDITION_MAX_PERIODS", "1000"))
+
+CONDITION_METRICS = ("temperature", "humidity")
+CONDITION_OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+def _period(device_id, started_at: datetime, ended_at: datetime, readings: int, low: float, high: float) -> dict:
+    return {
+        "device_id": device_id,
+        "start": started_at.isoformat(),
+        "end": ended_at.isoformat(),
+        "duration_seconds": (ended_at - started_at).total_seconds(),
+        "readings": readings,
+        "min_value": low,
+        "max_value": high
+    }
+
+def scan_runs(rows: Iterable[tuple], op: str, threshold: float, max_gap: float) -> Iterator[list]:
+    """
+    Run-length pass over (device_id, timestamp, value) rows ordered by device and time.
+    Yields [device_id, started_at, ended_at, readings, min_value, max_value] per run.
+    """
+    compare = CONDITION_OPERATORS[op]
+    run = None
+    previous_device = previous_timestamp = None
+    for device_id, timestamp, value in rows:
+        timestamp = parse_timestamp(timestamp)
+        contiguous = (
+            previous_timestamp is not None and device_id == previous_device
+            and (timestamp - previous_timestamp).total_seconds() <= max_gap
+        )
+        if run is not None and not contiguous:
+            yield run
+            run = None
+
+        if value is not None and compare(value, threshold):
+            if run is None:
+                run = [device_id, timestamp, timestamp, 0, value, value]
+            run[2] = timestamp
+            run[3] += 1
+            if value < run[4]:
+                run[4] = value
+            elif value > run[5]:
+                run[5] = value
+        elif run is not None:
+            # The condition held until this reading replaced the last matching one
+            run[2] = timestamp
+            yield run
+            run = None
+        previous_device, previous_timestamp = device_id, timestamp
+    if run is not None:
+        yield run
+
+def _periods_sql(db: Session, metric: str, op: str, params: dict, device_filter: str) -> List[dict]:
+    """Gaps-and-islands in the database: number the runs with a running sum, then group them"""
+    rows = db.execute(text(f"""
+        WITH ordered AS (
+            SELECT id, device_id, timestamp AS ts, {metric} AS value,
+                   {metric} {op} :threshold AS hit,
+                   LAG({metric} {op} :threshold) OVER w AS previous_hit,
+                   LAG(timestamp) OVER w AS previous_ts,
+                   LEAD(timestamp) OVER w AS next_ts
+            FROM sensor_data
+            WHERE user_id = :user_id {device_filter} AND timestamp >= :start AND timestamp <= :end
+            WINDOW w AS (PARTITION BY device_id ORDER BY timestamp, id)
+        ), islands AS (
+            SELECT id, device_id, ts, value, next_ts,
+                   SUM(CASE WHEN previous_hit AND EXTRACT(EPOCH FROM ts - previous_ts) <= :max_gap THEN 0 ELSE 1 END)
+                       OVER (PARTITION BY device_id ORDER BY ts, id) AS island
+            FROM ordered
+            WHERE hit
+        )
+        SELECT device_id, started_at, ended_at, readings, min_value, max_value FROM (
+            SELECT device_id, MIN(ts) AS started_at,
+                   MAX(CASE WHEN EXTRACT(EPOCH FROM next_ts - ts) <= :max_gap THEN next_ts ELSE ts END) AS ended_at,
+                   COUNT(*) AS readings, MIN(value) AS min_value, MAX(value) AS max_value
+            FROM islands
+            GROUP BY device_id, island
+        ) periods
+        WHERE EXTRACT(EPOCH FROM ended_at - started_at) >= :min_duration
+        ORDER BY started_at
+        LIMIT :limit
+    """), params).fetchall()
+    return [
+        _period(device_id, parse_timestamp(started_at), parse_timestamp(ended_at), readings, low, high)
+        for device_id, started_at, ended_at, readings, low, high in rows
+    ]
+
+def _periods_scan(db: Session, metric: str, op: str, params: dict, device_filter: str) -> List[dict]:
+    """Stream the rows in chunks through scan_runs, keeping only runs long enough to report"""
+    result = db.execute(
+        text(f"""
+            SELECT device_id, timestamp, {metric} FROM sensor_data
+            WHERE user_id = :user_id {device_filter} AND timestamp >= :start AND timestamp <= :end
+            ORDER BY device_id, timestamp, id
+        """).execution_options(yield_per=CONDITION_SCAN_CHUNK),
+        params
+    )
+    periods = []
+    for run in scan_runs(result, op, params["threshold"], params["max_gap"]):
+        if (run[2] - run[1]).total_seconds() >= params["min_duration"]:
+            periods.append(_period(*run))
+    # Runs come out device by device; report them in time order like the SQL path
+    periods.sort(key=lambda period: period["start"])
+    return periods[:params["limit"]]
+
+def condition_periods(db: Session, user_id: int, metric: str, op: str, threshold: float, min_duration: float,
+                      start: datetime, end: datetime, max_gap: float, device_id: Optional[int] = None,
+                      limit: int = CONDITION_MAX_PERIODS) -> dict:
+    """Periods in [start, end] where `metric op threshold` held for at least `min_duration` seconds"""
+    if metric not in CONDITION_METRICS or op not in CONDITION_OPERATORS:
+        raise ValueError(f"Unsupported condition {metric} {op}")
+    device_filter = "AND device_id = :device_id" if device_id is not None else ""
+    params = {
+        "user_id": user_id, "device_id": device_id, "start": start, "end": end, "threshold": threshold,
+        "min_duration": min_duration, "max_gap": max_gap, "limit": limit + 1
+    }
+
+    if db.get_bind().dialect.name == "postgresql":
+        periods = _periods_sql(db, metric, op, params, device_filter)
+    else:
+        periods = _periods_scan(db, metric, op, params, device_filter)
+
+    truncated = len(periods) > limit
+    periods = periods[:limit]
+    return {
+        "metric": metric,
+        "operator": op,
+        "threshold": threshold,
+        "min_duration": min_duration,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "device_id": device_id,
+        "periods": periods,
+        "count": len(periods),
+        "truncated": truncated,
+        "total_seconds": sum(period["duration_seconds"] for period in periods)
+    }
@@ -0,0 +1,145 @@
+"""
+Everything the dashboard needs on load, in one response.
+
+The web and mobile dashboards used to call /data/latest, /data and /data/check
+one after another, paying for authentication, a pool checkout and a COUNT(*)
+over all of the user's readings each time. The snapshot answers the same
+questions with three index-range queries on a single session: the newest
+reading, the last DASHBOARD_WINDOW_HOURS averaged into about `points` buckets
+(the summary statistics are folded from those buckets), and reading counts
+per day for the last DASHBOARD_DAYS days. NULL temperatures and humidities
+are left out of the averages, and a bucket with none reports null.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_POINTS = int(os.getenv("DASHBOARD_POINTS", "144"))
+DASHBOARD_MAX_POINTS = int(os.getenv("DASHBOARD_MAX_POINTS", "1440"))
+DASHBOARD_WINDOW_HOURS = int(os.getenv("DASHBOARD_WINDOW_HOURS", "24"))
+DASHBOARD_DAYS = int(os.getenv("DASHBOARD_DAYS", "7"))
+
+def _bucket(db: Session, column: str) -> str:
+    """SQL numbering the :bucket_seconds wide time buckets since the Unix epoch"""
+    if db.get_bind().dialect.name == "postgresql":
+        return f"FLOOR(EXTRACT(EPOCH FROM {column}) / :bucket_seconds)"
+    return f"CAST(strftime('%s', {column}) AS INTEGER) / :bucket_seconds"
+
+def _timestamp(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+def _summary(buckets: list) -> dict:
+    """Fold per-bucket aggregates into statistics for the whole window"""
+    count = sum(bucket["count"] for bucket in buckets)
+    if not count:
+        return {"count": 0, "temperature": None, "humidity": None, "obstacle_ratio": None}
+
+    def metric(name):
+        # Readings with a NULL value are left out of AVG/MIN/MAX, and buckets where all of them were NULL
+        measured = [bucket for bucket in buckets if bucket[f"{name}_count"]]
+        if not measured:
+            return None
+        return {
+            "min": min(bucket[f"{name}_min"] for bucket in measured),
+            "max": max(bucket[f"{name}_max"] for bucket in measured),
+            "avg": round(
+                sum(bucket[name] * bucket[f"{name}_count"] for bucket in measured)
+                / sum(bucket[f"{name}_count"] for bucket in measured), 2
+            )
+        }
+
+    return {
+        "count": count,
+        "temperature": metric("temperature"),
+        "humidity": metric("humidity"),
+        "obstacle_ratio": round(sum(bucket["obstacle_count"] for bucket in buckets) / count, 4)
+    }
+
+def dashboard_snapshot(db: Session, user_id: int, device_id: Optional[int] = None, points: int = DASHBOARD_POINTS,
+                       now: Optional[datetime] = None) -> dict:
+    """Latest reading, downsampled recent series, its statistics and daily counts for a user or one device"""
+    now = now or datetime.utcnow()
+    window_start = now - timedelta(hours=DASHBOARD_WINDOW_HOURS)
+    bucket_seconds = max(1, DASHBOARD_WINDOW_HOURS * 3600 // points)
+    device_filter = "AND device_id = :device_id" if device_id is not None else ""
+    params = {
+        "user_id": user_id, "device_id": device_id, "window_start": window_start,
+        "days_start": (now - timedelta(days=DASHBOARD_DAYS - 1)).replace(hour=0, minute=0, second=0, microsecond=0),
+        "bucket_seconds": bucket_seconds
+    }
+
+    latest = db.execute(text(f"""
+        SELECT id, temperature, humidity, obstacle, user_id, timestamp, device_id
+        FROM sensor_data
+        WHERE user_id = :user_id {device_filter}
+        ORDER BY timestamp DESC
+        LIMIT 1
+    """), params).fetchone()
+
+    rows = db.execute(text(f"""
+        SELECT {_bucket(db, 'timestamp')} AS bucket, COUNT(*),
+               AVG(temperature), MIN(temperature), MAX(temperature),
+               AVG(humidity), MIN(humidity), MAX(humidity),
+               SUM(CASE WHEN obstacle THEN 1 ELSE 0 END),
+               COUNT(temperature), COUNT(humidity)
+        FROM sensor_data
+        WHERE user_id = :user_id {device_filter} AND timestamp >= :window_start
+        GROUP BY bucket
+        ORDER BY bucket
+    """), params).fetchall()
+    series = [
+        {
+            "timestamp": datetime.utcfromtimestamp(int(row[0]) * bucket_seconds).isoformat(),
+            "count": row[1],
+            "temperature": round(float(row[2]), 2) if row[2] is not None else None,
+            "temperature_min": row[3],
+            "temperature_max": row[4],
+            "temperature_count": row[9],
+            "humidity": round(float(row[5]), 2) if row[5] is not None else None,
+            "humidity_min": row[6],
+            "humidity_max": row[7],
+            "humidity_count": row[10],
+            "obstacle_count": int(row[8] or 0)
+        }
+        for row in rows
+    ]
+
+    daily_counts = db.execute(text(f"""
+        SELECT DATE(timestamp) AS day, COUNT(*)
+        FROM sensor_data
+        WHERE user_id = :user_id {device_filter} AND timestamp >= :days_start
+        GROUP BY DATE(timestamp)
+        ORDER BY day DESC
+    """), params).fetchall()
+
+    return {
+        "user_id": user_id,
+        "device_id": device_id,
+        "generated_at": now.isoformat(),
+        "has_data": latest is not None,
+        "latest": {
+            "id": latest[0],
+            "temperature": latest[1],
+            "humidity": latest[2],
+            "obstacle": bool(latest[3]),
+            "user_id": latest[4],
+            "timestamp": _timestamp(latest[5]),
+            "device_id": latest[6]
+        } if latest is not None else None,
+        "series": {
+            "start": window_start.isoformat(),
+            "end": now.isoformat(),
+            "bucket_seconds": bucket_seconds,
+            "points": series
+        },
+        "stats": _summary(series),
+        "daily_counts": [{"date": str(day), "count": count} for day, count in daily_counts]
+    }
@@ -0,0 +1,136 @@
+"""
+Immutable per-day reading files on local disk.
+
+Readings are timestamped by the server at insert time, so once a UTC day is
+over (plus DAY_ARCHIVE_GRACE seconds for inserts still committing) its
+readings never change. The first request for such a day writes them as
+gzipped JSON to DAY_ARCHIVE_DIR/<user>/<device or "all">/<day>.json.gz and
+every later request is served from that file without touching the database.
+Only the current day is read from the database each time. Files are written
+to a temporary name and renamed into place, so concurrent requests and
+workers never see a partial file.
+"""
+import gzip
+import logging
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+DAY_ARCHIVE_DIR = os.getenv("DAY_ARCHIVE_DIR", "./day_archive")
+DAY_ARCHIVE_GRACE = float(os.getenv("DAY_ARCHIVE_GRACE", "60"))
+
+def _reading(row) -> dict:
+    timestamp = row[5]
+    return {
+        "id": row[0],
+        "temperature": row[1],
+        "humidity": row[2],
+        "obstacle": bool(row[3]),
+        "user_id": row[4],
+        "timestamp": timestamp.isoformat() if hasattr(timestamp, "isoformat") else str(timestamp),
+        "device_id": row[6]
+    }
+
+def day_readings(db: Session, user_id: int, day: date, device_id: Optional[int] = None) -> dict:
+    """A day's readings, oldest first, as the JSON body served for that day"""
+    device_filter = "AND device_id = :device_id" if device_id is not None else ""
+    start = datetime(day.year, day.month, day.day)
+    rows = db.execute(text(f"""
+        SELECT id, temperature, humidity, obstacle, user_id, timestamp, device_id
+        FROM sensor_data
+        WHERE user_id = :user_id {device_filter} AND timestamp >= :start AND timestamp < :end
+        ORDER BY timestamp, id
+    """), {"user_id": user_id, "device_id": device_id, "start": start, "end": start + timedelta(days=1)}).fetchall()
+    readings = [_reading(row) for row in rows]
+    return {"date": day.isoformat(), "device_id": device_id, "count": len(readings), "data": readings}
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip, honouring q-values ("gzip;q=0" refuses it)"""
+    wildcard = None
+    for entry in accept_encoding.split(","):
+        coding, _, params = entry.partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding in ("gzip", "x-gzip"):
+            return quality > 0
+        if coding == "*":
+            wildcard = quality > 0
+    return bool(wildcard)
+
+class DayArchive:
+    def __init__(self, directory: str = DAY_ARCHIVE_DIR, grace: float = DAY_ARCHIVE_GRACE):
+        self.directory = directory
+        self.grace = grace
+        self.file_hits = 0
+        self.materialized = 0
+        self.bytes_written = 0
+        self.live_queries = 0
+
+    def is_complete(self, day: date, now: Optional[datetime] = None) -> bool:
+        """Whether no more readings can arrive for a UTC day"""
+        now = now or datetime.utcnow()
+        day_end = datetime(day.year, day.month, day.day) + timedelta(days=1)
+        return now >= day_end + timedelta(seconds=self.grace)
+
+    def path(self, user_id: int, day: date, device_id: Optional[int] = None) -> str:
+        device = str(device_id) if device_id is not None else "all"
+        return os.path.join(self.directory, str(user_id), device, f"{day.isoformat()}.json.gz")
+
+    def file_for(self, db: Session, user_id: int, day: date, device_id: Optional[int] = None) -> Tuple[Optional[str], Optional[dict]]:
+        """
+        The gzipped JSON file for a complete day, written from the database the first
+        time. Days without readings get no file (so probing random dates can't fill
+        the disk); their empty body is returned instead.
+        """
+        path = self.path(user_id, day, device_id)
+        if os.path.exists(path):
+            self.file_hits += 1
+            return path, None
+
+        content = day_readings(db, user_id, day, device_id)
+        if not content["count"]:
+            return None, content
+        body = dumps(content)
+        compressed = gzip.compress(body, mtime=0)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(compressed)
+            os.replace(temporary, path)
+        except Exception:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+            raise
+
+        self.materialized += 1
+        self.bytes_written += len(compressed)
+        logger.info(f"Archived {day} for user {user_id} (device_id: {device_id}): {len(body)} bytes, {len(compressed)} compressed")
+        return path, None
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "file_hits": self.file_hits,
+            "materialized": self.materialized,
+            "bytes_written": self.bytes_written,
+            "live_queries": self.live_queries
+        }
+
+# Create a global day archive instance
+day_archive = DayArchive()
@@ -153,3 +153,215 @@ def get_user_by_reset_token(db: Session, token: str):
     except SQLAlchemyError as e:
         logger.error(f"Database error in get_user_by_reset_token: {e}")
         return None
+
+def record_login_lockout(db: Session, username: str, failed_attempts: int, failed_at, locked_until):
+    """
+    Record a brute-force lockout for a user if the security columns exist.
+    """
+    try:
+        if not check_column_exists(db, "users", "account_locked_until"):
+            logger.warning("account_locked_until column does not exist in users table")
+            return False
+
+        query = text("""
+            UPDATE users
+            SET failed_login_attempts = :failed_attempts,
+                last_failed_login = :failed_at,
+                account_locked_until = :locked_until
+            WHERE username = :username
+        """)
+
+        db.execute(query, {
+            "username": username,
+            "failed_attempts": failed_attempts,
+            "failed_at": failed_at,
+            "locked_until": locked_until
+        })
+        db.commit()
+        return True
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in record_login_lockout: {e}")
+        db.rollback()
+        return False
+
+def _device_to_dict(row):
+    return {
+        "id": row[0],
+        "user_id": row[1],
+        "name": row[2],
+        "created_at": row[3].isoformat() if hasattr(row[3], "isoformat") else row[3],
+        "ingest_deadband": row[4]
+    }
+
+def get_device(db: Session, device_id: int, user_id: int):
+    """
+    Get a device by id, but only if it belongs to the given user.
+    """
+    try:
+        query = text("SELECT id, user_id, name, created_at, ingest_deadband FROM devices WHERE id = :device_id AND user_id = :user_id")
+
+        row = db.execute(query, {"device_id": device_id, "user_id": user_id}).fetchone()
+        return _device_to_dict(row) if row else None
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in get_device: {e}")
+        return None
+
+def list_devices(db: Session, user_id: int):
+    """
+    List a user's registered devices, oldest first.
+    """
+    try:
+        query = text("SELECT id, user_id, name, created_at, ingest_deadband FROM devices WHERE user_id = :user_id ORDER BY id")
+
+        return [_device_to_dict(row) for row in db.execute(query, {"user_id": user_id})]
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in list_devices: {e}")
+        return []
+
+def create_device(db: Session, user_id: int, name: str, created_at, ingest_deadband: float = None):
+    """
+    Register a device for a user. Returns None if the user already has a device with that name.
+    """
+    try:
+        db.execute(
+            text("INSERT INTO devices (user_id, name, created_at, ingest_deadband) VALUES (:user_id, :name, :created_at, :ingest_deadband)"),
+            {"user_id": user_id, "name": name, "created_at": created_at, "ingest_deadband": ingest_deadband}
+        )
+        db.commit()
+    except SQLAlchemyError as e:
+        logger.warning(f"Could not register device '{name}' for user {user_id}: {e}")
+        db.rollback()
+        return None
+
+    query = text("SELECT id, user_id, name, created_at, ingest_deadband FROM devices WHERE user_id = :user_id AND name = :name")
+    row = db.execute(query, {"user_id": user_id, "name": name}).fetchone()
+    return _device_to_dict(row) if row else None
+
+def update_device_deadband(db: Session, device_id: int, user_id: int, ingest_deadband: float = None):
+    """
+    Set a device's ingest deadband (None reverts to the server default).
+    Returns the updated device, or None if the user has no such device.
+    """
+    try:
+        result = db.execute(
+            text("UPDATE devices SET ingest_deadband = :ingest_deadband WHERE id = :device_id AND user_id = :user_id"),
+            {"ingest_deadband": ingest_deadband, "device_id": device_id, "user_id": user_id}
+        )
+        db.commit()
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in update_device_deadband: {e}")
+        db.rollback()
+        return None
+
+    if result.rowcount == 0:
+        return None
+    return get_device(db, device_id, user_id)
+
+_ALERT_RULE_COLUMNS = "id, user_id, device_id, name, metric, operator, threshold, duration_seconds, is_active, created_at"
+
+def _alert_rule_to_dict(row):
+    return {
+        "id": row[0],
+        "user_id": row[1],
+        "device_id": row[2],
+        "name": row[3],
+        "metric": row[4],
+        "operator": row[5],
+        "threshold": row[6],
+        "duration_seconds": row[7],
+        "is_active": bool(row[8]),
+        "created_at": row[9].isoformat() if hasattr(row[9], "isoformat") else row[9]
+    }
+
+def list_alert_rules(db: Session, user_id: int):
+    """
+    List a user's alert rules, oldest first.
+    """
+    try:
+        query = text(f"SELECT {_ALERT_RULE_COLUMNS} FROM alert_rules WHERE user_id = :user_id ORDER BY id")
+
+        return [_alert_rule_to_dict(row) for row in db.execute(query, {"user_id": user_id})]
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in list_alert_rules: {e}")
+        return []
+
+def list_active_alert_rules(db: Session):
+    """
+    Every active alert rule across all users, for building the in-memory index.
+    """
+    query = text(f"SELECT {_ALERT_RULE_COLUMNS} FROM alert_rules WHERE is_active = :is_active")
+
+    return [_alert_rule_to_dict(row) for row in db.execute(query, {"is_active": True})]
+
+def get_alert_rule(db: Session, rule_id: int, user_id: int):
+    """
+    Get an alert rule by id, but only if it belongs to the given user.
+    """
+    try:
+        query = text(f"SELECT {_ALERT_RULE_COLUMNS} FROM alert_rules WHERE id = :rule_id AND user_id = :user_id")
+
+        row = db.execute(query, {"rule_id": rule_id, "user_id": user_id}).fetchone()
+        return _alert_rule_to_dict(row) if row else None
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in get_alert_rule: {e}")
+        return None
+
+def count_alert_rules(db: Session, user_id: int) -> int:
+    query = text("SELECT COUNT(*) FROM alert_rules WHERE user_id = :user_id")
+    return db.execute(query, {"user_id": user_id}).scalar() or 0
+
+def create_alert_rule(db: Session, user_id: int, rule: dict, created_at):
+    """
+    Store a new alert rule. Returns the created rule, or None on a database error.
+    """
+    try:
+        rule_id = db.execute(
+            text("""
+                INSERT INTO alert_rules (user_id, device_id, name, metric, operator, threshold, duration_seconds, is_active, created_at)
+                VALUES (:user_id, :device_id, :name, :metric, :operator, :threshold, :duration_seconds, :is_active, :created_at)
+                RETURNING id
+            """),
+            dict(rule, user_id=user_id, created_at=created_at)
+        ).scalar()
+        db.commit()
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in create_alert_rule: {e}")
+        db.rollback()
+        return None
+
+    return get_alert_rule(db, rule_id, user_id)
+
+def update_alert_rule(db: Session, rule_id: int, user_id: int, changes: dict):
+    """
+    Update some fields of a user's alert rule. Returns the updated rule, or None if it doesn't exist.
+    """
+    if changes:
+        assignments = ", ".join(f"{column} = :{column}" for column in changes)
+        try:
+            db.execute(
+                text(f"UPDATE alert_rules SET {assignments} WHERE id = :rule_id AND user_id = :user_id"),
+                dict(changes, rule_id=rule_id, user_id=user_id)
+            )
+            db.commit()
+        except SQLAlchemyError as e:
+            logger.error(f"Database error in update_alert_rule: {e}")
+            db.rollback()
+            return None
+
+    return get_alert_rule(db, rule_id, user_id)
+
+def delete_alert_rule(db: Session, rule_id: int, user_id: int) -> bool:
+    """
+    Delete a user's alert rule. Returns False if it doesn't exist.
+    """
+    try:
+        result = db.execute(
+            text("DELETE FROM alert_rules WHERE id = :rule_id AND user_id = :user_id"),
+            {"rule_id": rule_id, "user_id": user_id}
+        )
+        db.commit()
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in delete_alert_rule: {e}")
+        db.rollback()
+        return False
+    return result.rowcount > 0
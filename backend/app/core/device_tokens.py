@@ -0,0 +1,125 @@
+"""
+Long-lived, stateless device credentials.
+
+A device token carries the owning user id, a device id and a token id, and
+is signed with HMAC-SHA256. Verifying one needs no database lookup, so an
+ESP32 reconnect storm costs a hash per handshake. Revoked token ids are kept
+in an in-memory denylist that is refreshed from the database periodically;
+revocations made on this worker take effect immediately.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import time
+import asyncio
+from typing import Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.auth import SECRET_KEY
+from app.db.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+DEVICE_TOKEN_SECRET = os.getenv("DEVICE_TOKEN_SECRET", SECRET_KEY + ":device-tokens")
+DEVICE_TOKEN_DENYLIST_REFRESH = float(os.getenv("DEVICE_TOKEN_DENYLIST_REFRESH", "60"))
+# The legacy ?email= WebSocket login proves nothing; turn it off once devices use device tokens
+WS_ALLOW_EMAIL_AUTH = os.getenv("WS_ALLOW_EMAIL_AUTH", "True").lower() in ("true", "1", "t")
+
+TOKEN_PREFIX = "dv1"
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(DEVICE_TOKEN_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+def create_device_token(user_id: int, device_id: int) -> tuple:
+    """Create a signed device token. Returns (token, token_id)."""
+    token_id = secrets.token_urlsafe(12)
+    payload = _b64encode(f"{user_id}:{device_id}:{token_id}:{int(time.time())}".encode())
+    return f"{TOKEN_PREFIX}.{payload}.{_sign(payload)}", token_id
+
+def decode_device_token(token: str) -> Optional[dict]:
+    """Check a device token's signature and return its claims, or None if it is invalid"""
+    try:
+        prefix, payload, signature = token.split(".")
+        if prefix != TOKEN_PREFIX or not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        user_id, device_id, token_id, issued_at = _b64decode(payload).decode().rsplit(":", 3)
+        return {
+            "user_id": int(user_id),
+            "device_id": int(device_id),
+            "token_id": token_id,
+            "issued_at": int(issued_at)
+        }
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+class DeviceTokenDenylist:
+    def __init__(self, refresh_interval: float = DEVICE_TOKEN_DENYLIST_REFRESH):
+        self.refresh_interval = refresh_interval
+        self.revoked: Set[str] = set()
+        self.last_refresh: Optional[float] = None
+
+    def is_revoked(self, token_id: str) -> bool:
+        return token_id in self.revoked
+
+    def add(self, token_id: str):
+        self.revoked.add(token_id)
+
+    def refresh(self, db: Session):
+        """Merge in the token ids revoked in the database"""
+        self.merge(self._fetch(db))
+
+    def merge(self, token_ids: Set[str]):
+        # Merged rather than replaced, so a revocation made here while the
+        # query was running is never undone by an older snapshot
+        self.revoked |= token_ids
+        self.last_refresh = time.time()
+
+    @staticmethod
+    def _fetch(db: Session) -> Set[str]:
+        return {row[0] for row in db.execute(text("SELECT token_id FROM revoked_device_tokens"))}
+
+    def _fetch_from_new_session(self) -> Set[str]:
+        db = SessionLocal()
+        try:
+            return self._fetch(db)
+        finally:
+            db.close()
+
+    async def run(self):
+        """Refresh the denylist forever; started from the application lifespan"""
+        while True:
+            try:
+                # Only the query runs in a thread; the set is updated on the event loop
+                self.merge(await asyncio.to_thread(self._fetch_from_new_session))
+            except Exception as e:
+                logger.error(f"Error refreshing device token denylist: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+def verify_device_token(token: str) -> Optional[dict]:
+    """
+    Authenticate a device purely from its token. Returns a user dict shaped like
+    the ones from verify_token (plus device_id), or None if invalid or revoked.
+    """
+    claims = decode_device_token(token)
+    if claims is None or device_token_denylist.is_revoked(claims["token_id"]):
+        return None
+    return {
+        "id": claims["user_id"],
+        "device_id": claims["device_id"],
+        "token_id": claims["token_id"],
+        "is_active": True
+    }
+
+# Create a global denylist instance
+device_token_denylist = DeviceTokenDenylist()
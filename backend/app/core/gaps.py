@@ -0,0 +1,95 @@
+"""
+Reporting gaps in a device's reading stream.
+
+A gap is the time between two consecutive stored readings of a device when it
+is longer than the requested minimum. The pairs are found in the database
+with LAG() over the device's (device_id, timestamp) index, so only the gaps
+leave the database, never the readings between them. Since deadband
+compression still stores a heartbeat row every INGEST_HEARTBEAT_INTERVAL
+seconds, a minimum gap above that interval only matches real outages.
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.recent import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+GAPS_MAX_RESULTS = int(os.getenv("GAPS_MAX_RESULTS", "1000"))
+
+def _seconds_between(db: Session, later: str, earlier: str) -> str:
+    """SQL for the number of seconds from `earlier` to `later`"""
+    if db.get_bind().dialect.name == "postgresql":
+        return f"EXTRACT(EPOCH FROM {later} - {earlier})"
+    return f"(julianday({later}) - julianday({earlier})) * 86400.0"
+
+def reading_gaps(db: Session, user_id: int, device_id: int, start: datetime, end: datetime, min_gap: float,
+                 now: Optional[datetime] = None, limit: int = GAPS_MAX_RESULTS) -> dict:
+    """
+    Gaps of at least `min_gap` seconds in a device's readings between start and end.
+    The last reading before `start` is included so a gap that began earlier is
+    reported from its real start, and a device still silent at the end of the
+    range gets an ongoing gap up to min(end, now).
+    """
+    now = now or datetime.utcnow()
+    params = {"user_id": user_id, "device_id": device_id, "start": start, "end": end, "min_gap": min_gap, "limit": limit + 1}
+    rows = db.execute(text(f"""
+        WITH readings AS (
+            SELECT timestamp FROM sensor_data
+            WHERE user_id = :user_id AND device_id = :device_id AND timestamp > :start AND timestamp <= :end
+            UNION ALL
+            SELECT timestamp FROM (
+                SELECT timestamp FROM sensor_data
+                WHERE user_id = :user_id AND device_id = :device_id AND timestamp <= :start
+                ORDER BY timestamp DESC
+                LIMIT 1
+            ) previous
+        ), pairs AS (
+            SELECT LAG(timestamp) OVER (ORDER BY timestamp) AS gap_start, timestamp AS gap_end
+            FROM readings
+        )
+        SELECT gap_start, gap_end FROM pairs
+        WHERE gap_start IS NOT NULL AND {_seconds_between(db, "gap_end", "gap_start")} >= :min_gap
+        ORDER BY gap_start
+        LIMIT :limit
+    """), params).fetchall()
+
+    gaps = []
+    for gap_start, gap_end in rows[:limit]:
+        gap_start = parse_timestamp(gap_start)
+        gap_end = parse_timestamp(gap_end)
+        gaps.append({
+            "start": gap_start.isoformat(),
+            "end": gap_end.isoformat(),
+            "duration_seconds": (gap_end - gap_start).total_seconds(),
+            "ongoing": False
+        })
+
+    last_reading = parse_timestamp(db.execute(text("""
+        SELECT MAX(timestamp) FROM sensor_data
+        WHERE user_id = :user_id AND device_id = :device_id AND timestamp <= :end
+    """), params).scalar())
+    range_end = min(end, now)
+    if last_reading is not None and len(rows) <= limit and (range_end - last_reading).total_seconds() >= min_gap:
+        gaps.append({
+            "start": last_reading.isoformat(),
+            "end": range_end.isoformat(),
+            "duration_seconds": (range_end - last_reading).total_seconds(),
+            "ongoing": True
+        })
+
+    return {
+        "device_id": device_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "min_gap": min_gap,
+        "last_reading": last_reading.isoformat() if last_reading is not None else None,
+        "gaps": gaps,
+        "count": len(gaps),
+        "truncated": len(rows) > limit
+    }
@@ -0,0 +1,161 @@
+"""
+Gateway connections: one WebSocket carrying readings for many devices.
+
+A gateway sends readings tagged with a device_id, either one per message or
+as a `{"type": "readings", "readings": [...]}` batch. Each batch is stored
+with a single multi-row INSERT and commit. Acks are not sent per reading:
+they are collected per device and flushed as one `{"type": "ack"}` message
+once enough are pending or a short interval has passed.
+"""
+import logging
+import os
+import time
+import asyncio
+from typing import Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.db_utils import list_devices
+from app.core.obstacle_events import obstacle_tracker
+from app.core.serialization import dumps_text
+
+logger = logging.getLogger(__name__)
+
+GATEWAY_MAX_BATCH = int(os.getenv("GATEWAY_MAX_BATCH", "100"))
+GATEWAY_ACK_BATCH = int(os.getenv("GATEWAY_ACK_BATCH", "50"))
+GATEWAY_ACK_INTERVAL = float(os.getenv("GATEWAY_ACK_INTERVAL", "0.25"))
+
+class GatewayAcks:
+    """Per-device acks waiting to be sent to a gateway"""
+
+    def __init__(self, websocket: WebSocket, max_pending: int = GATEWAY_ACK_BATCH, max_delay: float = GATEWAY_ACK_INTERVAL):
+        self.websocket = websocket
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.acks: Dict[int, dict] = {}
+        self.errors: List[dict] = []
+        self.pending = 0
+        self.messages_sent = 0
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def add(self, device_id: int, reading_id: int, seq=None):
+        ack = self.acks.get(device_id)
+        if ack is None:
+            ack = self.acks[device_id] = {"device_id": device_id, "count": 0}
+        ack["count"] += 1
+        ack["last_id"] = reading_id
+        if seq is not None:
+            ack["last_seq"] = seq
+        self.pending += 1
+
+    def add_skipped(self, device_id: int, seq=None):
+        """Ack a reading that was accepted but not stored (within the device's ingest deadband)"""
+        ack = self.acks.get(device_id)
+        if ack is None:
+            ack = self.acks[device_id] = {"device_id": device_id, "count": 0}
+        ack["count"] += 1
+        ack["skipped"] = ack.get("skipped", 0) + 1
+        if seq is not None:
+            ack["last_seq"] = seq
+        self.pending += 1
+
+    def add_error(self, device_id, seq, message: str):
+        self.errors.append({"device_id": device_id, "seq": seq, "message": message})
+        self.pending += 1
+
+    async def maybe_flush(self):
+        """Flush now if enough acks are pending, otherwise make sure a delayed flush is scheduled"""
+        if self.pending >= self.max_pending:
+            await self.flush()
+        elif self.pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_delay)
+        await self.flush()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        message = {"type": "ack", "acks": list(self.acks.values())}
+        if self.errors:
+            message["errors"] = self.errors
+        self.acks = {}
+        self.errors = []
+        self.pending = 0
+        try:
+            await self.websocket.send_text(dumps_text(message))
+            self.messages_sent += 1
+        except Exception as e:
+            logger.error(f"Error sending gateway acks: {str(e)}")
+
+    def close(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+
+class GatewaySession:
+    """State for one gateway connection: the user's device ids and pending acks"""
+    reload_interval = 5.0  # seconds
+
+    def __init__(self, websocket: WebSocket, user_id: int, device_ids: Iterable[int]):
+        self.user_id = user_id
+        self.device_ids: Set[int] = set(device_ids)
+        self.last_reload = time.monotonic()
+        self.acks = GatewayAcks(websocket)
+        self.readings_received = 0
+
+    @classmethod
+    def load(cls, websocket: WebSocket, db: Session, user_id: int) -> "GatewaySession":
+        return cls(websocket, user_id, (device["id"] for device in list_devices(db, user_id)))
+
+    def owns(self, db: Session, device_id) -> bool:
+        """
+        Ownership is checked in memory. An unknown id reloads the device list (to pick up
+        devices registered after the gateway connected), at most once per reload interval.
+        """
+        if device_id in self.device_ids:
+            return True
+        now = time.monotonic()
+        if now - self.last_reload < self.reload_interval:
+            return False
+        self.last_reload = now
+        self.device_ids = {device["id"] for device in list_devices(db, self.user_id)}
+        return device_id in self.device_ids
+
+def parse_gateway_message(json_data: dict) -> Optional[List[dict]]:
+    """Return the tagged readings in a gateway message, or None if it isn't one"""
+    if json_data.get("type") == "readings" and isinstance(json_data.get("readings"), list):
+        return json_data["readings"]
+    if "device_id" in json_data and "temperature" in json_data:
+        return [json_data]
+    return None
+
+def insert_readings(db: Session, user_id: int, readings: List[dict]) -> list:
+    """
+    Store validated readings with one multi-row INSERT and one commit, along with
+    any obstacle transitions they cause. Returns (id, timestamp) rows in the same
+    order as `readings`.
+    """
+    values = []
+    params = {"user_id": user_id}
+    for i, reading in enumerate(readings):
+        values.append(f"(:temperature_{i}, :humidity_{i}, :obstacle_{i}, :user_id, :device_id_{i}, CURRENT_TIMESTAMP)")
+        params[f"temperature_{i}"] = reading["temperature"]
+        params[f"humidity_{i}"] = reading["humidity"]
+        params[f"obstacle_{i}"] = reading["obstacle"]
+        params[f"device_id_{i}"] = reading["device_id"]
+
+    query = text(f"""
+        INSERT INTO sensor_data
+        (temperature, humidity, obstacle, user_id, device_id, timestamp)
+        VALUES {", ".join(values)}
+        RETURNING id, timestamp
+    """)
+    # RETURNING follows VALUES order for a single INSERT; sort by id to be safe
+    rows = sorted(db.execute(query, params).fetchall(), key=lambda row: row[0])
+    for reading, row in zip(readings, rows):
+        obstacle_tracker.record(db, user_id, reading["device_id"], reading["obstacle"], row[1])
+    db.commit()
+    return rows
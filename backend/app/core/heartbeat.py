@@ -0,0 +1,196 @@
+"""
+Shared heartbeat scheduling for WebSocket connections.
+
+Protocol-level ping/pong frames are sent by the ASGI server (uvicorn's
+--ws-ping-interval / --ws-ping-timeout), which also drops dead transports.
+This module only tracks when each connection last sent us anything and closes
+connections that have gone quiet, using a single timer wheel instead of one
+timer per received message.
+"""
+import logging
+import os
+import time
+import asyncio
+from typing import Dict, Hashable, List, Optional, Set
+
+from fastapi import WebSocket
+
+from app.core.serialization import dumps_text
+
+logger = logging.getLogger(__name__)
+
+# Close connections that have sent nothing for this long (seconds)
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "300"))
+# Send an application-level JSON ping to legacy clients idle for this long (seconds)
+WS_JSON_PING_AFTER = float(os.getenv("WS_JSON_PING_AFTER", "120"))
+# Resolution of the timer wheel (seconds)
+WS_HEARTBEAT_TICK = float(os.getenv("WS_HEARTBEAT_TICK", "1"))
+
+class TimerWheel:
+    """
+    Hashed timer wheel with one bucket per tick.
+
+    Scheduling and cancelling are O(1); advancing only touches the buckets
+    for the ticks that elapsed, so the cost is proportional to the number of
+    expired items rather than the number of scheduled ones. Deadlines past
+    the wheel's horizon are clamped to it and are expected to be rescheduled
+    by the caller when they fire.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, size: int = 512):
+        self.tick_seconds = tick_seconds
+        self.size = size
+        self.buckets: List[Set[Hashable]] = [set() for _ in range(size)]
+        self.slot_of: Dict[Hashable, int] = {}
+        self.current_tick: Optional[int] = None
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def _tick_for(self, t: float) -> int:
+        return int(t // self.tick_seconds)
+
+    def schedule(self, item: Hashable, deadline: float, now: float):
+        """Schedule an item to expire at the first tick at or after `deadline`"""
+        self.cancel(item)
+        if self.current_tick is None:
+            self.current_tick = self._tick_for(now)
+
+        tick = -int(-deadline // self.tick_seconds)  # ceil, so items never fire early
+        tick = max(tick, self.current_tick + 1)
+        tick = min(tick, self.current_tick + self.size - 1)
+
+        slot = tick % self.size
+        self.buckets[slot].add(item)
+        self.slot_of[item] = slot
+
+    def cancel(self, item: Hashable):
+        slot = self.slot_of.pop(item, None)
+        if slot is not None:
+            self.buckets[slot].discard(item)
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Move the wheel forward to `now` and return every item that expired"""
+        target = self._tick_for(now)
+        if self.current_tick is None:
+            self.current_tick = target
+            return []
+
+        expired: List[Hashable] = []
+        # After a long stall every bucket has expired; don't spin through the gap
+        steps = min(target - self.current_tick, self.size)
+        for offset in range(1, steps + 1):
+            slot = (self.current_tick + offset) % self.size
+            bucket = self.buckets[slot]
+            if bucket:
+                self.buckets[slot] = set()
+                for item in bucket:
+                    del self.slot_of[item]
+                expired.extend(bucket)
+
+        self.current_tick = max(self.current_tick, target)
+        return expired
+
+class HeartbeatScheduler:
+    """
+    Tracks last-seen times for WebSocket connections and closes idle ones.
+
+    `touch` is a single dict write, so it is cheap enough to call on every
+    received message. Connections are only re-examined when their wheel
+    deadline fires; if they were seen in the meantime they are rescheduled
+    from their new last-seen time.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = WS_IDLE_TIMEOUT,
+        json_ping_after: float = WS_JSON_PING_AFTER,
+        tick_seconds: float = WS_HEARTBEAT_TICK
+    ):
+        self.idle_timeout = idle_timeout
+        self.json_ping_after = json_ping_after
+        self.tick_seconds = tick_seconds
+        self.wheel = TimerWheel(tick_seconds, size=int(idle_timeout / tick_seconds) + 2)
+        self.last_seen: Dict[WebSocket, float] = {}
+        self.json_ping: Set[WebSocket] = set()
+        self.closed_idle = 0
+        self.json_pings_sent = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, websocket: WebSocket, json_ping: bool = False, now: Optional[float] = None):
+        """Start tracking a connection. `json_ping` enables the legacy JSON ping for old firmware."""
+        now = time.monotonic() if now is None else now
+        self.last_seen[websocket] = now
+        if json_ping:
+            self.json_ping.add(websocket)
+        self.wheel.schedule(websocket, self._next_deadline(websocket, now, now), now)
+        self._ensure_task()
+
+    def touch(self, websocket: WebSocket, now: Optional[float] = None):
+        """Record inbound activity on a connection"""
+        if websocket in self.last_seen:
+            self.last_seen[websocket] = time.monotonic() if now is None else now
+
+    def unregister(self, websocket: WebSocket):
+        self.last_seen.pop(websocket, None)
+        self.json_ping.discard(websocket)
+        self.wheel.cancel(websocket)
+
+    def _next_deadline(self, websocket: WebSocket, seen: float, now: float) -> float:
+        idle_deadline = seen + self.idle_timeout
+        if websocket in self.json_ping and now < seen + self.json_ping_after:
+            return min(idle_deadline, seen + self.json_ping_after)
+        return idle_deadline
+
+    async def tick(self, now: Optional[float] = None) -> int:
+        """Process expired wheel entries and return how many connections were closed"""
+        now = time.monotonic() if now is None else now
+        closed = 0
+
+        for websocket in self.wheel.advance(now):
+            seen = self.last_seen.get(websocket)
+            if seen is None:
+                continue
+
+            idle = now - seen
+            if idle >= self.idle_timeout:
+                self.unregister(websocket)
+                closed += 1
+                try:
+                    await websocket.close(code=1000, reason="Connection timeout")
+                except Exception as e:
+                    logger.debug(f"Error closing idle websocket: {e}")
+                continue
+
+            if websocket in self.json_ping and idle >= self.json_ping_after:
+                try:
+                    await websocket.send_text(dumps_text({"type": "ping", "message": "Connection check"}))
+                    self.json_pings_sent += 1
+                except Exception as e:
+                    logger.debug(f"Error sending JSON ping: {e}")
+                self.wheel.schedule(websocket, seen + self.idle_timeout, now)
+            else:
+                self.wheel.schedule(websocket, self._next_deadline(websocket, seen, now), now)
+
+        if closed:
+            self.closed_idle += closed
+            logger.info(f"Closed {closed} idle WebSocket connections | Tracked connections: {len(self.last_seen)}")
+        return closed
+
+    def _ensure_task(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = self._task
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while self.last_seen:
+            await asyncio.sleep(self.tick_seconds)
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Error in heartbeat tick: {e}")
@@ -0,0 +1,143 @@
+"""
+Ingest-side deadband compression for registered devices.
+
+A reading is only stored if its temperature or humidity moved more than the
+device's tolerance away from the last *stored* reading, the obstacle flag
+changed, or no row has been stored for the heartbeat interval. Skipped
+readings are still acknowledged. A stored row therefore stands for every
+reading until the next row, and `step_series` rebuilds a regular series by
+carrying each row forward (up to a gap limit, so a silent device shows up as
+missing values rather than a flat line).
+
+Readings without a device_id are always stored, since readings from several
+unregistered devices of one user can't be told apart.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+INGEST_DEADBAND = float(os.getenv("INGEST_DEADBAND", "0"))  # Default tolerance, 0 disables
+INGEST_HEARTBEAT_INTERVAL = float(os.getenv("INGEST_HEARTBEAT_INTERVAL", "300"))  # seconds
+INGEST_DEADBAND_MAX_DEVICES = int(os.getenv("INGEST_DEADBAND_MAX_DEVICES", "10000"))
+
+class IngestDeadband:
+    def __init__(
+        self,
+        default_tolerance: float = INGEST_DEADBAND,
+        heartbeat_interval: float = INGEST_HEARTBEAT_INTERVAL,
+        max_devices: int = INGEST_DEADBAND_MAX_DEVICES
+    ):
+        self.default_tolerance = default_tolerance
+        self.heartbeat_interval = heartbeat_interval
+        self.max_devices = max_devices
+        # (user_id, device_id) -> (temperature, humidity, obstacle, stored_at, reading_id)
+        self._last: "OrderedDict[Tuple[int, int], tuple]" = OrderedDict()
+        # device_id -> configured tolerance, loaded from the devices table on first use
+        self._tolerances: Dict[int, float] = {}
+        self.checked = 0
+        self.skipped = 0
+
+    def tolerance_for(self, db: Session, device_id: Optional[int]) -> float:
+        if device_id is None:
+            return 0.0
+        tolerance = self._tolerances.get(device_id)
+        if tolerance is None:
+            try:
+                configured = db.execute(
+                    text("SELECT ingest_deadband FROM devices WHERE id = :device_id"),
+                    {"device_id": device_id}
+                ).scalar()
+            except Exception as e:
+                logger.error(f"Could not load ingest deadband for device {device_id}: {e}")
+                return 0.0
+            tolerance = configured if configured is not None else self.default_tolerance
+            if len(self._tolerances) >= self.max_devices:
+                self._tolerances.clear()
+            self._tolerances[device_id] = tolerance
+        return tolerance
+
+    def set_tolerance(self, device_id: int, tolerance: Optional[float]):
+        """Apply a device's new setting in this process (other workers pick it up on restart)"""
+        self._tolerances[device_id] = tolerance if tolerance is not None else self.default_tolerance
+
+    def should_store(self, user_id: int, device_id: Optional[int], temperature: float, humidity: float,
+                     obstacle: bool, tolerance: float, now: Optional[float] = None) -> bool:
+        if device_id is None or tolerance <= 0:
+            return True
+        self.checked += 1
+        last = self._last.get((user_id, device_id))
+        if last is None:
+            return True
+        last_temperature, last_humidity, last_obstacle, stored_at, _ = last
+        now = time.monotonic() if now is None else now
+        if (obstacle != last_obstacle
+                or abs(temperature - last_temperature) > tolerance
+                or abs(humidity - last_humidity) > tolerance
+                or now - stored_at >= self.heartbeat_interval):
+            return True
+        self.skipped += 1
+        return False
+
+    def remember(self, user_id: int, device_id: Optional[int], temperature: float, humidity: float,
+                 obstacle: bool, reading_id: Optional[int] = None, now: Optional[float] = None):
+        """Record a reading as the last stored one for its device"""
+        if device_id is None:
+            return
+        key = (user_id, device_id)
+        now = time.monotonic() if now is None else now
+        self._last[key] = (temperature, humidity, obstacle, now, reading_id)
+        self._last.move_to_end(key)
+        while len(self._last) > self.max_devices:
+            self._last.popitem(last=False)
+
+    def last_stored_id(self, user_id: int, device_id: Optional[int]) -> Optional[int]:
+        last = self._last.get((user_id, device_id))
+        return last[4] if last else None
+
+    def forget(self, user_id: int, device_id: Optional[int]):
+        """Drop a device's state, e.g. after a remembered reading failed to store"""
+        self._last.pop((user_id, device_id), None)
+
+    def stats(self) -> dict:
+        return {
+            "devices": len(self._last),
+            "checked": self.checked,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skipped / self.checked, 4) if self.checked else 0.0,
+            "heartbeat_interval": self.heartbeat_interval
+        }
+
+def step_series(rows: List[tuple], start: datetime, end: datetime, step: float, max_gap: float) -> List[dict]:
+    """
+    Rebuild a regular series from deadband-compressed rows.
+
+    `rows` are (timestamp, temperature, humidity, obstacle) tuples in timestamp
+    order, starting with the last row at or before `start` if there is one.
+    Each point takes the values of the newest row at or before it; points more
+    than `max_gap` seconds after that row get None values.
+    """
+    points = []
+    step_delta = timedelta(seconds=step)
+    index = -1
+    t = start
+    while t <= end:
+        while index + 1 < len(rows) and rows[index + 1][0] <= t:
+            index += 1
+        point = {"timestamp": t.isoformat(), "temperature": None, "humidity": None, "obstacle": None}
+        if index >= 0 and (t - rows[index][0]).total_seconds() <= max_gap:
+            _, point["temperature"], point["humidity"], obstacle = rows[index]
+            point["obstacle"] = bool(obstacle)
+        points.append(point)
+        t += step_delta
+    return points
+
+# Create a global ingest deadband instance
+ingest_deadband = IngestDeadband()
@@ -0,0 +1,106 @@
+"""
+Per-stage timing of the WebSocket ingest loop.
+
+The loop marks the end of each stage of handling a message (parse,
+validation, logging, the insert, the ack, the broadcast, ...) with
+`lap(stage, mark)`. The time since the previous mark goes into that stage's
+latency histogram. Histograms have power-of-two microsecond buckets, so
+recording is a bit_length and two additions.
+
+Profiling is off unless INGEST_PROFILE=true. Operators named in
+INGEST_PROFILE_ADMINS (comma-separated usernames) can switch it at runtime
+through /api/v1/metrics/ingest-profile; other users can only read it. While
+it is off, `start` returns None and `lap` returns as soon as it sees that,
+so the loop pays one method call per stage and reads no clock.
+"""
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+INGEST_PROFILE = os.getenv("INGEST_PROFILE", "false").lower() == "true"
+INGEST_PROFILE_ADMINS = frozenset(name.strip() for name in os.getenv("INGEST_PROFILE_ADMINS", "").split(",") if name.strip())
+
+# Bucket i counts durations below 2**i microseconds; the last one is open-ended (~67 s and up)
+HISTOGRAM_BUCKETS = 27
+
+class StageHistogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.counts[min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound, in microseconds, of the bucket holding the given fraction of samples"""
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(float(2 ** bucket), self.max * 1e6), 1)
+        return round(self.max * 1e6, 1)
+
+    def stats(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_us": round(self.total / self.count * 1e6, 1),
+            "p50_us": self.percentile(0.5),
+            "p90_us": self.percentile(0.9),
+            "p99_us": self.percentile(0.99),
+            "max_us": round(self.max * 1e6, 1),
+            "buckets": {f"<{2 ** bucket}us": count for bucket, count in enumerate(self.counts) if count}
+        }
+
+class IngestProfiler:
+    def __init__(self, enabled: bool = INGEST_PROFILE):
+        self.enabled = enabled
+        self.stages: Dict[str, StageHistogram] = {}
+        self.enabled_at = time.time() if enabled else None
+
+    def start(self) -> Optional[float]:
+        """The first mark of a message, or None while profiling is off"""
+        return time.perf_counter() if self.enabled else None
+
+    def lap(self, stage: str, mark: Optional[float]) -> Optional[float]:
+        """Record the time since `mark` under `stage` and return the next mark"""
+        if mark is None:
+            return None
+        now = time.perf_counter()
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = StageHistogram()
+        histogram.record(now - mark)
+        return now
+
+    def set_enabled(self, enabled: bool, reset: bool = False):
+        if reset:
+            self.stages = {}
+        if enabled and not self.enabled:
+            self.enabled_at = time.time()
+        self.enabled = enabled
+        logger.info(f"Ingest profiling {'enabled' if enabled else 'disabled'}{' (histograms reset)' if reset else ''}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "enabled_at": self.enabled_at,
+            "stages": {stage: histogram.stats() for stage, histogram in self.stages.items()}
+        }
+
+# Create a global ingest profiler instance
+ingest_profile = IngestProfiler()
@@ -0,0 +1,167 @@
+"""
+In-memory login throttling.
+
+Failed logins are counted in sliding windows per username and per client IP.
+Once a limit is hit, further attempts are rejected before any bcrypt work is
+done, so a credential-stuffing run costs us a dict lookup per attempt rather
+than a full password verification. Lockouts are written to the users table
+in the background for auditing; successful logins never touch the database.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Deque, List, Optional
+
+from app.core import db_utils
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+LOGIN_MAX_FAILURES_PER_USER = int(os.getenv("LOGIN_MAX_FAILURES_PER_USER", "5"))
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "20"))
+LOGIN_FAILURE_WINDOW = float(os.getenv("LOGIN_FAILURE_WINDOW", "300"))
+LOGIN_LOCKOUT_SECONDS = float(os.getenv("LOGIN_LOCKOUT_SECONDS", "900"))
+LOGIN_THROTTLE_MAX_KEYS = int(os.getenv("LOGIN_THROTTLE_MAX_KEYS", "100000"))
+# Proxies in front of the app that append to X-Forwarded-For (Render has one); 0 ignores the header
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+
+def client_ip(forwarded_for: Optional[str], peer: Optional[str], trusted_hops: int = TRUSTED_PROXY_HOPS) -> str:
+    """
+    The address the per-IP limit applies to. Entries to the left of the ones our
+    own proxies appended are whatever the client sent, so they are never used.
+    """
+    if forwarded_for and trusted_hops > 0:
+        hops: List[str] = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        if hops:
+            return hops[-min(trusted_hops, len(hops))]
+    return peer or "unknown"
+
+class SlidingWindowCounter:
+    """Event timestamps per key within a sliding window, with an LRU bound on tracked keys"""
+
+    def __init__(self, window: float, max_keys: int = LOGIN_THROTTLE_MAX_KEYS):
+        self.window = window
+        self.max_keys = max_keys
+        self.events: "OrderedDict[str, Deque[float]]" = OrderedDict()
+
+    def _prune(self, key: str, now: float) -> Optional[Deque[float]]:
+        events = self.events.get(key)
+        if events is None:
+            return None
+        cutoff = now - self.window
+        while events and events[0] <= cutoff:
+            events.popleft()
+        if not events:
+            del self.events[key]
+            return None
+        return events
+
+    def count(self, key: str, now: float) -> int:
+        events = self._prune(key, now)
+        return len(events) if events else 0
+
+    def retry_after(self, key: str, now: float) -> float:
+        """Seconds until the oldest event in the window expires"""
+        events = self._prune(key, now)
+        return max(events[0] + self.window - now, 0.0) if events else 0.0
+
+    def hit(self, key: str, now: float) -> int:
+        events = self._prune(key, now)
+        if events is None:
+            events = self.events[key] = deque()
+        else:
+            self.events.move_to_end(key)
+        events.append(now)
+        while len(self.events) > self.max_keys:
+            self.events.popitem(last=False)
+        return len(events)
+
+    def reset(self, key: str):
+        self.events.pop(key, None)
+
+class LoginThrottle:
+    def __init__(
+        self,
+        max_failures_per_user: int = LOGIN_MAX_FAILURES_PER_USER,
+        max_failures_per_ip: int = LOGIN_MAX_FAILURES_PER_IP,
+        window: float = LOGIN_FAILURE_WINDOW,
+        lockout_seconds: float = LOGIN_LOCKOUT_SECONDS
+    ):
+        self.max_failures_per_user = max_failures_per_user
+        self.max_failures_per_ip = max_failures_per_ip
+        self.lockout_seconds = lockout_seconds
+        self.user_failures = SlidingWindowCounter(window)
+        self.ip_failures = SlidingWindowCounter(window)
+        self.locked_until: "OrderedDict[str, float]" = OrderedDict()
+        self.rejected = 0
+        self.lockouts = 0
+
+    def check(self, username: str, client_ip: str, now: Optional[float] = None) -> Optional[float]:
+        """Return how many seconds the caller must wait, or None if the attempt may proceed"""
+        now = time.monotonic() if now is None else now
+
+        locked_until = self.locked_until.get(username)
+        if locked_until is not None:
+            if locked_until > now:
+                self.rejected += 1
+                return locked_until - now
+            del self.locked_until[username]
+
+        if self.ip_failures.count(client_ip, now) >= self.max_failures_per_ip:
+            self.rejected += 1
+            return self.ip_failures.retry_after(client_ip, now)
+
+        return None
+
+    def record_failure(self, username: str, client_ip: str, now: Optional[float] = None) -> Optional[int]:
+        """
+        Count a failed login. Returns the number of failures when this one locks
+        the account, so the caller can persist the lockout, otherwise None.
+        """
+        now = time.monotonic() if now is None else now
+        self.ip_failures.hit(client_ip, now)
+        failures = self.user_failures.hit(username, now)
+        if failures < self.max_failures_per_user:
+            return None
+
+        self.locked_until[username] = now + self.lockout_seconds
+        while len(self.locked_until) > LOGIN_THROTTLE_MAX_KEYS:
+            self.locked_until.popitem(last=False)
+        self.user_failures.reset(username)
+        self.lockouts += 1
+        logger.warning(f"Locking out username '{username}' for {self.lockout_seconds:.0f}s after {failures} failed logins")
+        return failures
+
+    def record_success(self, username: str):
+        # Memory only: successful logins must not cost a database write
+        self.user_failures.reset(username)
+
+    def stats(self) -> dict:
+        return {
+            "tracked_usernames": len(self.user_failures.events),
+            "tracked_ips": len(self.ip_failures.events),
+            "locked_usernames": len(self.locked_until),
+            "lockouts": self.lockouts,
+            "rejected": self.rejected
+        }
+
+def persist_lockout(session_factory: Callable[[], Session], username: str, failed_attempts: int,
+                    lockout_seconds: float = LOGIN_LOCKOUT_SECONDS):
+    """
+    Background task: record a lockout in the users table's brute-force columns.
+    Runs after the request's own session is closed, so it opens one from the
+    same factory.
+    """
+    now = datetime.now(timezone.utc)
+    db = session_factory()
+    try:
+        db_utils.record_login_lockout(db, username, failed_attempts, now, now + timedelta(seconds=lockout_seconds))
+    except Exception as e:
+        logger.error(f"Error persisting lockout for '{username}': {e}")
+    finally:
+        db.close()
+
+# Create a global login throttle instance
+login_throttle = LoginThrottle()
@@ -0,0 +1,156 @@
+"""
+Obstacle presence stored as run-length transitions.
+
+Rather than scanning every sensor_data row to find when the IR sensor saw
+something, ingest keeps an `obstacle_events` row per period with an obstacle
+present: inserted when a reading turns the flag on, closed (ended_at set)
+when a reading turns it off. Only transitions touch the table, and the
+current state per device is cached so steady readings cost nothing extra.
+The writes join the caller's transaction; callers commit, and call `forget`
+if they roll back.
+"""
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.recent import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+OBSTACLE_TRACKER_MAX_DEVICES = int(os.getenv("OBSTACLE_TRACKER_MAX_DEVICES", "10000"))
+
+def _device_clause(device_id: Optional[int]) -> str:
+    return "device_id = :device_id" if device_id is not None else "device_id IS NULL"
+
+class ObstacleTracker:
+    def __init__(self, max_devices: int = OBSTACLE_TRACKER_MAX_DEVICES):
+        self.max_devices = max_devices
+        # (user_id, device_id) -> id of the open event, or None if no obstacle is present
+        self._open_events: "OrderedDict[Tuple[int, Optional[int]], Optional[int]]" = OrderedDict()
+        self.transitions = 0
+        self.loads = 0
+
+    def _load(self, db: Session, user_id: int, device_id: Optional[int]) -> Optional[int]:
+        self.loads += 1
+        return db.execute(
+            text(f"""
+                SELECT id FROM obstacle_events
+                WHERE user_id = :user_id AND {_device_clause(device_id)} AND ended_at IS NULL
+                ORDER BY started_at DESC
+                LIMIT 1
+            """),
+            {"user_id": user_id, "device_id": device_id}
+        ).scalar()
+
+    def record(self, db: Session, user_id: int, device_id: Optional[int], obstacle: bool, timestamp):
+        """Write the transition, if any, caused by a stored reading. Does not commit."""
+        key = (user_id, device_id)
+        if key in self._open_events:
+            open_event = self._open_events[key]
+            self._open_events.move_to_end(key)
+        else:
+            open_event = self._load(db, user_id, device_id)
+
+        if obstacle and open_event is None:
+            open_event = db.execute(
+                text("""
+                    INSERT INTO obstacle_events (user_id, device_id, started_at)
+                    VALUES (:user_id, :device_id, :timestamp)
+                    RETURNING id
+                """),
+                {"user_id": user_id, "device_id": device_id, "timestamp": timestamp}
+            ).scalar()
+            self.transitions += 1
+        elif not obstacle and open_event is not None:
+            db.execute(
+                text("UPDATE obstacle_events SET ended_at = :timestamp WHERE id = :id"),
+                {"timestamp": timestamp, "id": open_event}
+            )
+            open_event = None
+            self.transitions += 1
+
+        self._open_events[key] = open_event
+        while len(self._open_events) > self.max_devices:
+            self._open_events.popitem(last=False)
+
+    def forget(self, user_id: int, device_id: Optional[int]):
+        """Drop cached state after a rollback; it is reloaded from the table on the next reading"""
+        self._open_events.pop((user_id, device_id), None)
+
+    def stats(self) -> dict:
+        return {
+            "devices": len(self._open_events),
+            "transitions": self.transitions,
+            "loads": self.loads
+        }
+
+def _merged_seconds(intervals: List[Tuple[datetime, datetime]]) -> float:
+    """Total time covered by possibly overlapping intervals (several devices can see obstacles at once)"""
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += (current_end - current_start).total_seconds()
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += (current_end - current_start).total_seconds()
+    return total
+
+def occupied_intervals(db: Session, user_id: int, start: datetime, end: datetime,
+                       device_id: Optional[int] = None, now: Optional[datetime] = None) -> dict:
+    """
+    Obstacle intervals overlapping [start, end], clipped to the range, and the total
+    time an obstacle was present. Without a device_id all of the user's devices are
+    included and overlapping intervals are only counted once in the total.
+    """
+    now = now or datetime.utcnow()
+    device_filter = "AND device_id = :device_id" if device_id is not None else ""
+    rows = db.execute(
+        text(f"""
+            SELECT device_id, started_at, ended_at FROM obstacle_events
+            WHERE user_id = :user_id {device_filter}
+            AND started_at < :end AND (ended_at IS NULL OR ended_at > :start)
+            ORDER BY started_at
+        """),
+        {"user_id": user_id, "device_id": device_id, "start": start, "end": end}
+    ).fetchall()
+
+    intervals = []
+    spans = []
+    for event_device_id, started_at, ended_at in rows:
+        started_at = parse_timestamp(started_at)
+        ended_at = parse_timestamp(ended_at)
+        ongoing = ended_at is None
+        clipped_start = max(started_at, start)
+        clipped_end = min(ended_at if not ongoing else max(now, clipped_start), end)
+        spans.append((clipped_start, clipped_end))
+        intervals.append({
+            "device_id": event_device_id,
+            "start": clipped_start.isoformat(),
+            "end": clipped_end.isoformat(),
+            "duration_seconds": (clipped_end - clipped_start).total_seconds(),
+            "ongoing": ongoing
+        })
+
+    total = _merged_seconds(spans)
+    range_seconds = (end - start).total_seconds()
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "device_id": device_id,
+        "intervals": intervals,
+        "count": len(intervals),
+        "total_occupied_seconds": total,
+        "occupied_ratio": round(total / range_seconds, 4) if range_seconds > 0 else 0.0
+    }
+
+# Create a global obstacle tracker instance
+obstacle_tracker = ObstacleTracker()
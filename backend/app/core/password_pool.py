@@ -0,0 +1,75 @@
+"""
+Bounded worker pool for bcrypt hashing and verification.
+
+bcrypt deliberately takes a few hundred milliseconds per call. Running it
+inline in an `async def` handler stalls the event loop, and with it every
+connected device, for that long. This pool moves the work to a small set of
+threads (bcrypt releases the GIL while hashing) and caps how many operations
+may be queued so a login burst is shed instead of piling up.
+"""
+import logging
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+class PasswordPoolSaturated(Exception):
+    """Raised when too many password operations are already queued"""
+
+class PasswordHashPool:
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def run(self, func: Callable, *args):
+        """Run a password function on the pool, or raise PasswordPoolSaturated if the queue is full"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            logger.warning(f"Password hash pool saturated ({self.pending} pending), rejecting request")
+            raise PasswordPoolSaturated()
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, func, *args)
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+# Create a global password hash pool instance
+password_pool = PasswordHashPool()
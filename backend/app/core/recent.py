@@ -0,0 +1,95 @@
+"""
+In-memory buffer of each user's most recent broadcast readings.
+
+Reconnecting clients usually missed only a few seconds of data, so resume
+requests (WebSocket since_id/since_ts, SSE Last-Event-ID) are answered from
+here when the buffer provably holds every reading after the cursor. They
+fall back to a database query when the gap is older than the buffer, or
+when readings in it were saved by another worker process.
+"""
+import os
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional
+
+RECENT_READINGS_PER_USER = int(os.getenv("RECENT_READINGS_PER_USER", "500"))
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """Parse an ISO timestamp into a naive UTC datetime, matching how readings are stored"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+class RecentReadings:
+    """
+    sensor_data ids come from one sequence shared by every user and worker, so
+    the buffer can tell whether it saw everything inserted in a range of ids:
+    `covered_from` is where the current unbroken run of broadcast ids began.
+    A reading saved on another worker, or inserted without a broadcast, leaves
+    a hole in the run and starts a new one after it.
+    """
+
+    def __init__(self, max_per_user: int = RECENT_READINGS_PER_USER):
+        self.max_per_user = max_per_user
+        self.readings: Dict[int, Deque[dict]] = {}
+        self.covered_from: Optional[int] = None
+        self.last_id: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    def append(self, user_id: int, reading: dict):
+        buffer = self.readings.get(user_id)
+        if buffer is None:
+            buffer = self.readings[user_id] = deque(maxlen=self.max_per_user)
+        buffer.append(reading)
+
+        reading_id = reading.get("id")
+        if reading_id is None:
+            return
+        if self.last_id is None or reading_id > self.last_id + 1:
+            self.covered_from = reading_id
+        # A late, smaller id doesn't close the hole it fell into, so the run is left as is
+        if self.last_id is None or reading_id > self.last_id:
+            self.last_id = reading_id
+
+    def _covers(self, user_id: int, since_id: int) -> bool:
+        """Whether every reading of the user with id > since_id is buffered"""
+        if self.covered_from is None or not self.covered_from - 1 <= since_id <= self.last_id:
+            return False
+        buffer = self.readings.get(user_id)
+        # Once the buffer is full, readings older than its first one may have been evicted
+        return not buffer or len(buffer) < self.max_per_user or since_id >= buffer[0]["id"]
+
+    def since_id(self, user_id: int, since_id: int) -> Optional[List[dict]]:
+        """Readings with id > since_id, or None if the buffer can't prove it has all of them"""
+        if not self._covers(user_id, since_id):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [reading for reading in self.readings.get(user_id, ()) if reading["id"] > since_id]
+
+    def since_timestamp(self, user_id: int, since_ts: datetime) -> Optional[List[dict]]:
+        """
+        Readings newer than since_ts, or None if the buffer can't prove it has all of them.
+        Readings are stamped when inserted, so the newest buffered one at or before
+        since_ts is the id cursor whose coverage is checked.
+        """
+        since_ts = parse_timestamp(since_ts)
+        stamped = [(parse_timestamp(reading["timestamp"]), reading) for reading in self.readings.get(user_id, ())]
+        anchor = None
+        if since_ts is not None:
+            anchor = max((reading["id"] for timestamp, reading in stamped if timestamp is not None and timestamp <= since_ts), default=None)
+        if anchor is None or not self._covers(user_id, anchor):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [reading for timestamp, reading in stamped if timestamp is not None and timestamp > since_ts]
@@ -0,0 +1,117 @@
+"""
+Versioned cache of encoded /sensor/data responses.
+
+Dashboards re-request the same history page (usually page 1 at the default
+page size) many times between inserts. Entries are keyed on the user, the
+query parameters and the user's data version, and hold the JSON bytes that
+were sent, so a hit skips both the SQL and the encoding. Ingest calls `bump`
+after committing readings, which moves the user to a new version and drops
+their old entries. Other worker processes don't see those bumps, so entries
+also expire after RESPONSE_CACHE_TTL seconds, which bounds how stale a page
+served by another worker can be.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Set, Tuple
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "10"))
+
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+                 ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # (user_id, version, params) -> (expires_at, body)
+        self._entries: "OrderedDict[Tuple[int, int, Hashable], Tuple[float, bytes]]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[Tuple[int, int, Hashable]]] = {}
+        self._versions: Dict[int, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def version(self, user_id: int) -> int:
+        """The user's current data version; read it before querying and pass it to `put`"""
+        return self._versions.get(user_id, 0)
+
+    def get(self, user_id: int, params: Hashable) -> Optional[bytes]:
+        key = (user_id, self.version(user_id), params)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, params: Hashable, version: int, body: bytes):
+        """Store a response built from data at `version`; ignored if the user's data has changed since"""
+        if len(body) > self.max_bytes:
+            return
+        key = (user_id, version, params)
+        with self._lock:
+            if version != self.version(user_id):
+                return
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, body)
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def bump(self, user_id: int):
+        """Invalidate a user's cached responses after their readings changed"""
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            keys = self._keys_by_user.pop(user_id, ())
+            for key in list(keys):
+                self._remove(key)
+            if keys:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def _remove(self, key: Tuple[int, int, Hashable]):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry[1])
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+# Create a global response cache instance
+response_cache = ResponseCache()
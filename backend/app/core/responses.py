@@ -1,4 +1,4 @@
-from fastapi.responses import JSONResponse
+from app.core.serialization import JSONResponse
 from starlette.background import BackgroundTask
 from typing import Any, Dict, List, Optional, Union
 
@@ -0,0 +1,129 @@
+"""
+Adaptive sampling: slow devices down when the backend is under load.
+
+Ingest reports how many readings are in flight and how long each INSERT and
+commit takes. Those signals are mapped to a load level, and each level has a
+sampling profile (send interval, batch size, deadband) that is pushed to
+devices as a `{"type": "control"}` message. Levels go up as soon as a signal
+crosses a threshold but only come back down after the load has stayed lower
+for a cooldown period, so devices aren't flapped between profiles.
+"""
+import logging
+import os
+import time
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SAMPLING_DB_LATENCY_MS = tuple(float(v) for v in os.getenv("SAMPLING_DB_LATENCY_MS", "50,200,500").split(","))
+SAMPLING_QUEUE_DEPTH = tuple(int(v) for v in os.getenv("SAMPLING_QUEUE_DEPTH", "20,100,500").split(","))
+SAMPLING_COOLDOWN = float(os.getenv("SAMPLING_COOLDOWN", "30"))
+
+# (send_interval_ms, batch_size, deadband) per load level
+SAMPLING_PROFILES = (
+    (2000, 1, 0.0),
+    (5000, 1, 0.1),
+    (10000, 5, 0.3),
+    (30000, 10, 0.5),
+)
+
+for _name, _thresholds in (("SAMPLING_DB_LATENCY_MS", SAMPLING_DB_LATENCY_MS), ("SAMPLING_QUEUE_DEPTH", SAMPLING_QUEUE_DEPTH)):
+    if len(_thresholds) > len(SAMPLING_PROFILES) - 1:
+        logger.warning(f"{_name} has {len(_thresholds)} thresholds but there are only {len(SAMPLING_PROFILES)} sampling levels; the extra ones share the last level")
+
+def _level_for(value: float, thresholds: Tuple) -> int:
+    level = 0
+    for threshold in thresholds:
+        if value >= threshold:
+            level += 1
+    # Thresholds beyond the last profile all map to the most conservative one
+    return min(level, len(SAMPLING_PROFILES) - 1)
+
+class AdaptiveSampling:
+    def __init__(
+        self,
+        db_latency_thresholds: Tuple = SAMPLING_DB_LATENCY_MS,
+        queue_depth_thresholds: Tuple = SAMPLING_QUEUE_DEPTH,
+        cooldown: float = SAMPLING_COOLDOWN,
+        smoothing: float = 0.2
+    ):
+        self.db_latency_thresholds = db_latency_thresholds
+        self.queue_depth_thresholds = queue_depth_thresholds
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.db_latency_ms: Optional[float] = None  # EWMA
+        self.level = 0
+        self.reason = "normal"
+        self.lower_since: Optional[float] = None
+        self.level_changes = 0
+
+    def ingest_started(self, readings: int = 1):
+        """Readings are in flight from when they are parsed until they are stored, acked and broadcast"""
+        self.in_flight += readings
+
+    def ingest_finished(self, readings: int = 1):
+        self.in_flight = max(self.in_flight - readings, 0)
+
+    def record_db_latency(self, seconds: float):
+        """Fold one INSERT + commit duration into the latency EWMA"""
+        latency_ms = seconds * 1000
+        if self.db_latency_ms is None:
+            self.db_latency_ms = latency_ms
+        else:
+            self.db_latency_ms += self.smoothing * (latency_ms - self.db_latency_ms)
+
+    def target_level(self) -> Tuple[int, str]:
+        latency_level = _level_for(self.db_latency_ms or 0.0, self.db_latency_thresholds)
+        queue_level = _level_for(self.in_flight, self.queue_depth_thresholds)
+        if latency_level == 0 and queue_level == 0:
+            return 0, "normal"
+        if latency_level >= queue_level:
+            return latency_level, "db_latency"
+        return queue_level, "ingest_queue_depth"
+
+    def evaluate(self, now: Optional[float] = None) -> Optional[dict]:
+        """Re-check the load signals. Returns the new control message if the level changed, else None."""
+        now = time.monotonic() if now is None else now
+        target, reason = self.target_level()
+
+        if target > self.level:
+            self.lower_since = None
+        elif target < self.level:
+            if self.lower_since is None:
+                self.lower_since = now
+            if now - self.lower_since < self.cooldown:
+                return None
+            self.lower_since = None
+        else:
+            self.lower_since = None
+            return None
+
+        logger.warning(f"Adaptive sampling level {self.level} -> {target} ({reason}: db_latency={self.db_latency_ms}ms, in_flight={self.in_flight})")
+        self.level = target
+        self.reason = reason
+        self.level_changes += 1
+        return self.control_message()
+
+    def control_message(self) -> dict:
+        send_interval_ms, batch_size, deadband = SAMPLING_PROFILES[self.level]
+        return {
+            "type": "control",
+            "level": self.level,
+            "reason": self.reason,
+            "send_interval_ms": send_interval_ms,
+            "batch_size": batch_size,
+            "deadband": deadband
+        }
+
+    def stats(self) -> dict:
+        return {
+            "level": self.level,
+            "reason": self.reason,
+            "in_flight": self.in_flight,
+            "db_latency_ms": round(self.db_latency_ms, 2) if self.db_latency_ms is not None else None,
+            "level_changes": self.level_changes
+        }
+
+# Create a global adaptive sampling instance
+sampling = AdaptiveSampling()
@@ -0,0 +1,133 @@
+"""
+JSON encoding for HTTP responses and WebSocket frames.
+
+Every response body and WebSocket message goes through `dumps`, which uses
+orjson when it is installed and the standard library otherwise
+(JSON_SERIALIZER=auto, or force one with "orjson" / "json"). Both produce
+compact UTF-8 bytes and encode datetimes with `isoformat()`, dataclasses as
+objects and Decimals as numbers, so callers can hand over rows without
+converting them field by field first. `ReadingRow` is that row type for
+sensor readings.
+
+WebSocket messages are still sent as text frames: the web dashboard, the
+mobile app and the ESP32 firmware all expect text. `dumps_text` returns the
+encoded bytes as a str for `send_text`.
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass, fields, is_dataclass
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse as _StarletteJSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library is used instead
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+JSON_SERIALIZER = os.getenv("JSON_SERIALIZER", "auto")
+
+@dataclass(slots=True)
+class ReadingRow:
+    """A sensor_data row as served by the API; encoded directly, datetime and all"""
+    id: int
+    temperature: float
+    humidity: float
+    obstacle: bool
+    user_id: int
+    timestamp: Any
+    device_id: Optional[int] = None
+
+    @classmethod
+    def from_row(cls, row) -> "ReadingRow":
+        """From (id, temperature, humidity, obstacle, user_id, timestamp[, device_id]), filling in nulls"""
+        return cls(
+            row[0] if row[0] is not None else 0,
+            float(row[1]) if row[1] is not None else 0.0,
+            float(row[2]) if row[2] is not None else 0.0,
+            bool(row[3]) if row[3] is not None else False,
+            int(row[4]) if row[4] is not None else 0,
+            row[5] if row[5] is not None else datetime.now(),
+            row[6] if len(row) > 6 else None
+        )
+
+    def as_dict(self) -> dict:
+        timestamp = self.timestamp
+        return {
+            "id": self.id,
+            "temperature": self.temperature,
+            "humidity": self.humidity,
+            "obstacle": self.obstacle,
+            "user_id": self.user_id,
+            "timestamp": timestamp.isoformat() if hasattr(timestamp, "isoformat") else timestamp,
+            "device_id": self.device_id
+        }
+
+def _default(value):
+    """Types neither encoder handles natively (the stdlib one handles none of these)"""
+    if type(value) is ReadingRow:
+        return value.as_dict()
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if is_dataclass(value) and not isinstance(value, type):
+        return {field.name: getattr(value, field.name) for field in fields(value)}
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class StdlibSerializer:
+    name = "json"
+
+    def __init__(self):
+        # json.dumps builds a new encoder on every call once any option is passed
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default)
+
+    def dumps(self, content: Any) -> bytes:
+        return self._encoder.encode(content).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+class OrjsonSerializer:
+    name = "orjson"
+
+    def dumps(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data):
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers' handlers still apply
+        return orjson.loads(data)
+
+def get_serializer(name: str = JSON_SERIALIZER):
+    if name == "orjson" or (name == "auto" and orjson is not None):
+        if orjson is None:
+            logger.warning("JSON_SERIALIZER=orjson but orjson is not installed, using the standard library")
+            return StdlibSerializer()
+        return OrjsonSerializer()
+    if name not in ("auto", "json"):
+        logger.warning(f"Unknown JSON_SERIALIZER {name!r}, using the standard library")
+    return StdlibSerializer()
+
+def dumps(content: Any) -> bytes:
+    return serializer.dumps(content)
+
+def dumps_text(content: Any) -> str:
+    """Encode a WebSocket text frame"""
+    return serializer.dumps(content).decode("utf-8")
+
+def loads(data):
+    return serializer.loads(data)
+
+class JSONResponse(_StarletteJSONResponse):
+    """JSONResponse rendered with the configured serializer"""
+
+    def render(self, content: Any) -> bytes:
+        return serializer.dumps(content)
+
+# Create a global serializer instance
+serializer = get_serializer()
@@ -0,0 +1,61 @@
+"""
+Single-flight coalescing of identical concurrent reads.
+
+A user with the dashboard open in several tabs and on the phone fires the
+same /data/latest and /data?page=1 requests at the same moment. The first
+request for a key runs the query in a worker thread, and every identical
+request arriving while it runs awaits that same result instead of issuing
+its own query. Keys include the user's data version (see response_cache), so
+requests made after an insert never join a query that started before it.
+
+The query runs as a task of its own, so a leader whose client disconnects
+doesn't cancel the result the others are waiting for.
+"""
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Tuple[str, Hashable], asyncio.Task] = {}
+        # kind -> [requests, queries run]
+        self._counts: Dict[str, list] = {}
+
+    async def run(self, kind: str, key: Hashable, fn: Callable[..., Any], *args) -> Any:
+        """Run `fn(*args)` in a thread, or share the result of an identical call already running"""
+        counts = self._counts.get(kind)
+        if counts is None:
+            counts = self._counts[kind] = [0, 0]
+        counts[0] += 1
+
+        flight_key = (kind, key)
+        task = self._inflight.get(flight_key)
+        if task is None:
+            counts[1] += 1
+            task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+            self._inflight[flight_key] = task
+            task.add_done_callback(lambda done: self._landed(flight_key, done))
+        return await asyncio.shield(task)
+
+    def _landed(self, flight_key: Tuple[str, Hashable], task: asyncio.Task):
+        if self._inflight.get(flight_key) is task:
+            del self._inflight[flight_key]
+        # Mark the exception retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        stats = {"in_flight": len(self._inflight)}
+        for kind, (requests, queries) in self._counts.items():
+            stats[kind] = {
+                "requests": requests,
+                "queries": queries,
+                "coalesced": requests - queries,
+                "coalescing_ratio": round((requests - queries) / requests, 4) if requests else 0.0
+            }
+        return stats
+
+# Create a global single-flight instance
+single_flight = SingleFlight()
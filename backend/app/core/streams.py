@@ -0,0 +1,94 @@
+"""
+Fan-out of sensor readings to Server-Sent Events streams.
+
+Read-only dashboards listen here instead of holding a full WebSocket through
+ConnectionManager. Each stream is just a bounded queue; readings are encoded
+once per broadcast and the same bytes are handed to every listening stream.
+Keep-alive comments come from one shared ticker instead of a timer per stream.
+"""
+import logging
+import os
+import asyncio
+from typing import Dict, Optional, Set, Tuple
+
+from app.core.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "100"))
+SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", "15"))
+
+KEEPALIVE_EVENT = b": keep-alive\n\n"
+
+def format_event(reading: dict) -> bytes:
+    """Encode a reading as an SSE `reading` event whose id is the reading id"""
+    return f"id: {reading['id']}\nevent: reading\ndata: ".encode() + dumps(reading) + b"\n\n"
+
+class StreamHub:
+    def __init__(self, queue_size: int = SSE_QUEUE_SIZE, keepalive_interval: float = SSE_KEEPALIVE_INTERVAL):
+        self.queue_size = queue_size
+        self.keepalive_interval = keepalive_interval
+        self.listeners: Dict[int, Set[asyncio.Queue]] = {}
+        self.listener_count = 0
+        self.dropped_events = 0
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """Register a new stream for a user and return the queue it should read from"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.listeners.setdefault(user_id, set()).add(queue)
+        self.listener_count += 1
+        self._ensure_keepalive_task()
+        logger.info(f"SSE stream opened: User ID {user_id} | Total streams: {self.listener_count}")
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        queues = self.listeners.get(user_id)
+        if not queues or queue not in queues:
+            return
+        queues.discard(queue)
+        self.listener_count -= 1
+        if not queues:
+            del self.listeners[user_id]
+        logger.info(f"SSE stream closed: User ID {user_id} | Total streams: {self.listener_count}")
+
+    def publish(self, reading: dict, user_id: int):
+        """Push a reading to every stream for a user, encoding it only once"""
+        queues = self.listeners.get(user_id)
+        if not queues:
+            return
+        item = (reading.get("id"), format_event(reading))
+        for queue in queues:
+            self._offer(queue, item)
+
+    def _offer(self, queue: asyncio.Queue, item: Tuple[Optional[int], bytes]):
+        # A slow reader loses its oldest events rather than blocking the broadcaster
+        if queue.full():
+            try:
+                queue.get_nowait()
+                self.dropped_events += 1
+            except asyncio.QueueEmpty:
+                pass
+        queue.put_nowait(item)
+
+    def _ensure_keepalive_task(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = self._keepalive_task
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        self._keepalive_task = loop.create_task(self._send_keepalives())
+
+    async def _send_keepalives(self):
+        while self.listeners:
+            await asyncio.sleep(self.keepalive_interval)
+            for queues in list(self.listeners.values()):
+                for queue in list(queues):
+                    # Streams with events already queued don't need a keep-alive
+                    if queue.empty():
+                        queue.put_nowait((None, KEEPALIVE_EVENT))
+
+# Create a global stream hub instance
+streams = StreamHub()
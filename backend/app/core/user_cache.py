@@ -0,0 +1,94 @@
+"""
+Bounded TTL/LRU cache of authenticated user records.
+
+get_current_user and verify_token look users up by username on every REST
+call and WebSocket handshake. Caching the record keeps that hot path free of
+database round trips. Endpoints that change a user's username, email or
+password must call `invalidate_user`; the TTL bounds how stale an entry can
+get on other worker processes, which don't see those invalidations.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+class UserCache:
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._username_by_id: Dict[int, str] = {}
+        # Sync dependencies run in FastAPI's threadpool, so guard against concurrent access
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, username: str) -> Optional[dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user = entry
+            if expires_at <= now:
+                self._remove(username)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return user
+
+    def set(self, username: str, user: dict):
+        with self._lock:
+            self._remove(username)
+            self._entries[username] = (time.monotonic() + self.ttl, user)
+            self._username_by_id[user['id']] = username
+            while len(self._entries) > self.max_size:
+                oldest, (_, oldest_user) = self._entries.popitem(last=False)
+                self._forget_id(oldest, oldest_user)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int):
+        """Drop the cached record for a user whose profile or password changed"""
+        with self._lock:
+            username = self._username_by_id.get(user_id)
+            if username is not None:
+                self._remove(username)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._username_by_id.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def _remove(self, username: str):
+        entry = self._entries.pop(username, None)
+        if entry is not None:
+            self._forget_id(username, entry[1])
+
+    def _forget_id(self, username: str, user: dict):
+        if self._username_by_id.get(user['id']) == username:
+            del self._username_by_id[user['id']]
+
+# Create a global user cache instance
+user_cache = UserCache()
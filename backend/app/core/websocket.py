@@ -1,98 +1,195 @@
-import json
 import logging
 import time
 import asyncio
 from fastapi import WebSocket
-from typing import Dict, List, Set, Optional
+from typing import Dict, List, Set, Optional, Tuple
 from datetime import datetime, timedelta
 
+from app.core.heartbeat import HeartbeatScheduler
+from app.core.streams import streams
+from app.core.recent import RecentReadings
+from app.core.serialization import dumps_text
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class ViewerSubscription:
+    """
+    Throttle settings and coalescing state for a single viewer connection.
+
+    Only the newest reading is kept in `pending`; older readings that arrive
+    before the viewer's next tick are simply overwritten and never encoded.
+    """
+    __slots__ = ("interval", "deadband", "pending", "last_sent", "next_send_at")
+
+    def __init__(self, max_rate: Optional[float] = None, deadband: Optional[float] = None):
+        if max_rate is not None and max_rate <= 0:
+            raise ValueError("max_rate must be greater than 0")
+        if deadband is not None and deadband < 0:
+            raise ValueError("deadband must not be negative")
+
+        self.interval = 1.0 / max_rate if max_rate else 0.0
+        self.deadband = deadband
+        self.pending: Optional[dict] = None
+        self.last_sent: Optional[dict] = None
+        self.next_send_at = 0.0
+
+    def within_deadband(self, reading: dict) -> bool:
+        """Check if a reading is too close to the last one sent to be worth sending"""
+        if self.deadband is None or self.last_sent is None:
+            return False
+        if reading.get("obstacle") != self.last_sent.get("obstacle"):
+            return False
+        for key in ("temperature", "humidity"):
+            try:
+                if abs(reading[key] - self.last_sent[key]) > self.deadband:
+                    return False
+            except (KeyError, TypeError):
+                return False
+        return True
+
 class ConnectionManager:
     def __init__(self):
+        # User-wide connections receive readings from all of the user's devices
         self.active_connections: Dict[int, List[WebSocket]] = {}
         self.connection_count: int = 0
-        self.last_cleanup = time.time()
-        self.cleanup_interval = 60  # seconds
         self.connection_timestamps: Dict[WebSocket, float] = {}
         self.max_connections_per_user = 5  # Limit connections per user
 
-    async def connect(self, websocket: WebSocket, user_id: int):
-        # Check if we need to clean up stale connections
-        await self._cleanup_stale_connections()
-
+        # Device-scoped connections (the device itself and viewers of it) only see that device
+        self.device_connections: Dict[int, List[WebSocket]] = {}
+        self.connection_devices: Dict[WebSocket, int] = {}
+        self.max_connections_per_device = 5
+
+        # Gateways publish readings for many devices and are never sent broadcasts
+        self.gateway_connections: Dict[int, List[WebSocket]] = {}
+        self.max_gateways_per_user = 5
+
+        # Which registry and key each connection's channel lives under
+        self.connection_channels: Dict[WebSocket, Tuple[dict, int]] = {}
+
+        # Idle connections are detected by a shared timer wheel rather than per-message timeouts
+        self.heartbeat = HeartbeatScheduler()
+
+        # Throttled viewer subscriptions, flushed by a single shared ticker
+        self.subscriptions: Dict[WebSocket, ViewerSubscription] = {}
+        self.subscription_tick = 0.1  # seconds
+        self._dirty_subscriptions: Set[WebSocket] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # Newest readings per user, used to answer resume requests without a query
+        self.recent_readings = RecentReadings()
+
+        # Live readings held back from connections that are still replaying missed data
+        self.replaying: Dict[WebSocket, List[dict]] = {}
+
+        # Connections that have sent readings, and so get adaptive sampling control messages
+        self.publishers: Dict[WebSocket, int] = {}
+
+        # When each device last sent a reading, stored or not: user_id -> {device_id: time}
+        self.last_seen: Dict[int, Dict[Optional[int], float]] = {}
+        self.tracking_since = time.time()
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        json_heartbeat: bool = False,
+        device_id: Optional[int] = None,
+        gateway: bool = False,
+        replay: bool = False
+    ):
+        """
+        Accept and register a connection. With replay=True, live broadcasts to it are held
+        back from the moment it is registered until `end_replay`, so readings broadcast
+        while the welcome is being sent aren't also sent again by the replay.
+        """
         # Accept the connection
         await websocket.accept()
 
-        # Initialize user's connection list if needed
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-
-        # Log existing connections for this user
-        logger.info(f"User {user_id} has {len(self.active_connections[user_id])} existing connections before adding new one")
-
-        # Check if user has too many connections
-        if len(self.active_connections[user_id]) >= self.max_connections_per_user:
-            # Remove the oldest connection for this user
-            oldest_conn = self.active_connections[user_id][0]
+        # Device-scoped connections and gateways get their own channels (and limits) so a
+        # user with many devices doesn't have them evicting each other
+        if gateway:
+            registry, key = self.gateway_connections, user_id
+            limit = self.max_gateways_per_user
+            scope = f"gateways of user {user_id}"
+        elif device_id is not None:
+            registry, key = self.device_connections, device_id
+            limit = self.max_connections_per_device
+            self.connection_devices[websocket] = device_id
+            scope = f"device {device_id}"
+        else:
+            registry, key = self.active_connections, user_id
+            limit = self.max_connections_per_user
+            scope = f"user {user_id}"
+        channel = registry.setdefault(key, [])
+        self.connection_channels[websocket] = (registry, key)
+
+        # Log existing connections for this channel
+        logger.info(f"{scope.capitalize()} has {len(channel)} existing connections before adding new one")
+
+        # Check if the channel has too many connections
+        if len(channel) >= limit:
+            # Remove the oldest connection for this channel
+            oldest_conn = channel[0]
             try:
-                logger.info(f"Closing oldest connection for user {user_id} due to connection limit")
+                logger.info(f"Closing oldest connection for {scope} due to connection limit")
                 await oldest_conn.close(code=1000, reason="Too many connections")
             except Exception as e:
                 logger.warning(f"Error closing oldest connection: {e}")
 
-            self.active_connections[user_id].pop(0)
-            self.connection_count -= 1
-            if oldest_conn in self.connection_timestamps:
-                del self.connection_timestamps[oldest_conn]
-            logger.warning(f"Closed oldest connection for user {user_id} due to connection limit")
-
-        # Check for any stale connections for this user and close them
-        current_time = time.time()
-        stale_threshold = current_time - 300  # 5 minutes
-
-        stale_connections = []
-        for conn in self.active_connections[user_id]:
-            if conn in self.connection_timestamps and self.connection_timestamps[conn] < stale_threshold:
-                stale_connections.append(conn)
-
-        # Close stale connections
-        for stale_conn in stale_connections:
-            try:
-                logger.info(f"Closing stale connection for user {user_id}")
-                await stale_conn.close(code=1000, reason="Connection timeout")
-            except Exception as e:
-                logger.warning(f"Error closing stale connection: {e}")
-
-            self.active_connections[user_id].remove(stale_conn)
-            self.connection_count -= 1
-            if stale_conn in self.connection_timestamps:
-                del self.connection_timestamps[stale_conn]
-
-        if stale_connections:
-            logger.info(f"Closed {len(stale_connections)} stale connections for user {user_id}")
+            self._remove_connection(oldest_conn, user_id)
+            channel = registry.setdefault(key, [])
+            logger.warning(f"Closed oldest connection for {scope} due to connection limit")
 
         # Add the new connection
-        self.active_connections[user_id].append(websocket)
+        if replay:
+            self.begin_replay(websocket)
+        channel.append(websocket)
         self.connection_timestamps[websocket] = time.time()
         self.connection_count += 1
+        self.heartbeat.register(websocket, json_ping=json_heartbeat)
 
         # Log connection
-        logger.info(f"WebSocket connected: User ID {user_id} | Total connections: {self.connection_count} | User connections: {len(self.active_connections[user_id])}")
+        logger.info(f"WebSocket connected: User ID {user_id} | Total connections: {self.connection_count} | Channel connections ({scope}): {len(channel)}")
 
         # Send welcome message
-        await self.send_personal_message(
-            json.dumps({
-                "status": "connected",
-                "message": "Connected to EnviroSense WebSocket server",
-                "connections": self.connection_count,
-                "user_connections": len(self.active_connections[user_id]),
-                "user_id": user_id
-            }),
-            websocket
-        )
+        welcome = {
+            "status": "connected",
+            "message": "Connected to EnviroSense WebSocket server",
+            "connections": self.connection_count,
+            "user_connections": len(channel),
+            "user_id": user_id
+        }
+        if device_id is not None:
+            welcome["device_id"] = device_id
+        if gateway:
+            welcome["gateway"] = True
+        await self.send_personal_message(dumps_text(welcome), websocket)
+
+    def _remove_connection(self, websocket: WebSocket, user_id: int) -> bool:
+        """Drop a connection from its channel and all per-connection state. Returns False if it wasn't registered."""
+        registry, key = self.connection_channels.pop(websocket, (self.active_connections, user_id))
+        channel = registry.get(key)
+        removed = channel is not None and websocket in channel
+        if removed:
+            channel.remove(websocket)
+            self.connection_count -= 1
+
+        # If this was the last connection in the channel, clean up the entry
+        if channel is not None and not channel:
+            del registry[key]
+            logger.info(f"Removed empty channel {key} (no more connections)")
+
+        self.connection_devices.pop(websocket, None)
+        if websocket in self.connection_timestamps:
+            del self.connection_timestamps[websocket]
+        self.heartbeat.unregister(websocket)
+        self.unsubscribe(websocket)
+        self.replaying.pop(websocket, None)
+        self.publishers.pop(websocket, None)
+        return removed
 
     def disconnect(self, websocket: WebSocket, user_id: int):
         """Disconnect a WebSocket connection and clean up resources"""
@@ -100,28 +197,11 @@ class ConnectionManager:
             # Log the disconnect attempt
             logger.info(f"Disconnecting WebSocket for user {user_id}")
 
-            if user_id in self.active_connections:
-                # Check if this specific websocket is in the user's connections
-                if websocket in self.active_connections[user_id]:
-                    # Remove the connection
-                    self.active_connections[user_id].remove(websocket)
-                    self.connection_count -= 1
-
-                    # Remove from timestamps
-                    if websocket in self.connection_timestamps:
-                        del self.connection_timestamps[websocket]
-
-                    # Log disconnection
-                    logger.info(f"WebSocket disconnected: User ID {user_id} | Total connections: {self.connection_count} | User connections: {len(self.active_connections[user_id])}")
-                else:
-                    logger.warning(f"WebSocket not found in user {user_id}'s connections during disconnect")
-
-                # If this was the last connection for this user, clean up the user entry
-                if not self.active_connections[user_id]:
-                    del self.active_connections[user_id]
-                    logger.info(f"Removed user {user_id} from active connections (no more connections)")
+            if self._remove_connection(websocket, user_id):
+                # Log disconnection
+                logger.info(f"WebSocket disconnected: User ID {user_id} | Total connections: {self.connection_count}")
             else:
-                logger.warning(f"User {user_id} not found in active connections during disconnect")
+                logger.warning(f"WebSocket not found in user {user_id}'s connections during disconnect")
 
             # Try to close the websocket if it's not already closed
             try:
@@ -135,37 +215,85 @@ class ConnectionManager:
             # Catch any errors during disconnect to prevent crashes
             logger.error(f"Error during WebSocket disconnect for user {user_id}: {e}")
 
-        # Final check - make sure the connection is removed from timestamps even if other steps failed
+        # Final check - make sure per-connection state is gone even if other steps failed
         if websocket in self.connection_timestamps:
             del self.connection_timestamps[websocket]
-
-    async def _cleanup_stale_connections(self):
-        """Clean up stale connections periodically"""
-        current_time = time.time()
-        if current_time - self.last_cleanup < self.cleanup_interval:
+        self.connection_devices.pop(websocket, None)
+        self.connection_channels.pop(websocket, None)
+        self.heartbeat.unregister(websocket)
+        self.unsubscribe(websocket)
+        self.replaying.pop(websocket, None)
+        self.publishers.pop(websocket, None)
+
+    def begin_replay(self, websocket: WebSocket):
+        """Hold back live broadcasts to a connection while missed readings are replayed to it"""
+        # Keep anything already held back since `connect(..., replay=True)`
+        self.replaying.setdefault(websocket, [])
+
+    async def end_replay(self, websocket: WebSocket, last_replayed_id: int = 0):
+        """Release held-back broadcasts, skipping any the replay already covered"""
+        held_back = self.replaying.pop(websocket, None) or []
+        for reading in held_back:
+            if reading.get("id", 0) > last_replayed_id:
+                await self.send_personal_message(dumps_text(reading), websocket)
+
+    def touch(self, websocket: WebSocket):
+        """Record inbound activity so the heartbeat scheduler keeps the connection open"""
+        self.heartbeat.touch(websocket)
+
+    def mark_publisher(self, websocket: WebSocket, user_id: int) -> bool:
+        """Record that a connection publishes readings. Returns True the first time."""
+        if websocket in self.publishers:
+            return False
+        self.publishers[websocket] = user_id
+        return True
+
+    def mark_seen(self, user_id: int, device_id: Optional[int], now: Optional[float] = None):
+        """Record that a device just sent a reading"""
+        devices = self.last_seen.get(user_id)
+        if devices is None:
+            devices = self.last_seen[user_id] = {}
+        devices[device_id] = time.time() if now is None else now
+
+    def silent_devices(self, user_id: int, min_silence: float, now: Optional[float] = None) -> List[dict]:
+        """The user's devices that haven't sent a reading for at least `min_silence` seconds, longest silent first"""
+        now = time.time() if now is None else now
+        silent = []
+        for device_id, seen in self.last_seen.get(user_id, {}).items():
+            if now - seen >= min_silence:
+                silent.append({
+                    "device_id": device_id,
+                    "last_seen": datetime.utcfromtimestamp(seen).isoformat(),
+                    "silent_seconds": round(now - seen, 1),
+                    "connected": device_id in self.device_connections
+                })
+        silent.sort(key=lambda device: -device["silent_seconds"])
+        return silent
+
+    async def push_control(self, message: dict):
+        """Send a sampling control message to every publishing connection"""
+        if self.publishers:
+            logger.info(f"Pushing sampling control level {message.get('level')} to {len(self.publishers)} publishers")
+        for websocket, user_id in list(self.publishers.items()):
+            await self._send_to_connections(dumps_text(message), user_id, [websocket])
+
+    def subscribe(self, websocket: WebSocket, max_rate: Optional[float] = None, deadband: Optional[float] = None):
+        """
+        Throttle broadcasts to a viewer to at most `max_rate` updates per second,
+        optionally skipping readings within `deadband` of the last one it was sent.
+        Calling this without limits reverts the connection to unthrottled delivery.
+        """
+        if not max_rate and deadband is None:
+            self.unsubscribe(websocket)
             return
 
-        self.last_cleanup = current_time
-        stale_threshold = current_time - 300  # 5 minutes
+        self.subscriptions[websocket] = ViewerSubscription(max_rate, deadband)
+        logger.info(f"Viewer subscription set: max_rate={max_rate}, deadband={deadband} | Throttled viewers: {len(self.subscriptions)}")
 
-        for user_id in list(self.active_connections.keys()):
-            for conn in list(self.active_connections[user_id]):
-                # Check if connection is stale
-                if conn in self.connection_timestamps and self.connection_timestamps[conn] < stale_threshold:
-                    try:
-                        await conn.close(code=1000, reason="Connection timeout")
-                    except Exception:
-                        pass
-                    self.active_connections[user_id].remove(conn)
-                    self.connection_count -= 1
-                    del self.connection_timestamps[conn]
-                    logger.info(f"Closed stale connection for user {user_id}")
-
-            # Clean up empty user entries
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
-
-        logger.info(f"Connection cleanup completed. Active connections: {self.connection_count}")
+    def unsubscribe(self, websocket: WebSocket):
+        """Remove any throttle settings for a connection"""
+        self.subscriptions.pop(websocket, None)
+        self._dirty_subscriptions.discard(websocket)
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         try:
@@ -177,31 +305,128 @@ class ConnectionManager:
 
     async def broadcast(self, message: str, user_id: int):
         if user_id in self.active_connections:
-            disconnected = []
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_text(message)
-                    # Update the timestamp for this connection
-                    self.connection_timestamps[connection] = time.time()
-                except Exception as e:
-                    logger.error(f"Error broadcasting to user {user_id}: {str(e)}")
-                    disconnected.append(connection)
-
-            # Clean up any disconnected websockets
-            for conn in disconnected:
-                if conn in self.active_connections[user_id]:
-                    self.active_connections[user_id].remove(conn)
-                    self.connection_count -= 1
-                    if conn in self.connection_timestamps:
-                        del self.connection_timestamps[conn]
-
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
+            await self._send_to_connections(message, user_id, list(self.active_connections[user_id]))
+
+    async def broadcast_reading(self, reading: dict, user_id: int):
+        """
+        Broadcast a sensor reading to the user-wide connections and, if the reading
+        came from a registered device, to that device's channel. Connections scoped
+        to other devices are never visited.
+
+        Unthrottled connections get it immediately (encoded once for all of them);
+        throttled viewers only have it stored as their newest pending state and
+        receive it on their next tick, if it is still the newest by then.
+        Server-Sent Events streams for the user are fed from here as well.
+        """
+        self.recent_readings.append(user_id, reading)
+        streams.publish(reading, user_id)
+
+        connections = list(self.active_connections.get(user_id, ()))
+        device_id = reading.get("device_id")
+        if device_id is not None:
+            connections.extend(self.device_connections.get(device_id, ()))
+        if not connections:
+            return
+
+        immediate = []
+        for connection in connections:
+            held_back = self.replaying.get(connection)
+            if held_back is not None:
+                held_back.append(reading)
+                continue
+            subscription = self.subscriptions.get(connection)
+            if subscription is None:
+                immediate.append(connection)
+            else:
+                subscription.pending = reading
+                self._dirty_subscriptions.add(connection)
+
+        if self._dirty_subscriptions:
+            self._ensure_flush_task()
+
+        if immediate:
+            await self._send_to_connections(dumps_text(reading), user_id, immediate)
+
+    async def broadcast_event(self, event: dict, user_id: int, device_id: Optional[int] = None):
+        """
+        Send an event about a reading (such as an anomaly annotation) to the same
+        connections as the reading. Events are rare and must not be coalesced away,
+        so throttled viewers get them immediately too.
+        """
+        connections = list(self.active_connections.get(user_id, ()))
+        if device_id is not None:
+            connections.extend(self.device_connections.get(device_id, ()))
+        if connections:
+            await self._send_to_connections(dumps_text(event), user_id, connections)
+
+    async def _send_to_connections(self, message: str, user_id: int, connections: List[WebSocket]):
+        disconnected = []
+        for connection in connections:
+            try:
+                await connection.send_text(message)
+                # Update the timestamp for this connection
+                self.connection_timestamps[connection] = time.time()
+            except Exception as e:
+                logger.error(f"Error broadcasting to user {user_id}: {str(e)}")
+                disconnected.append(connection)
+
+        # Clean up any disconnected websockets
+        for conn in disconnected:
+            self._remove_connection(conn, user_id)
+
+    def _ensure_flush_task(self):
+        """Start the shared subscription ticker if it is not already running on this loop"""
+        loop = asyncio.get_running_loop()
+        task = self._flush_task
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        self._flush_task = loop.create_task(self._flush_subscriptions())
+
+    async def _flush_subscriptions(self):
+        """Send each throttled viewer its newest pending reading once its interval has elapsed"""
+        while self._dirty_subscriptions:
+            await asyncio.sleep(self.subscription_tick)
+            await self.flush_subscriptions()
+
+    async def flush_subscriptions(self, now: Optional[float] = None):
+        """Run one subscription tick. Readings shared by several viewers are encoded only once."""
+        now = time.monotonic() if now is None else now
+        encoded: Dict[int, tuple] = {}
+
+        for connection in list(self._dirty_subscriptions):
+            subscription = self.subscriptions.get(connection)
+            if subscription is None or subscription.pending is None:
+                self._dirty_subscriptions.discard(connection)
+                continue
+            if now < subscription.next_send_at:
+                continue
+
+            reading = subscription.pending
+            subscription.pending = None
+            self._dirty_subscriptions.discard(connection)
+            if subscription.within_deadband(reading):
+                continue
+
+            # Keep the reading alive alongside its encoding so its id() stays unique this tick
+            cached = encoded.get(id(reading))
+            if cached is None:
+                cached = encoded[id(reading)] = (reading, dumps_text(reading))
+
+            try:
+                await connection.send_text(cached[1])
+                self.connection_timestamps[connection] = time.time()
+            except Exception as e:
+                logger.error(f"Error sending throttled update: {str(e)}")
+                self.unsubscribe(connection)
+                continue
+
+            subscription.last_sent = reading
+            subscription.next_send_at = now + subscription.interval
 
     async def handle_ping(self, websocket: WebSocket):
         """Handle ping messages from clients"""
         try:
-            await websocket.send_text(json.dumps({"type": "pong"}))
+            await websocket.send_text(dumps_text({"type": "pong"}))
             # Update the timestamp for this connection
             self.connection_timestamps[websocket] = time.time()
         except Exception as e:
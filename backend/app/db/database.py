@@ -66,6 +66,7 @@ def get_db():
     last_exception = None
 
     for attempt in range(retries):
+        yielded = False
         try:
             db = SessionLocal()
 
@@ -80,6 +81,7 @@ def get_db():
                     # Don't fail here, continue with the session
 
             try:
+                yielded = True
                 yield db
             finally:
                 try:
@@ -88,6 +90,9 @@ def get_db():
                     logger.warning(f"Error closing database connection: {str(close_error)}")
             return  # Successfully yielded and closed the session
         except Exception as e:
+            # Errors raised by the endpoint itself (e.g. HTTPException) must propagate, not trigger a retry
+            if yielded:
+                raise
             last_exception = e
             logger.warning(f"Database connection attempt {attempt+1}/{retries} failed: {str(e)}")
             # If we have a session, make sure it's closed before retrying
@@ -2,6 +2,10 @@ from sqlalchemy.orm import Session
 from app.db.database import Base, engine
 from app.models.user import User
 from app.models.sensor import SensorData
+from app.models.device import Device
+from app.models.device_token import RevokedDeviceToken
+from app.models.obstacle_event import ObstacleEvent
+from app.models.alert_rule import AlertRule
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
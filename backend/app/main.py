@@ -4,10 +4,15 @@ from fastapi.responses import HTMLResponse
 from app.api.v1.endpoints.hello import router as hello_router
 from app.api.v1.endpoints.auth import router as auth_router
 from app.api.v1.endpoints.sensor import router as sensor_router
+from app.api.v1.endpoints.metrics import router as metrics_router
+from app.api.v1.endpoints.alerts import router as alerts_router
 from app.db.init_db import create_tables
 from app.core.cors_middleware import CORSMiddleware as CustomCORSMiddleware
+from app.core.device_tokens import device_token_denylist
+from app.core.alerts import alert_engine
 
 from contextlib import asynccontextmanager
+import asyncio
 
 # Define lifespan context manager (new recommended approach)
 @asynccontextmanager
@@ -15,9 +20,15 @@ async def lifespan(_: FastAPI):
     # Startup: create database tables
     print("Creating database tables...")
     create_tables()
+    # Keep the device token denylist in sync with revocations made on other workers
+    denylist_task = asyncio.create_task(device_token_denylist.run())
+    # Load alert rules, then keep them in sync with changes made on other workers
+    alerts_task = asyncio.create_task(alert_engine.run())
     yield
     # Shutdown: cleanup resources if needed
     print("Shutting down application...")
+    denylist_task.cancel()
+    alerts_task.cancel()
 
 # Import custom response class
 from app.core.responses import CORSJSONResponse
@@ -137,6 +148,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         status_code=exc.status_code,
         content={"detail": exc.detail},
         headers={
+            # Keep headers set by the exception, e.g. WWW-Authenticate or Retry-After
+            **(exc.headers or {}),
             "Access-Control-Allow-Origin": origin,
             "Access-Control-Allow-Credentials": "true",
             "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS, PATCH",
@@ -165,6 +178,8 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 app.include_router(hello_router, prefix="/api/v1/hello")
 app.include_router(auth_router, prefix="/api/v1/auth", tags=["Authentication"])
 app.include_router(sensor_router, prefix="/api/v1/sensor", tags=["Sensor Data"])
+app.include_router(metrics_router, prefix="/api/v1/metrics", tags=["Metrics"])
+app.include_router(alerts_router, prefix="/api/v1/alerts", tags=["Alerts"])
 
 # Root endpoint for API documentation
 @app.get("/", response_class=CORSJSONResponse)
@@ -230,6 +245,20 @@ async def root():
                         "description": "Change password for authenticated user",
                         "parameters": "current_password, new_password",
                         "auth_required": True
+                    },
+                    {
+                        "method": "POST",
+                        "path": "/api/v1/auth/device-token",
+                        "description": "Issue a long-lived device token for WebSocket connections",
+                        "parameters": "device_id (from /api/v1/sensor/devices)",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "POST",
+                        "path": "/api/v1/auth/device-token/revoke",
+                        "description": "Revoke a device token",
+                        "parameters": "device_token",
+                        "auth_required": True
                     }
                 ]
             },
@@ -241,24 +270,116 @@ async def root():
                         "method": "WebSocket",
                         "path": "/api/v1/sensor/ws",
                         "description": "Real-time sensor data WebSocket connection",
-                        "auth_options": ["?token=jwt-token", "?email=user@example.com"],
+                        "auth_options": ["?device_token=device-token", "?token=jwt-token", "?email=user@example.com"],
                         "data_format": "JSON with temperature, humidity, obstacle status",
-                        "features": ["Real-time data streaming", "Ping/pong health checks"]
+                        "features": ["Real-time data streaming", "Ping/pong health checks", "Throttled viewer subscriptions (?max_rate=1&deadband=0.2)", "Resume missed readings on reconnect (?since_id=123 or ?since_ts=ISO 8601)", "Per-device channels (?device_id=3, implied by device tokens)", "Gateway mode (?gateway=true): {\"type\": \"readings\", \"readings\": [{\"device_id\": 3, \"seq\": 1, ...}]} with batched per-device acks", "Handshake admission control: over-limit clients get a {\"type\": \"retry\", \"retry_after\": seconds} message and close code 1013", "Alerts: rule state changes are pushed as {\"type\": \"alert\", \"state\": \"firing\" or \"resolved\", \"rule_id\": ..., \"value\": ...}", "Anomaly annotations: spikes and out-of-range values are pushed to viewers as {\"type\": \"anomaly\", \"reading_id\": ..., \"anomalies\": [...]}", "Adaptive sampling: under load, publishers are sent {\"type\": \"control\", \"send_interval_ms\": ..., \"batch_size\": ..., \"deadband\": ...}"]
+                    },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/sensor/stream",
+                        "description": "Server-Sent Events stream of live sensor readings for read-only dashboards",
+                        "auth_options": ["Authorization: Bearer <jwt-token>", "?token=jwt-token"],
+                        "features": ["Last-Event-ID resume by reading id", "Keep-alive comments"],
+                        "auth_required": True
                     },
                     {
                         "method": "GET",
                         "path": "/api/v1/sensor/data",
                         "description": "Get paginated sensor data with optional filtering",
-                        "parameters": "start_date, end_date, page, page_size",
+                        "parameters": "start_date, end_date, page, page_size, device_id",
                         "auth_required": True
                     },
                     {
                         "method": "GET",
                         "path": "/api/v1/sensor/data/latest",
                         "description": "Get the latest sensor reading for authenticated user",
+                        "parameters": "device_id (optional)",
                         "returns": "Most recent temperature, humidity, obstacle status",
                         "auth_required": True
                     },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/sensor/dashboard",
+                        "description": "Get the dashboard snapshot in one request",
+                        "parameters": "device_id (optional), points (default 144)",
+                        "returns": "Latest reading, downsampled last 24h, summary statistics, daily counts",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/sensor/history/{day}",
+                        "description": "Get all readings of one UTC day (completed days are served from an immutable file cache)",
+                        "parameters": "day (YYYY-MM-DD), device_id (optional)",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/sensor/obstacle/intervals",
+                        "description": "Get obstacle intervals and total occupied time for a range",
+                        "parameters": "start_date, end_date, device_id (optional)",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/sensor/conditions/periods",
+                        "description": "Find periods where a condition held for a minimum duration",
+                        "parameters": "metric (temperature, humidity), operator (>, >=, <, <=), threshold, start_date, end_date, min_duration, device_id (optional), max_gap (optional)",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/sensor/devices",
+                        "description": "List registered devices",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "POST",
+                        "path": "/api/v1/sensor/devices",
+                        "description": "Register a device so its readings get their own stream",
+                        "parameters": "name, ingest_deadband (optional)",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/sensor/devices/silent",
+                        "description": "List devices that haven't sent a reading recently (in-memory last-seen times)",
+                        "parameters": "min_silence (seconds, default 300)",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "PATCH",
+                        "path": "/api/v1/sensor/devices/{device_id}",
+                        "description": "Set a device's ingest deadband (readings within it of the last stored one are not stored)",
+                        "parameters": "ingest_deadband (null for the server default)",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/sensor/devices/{device_id}/series",
+                        "description": "Get a device's readings resampled step-wise (stored rows carried forward)",
+                        "parameters": "start_date, end_date, step (seconds, default 60)",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/sensor/devices/{device_id}/gaps",
+                        "description": "Get the gaps in a device's readings (when it stopped reporting and for how long)",
+                        "parameters": "start_date, end_date, min_gap (seconds, default 600)",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/sensor/devices/{device_id}/data",
+                        "description": "Get paginated sensor data from one device",
+                        "parameters": "start_date, end_date, page, page_size",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/sensor/devices/{device_id}/data/latest",
+                        "description": "Get the latest sensor reading from one device",
+                        "auth_required": True
+                    },
                     {
                         "method": "GET",
                         "path": "/api/v1/sensor/data/check",
@@ -268,6 +389,43 @@ async def root():
                     }
                 ]
             },
+            "alerts": {
+                "description": "Threshold alert rules, evaluated as readings arrive and delivered over the WebSocket",
+                "endpoints": [
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/alerts/rules",
+                        "description": "List alert rules",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "POST",
+                        "path": "/api/v1/alerts/rules",
+                        "description": "Create an alert rule, e.g. temperature > 30 for 300 seconds",
+                        "parameters": "name, metric (temperature, humidity, obstacle), operator (>, >=, <, <=), threshold, duration_seconds, device_id (optional), is_active",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/alerts/rules/{rule_id}",
+                        "description": "Get an alert rule",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "PATCH",
+                        "path": "/api/v1/alerts/rules/{rule_id}",
+                        "description": "Update an alert rule",
+                        "parameters": "name, operator, threshold, duration_seconds, is_active",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "DELETE",
+                        "path": "/api/v1/alerts/rules/{rule_id}",
+                        "description": "Delete an alert rule",
+                        "auth_required": True
+                    }
+                ]
+            },
             "utilities": {
                 "description": "Utility and health check endpoints",
                 "endpoints": [
@@ -277,6 +435,24 @@ async def root():
                         "description": "Simple health check endpoint",
                         "returns": "Greeting message"
                     },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/metrics/",
+                        "description": "Runtime cache and performance counters for this worker",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "GET",
+                        "path": "/api/v1/metrics/ingest-profile",
+                        "description": "Per-stage latency histograms of the WebSocket ingest loop in this worker",
+                        "auth_required": True
+                    },
+                    {
+                        "method": "PUT",
+                        "path": "/api/v1/metrics/ingest-profile?enabled=true[&reset=true]",
+                        "description": "Turn ingest stage timing on or off in this worker",
+                        "auth_required": True
+                    },
                     {
                         "method": "GET",
                         "path": "/",
@@ -302,6 +478,7 @@ async def root():
         "websocket_usage": {
             "connection": "wss://envirosense-2khv.onrender.com/api/v1/sensor/ws",
             "authentication": [
+                "Query parameter: ?device_token=your-device-token (recommended for devices)",
                 "Query parameter: ?token=your-jwt-token",
                 "Query parameter: ?email=your-email@example.com"
             ],
@@ -312,7 +489,12 @@ async def root():
                     "obstacle": False
                 },
                 "ping": "ping",
-                "pong": "pong"
+                "pong": "pong",
+                "subscribe": {
+                    "type": "subscribe",
+                    "max_rate": 1.0,
+                    "deadband": 0.2
+                }
             }
         },
         "example_usage": {
@@ -526,6 +708,22 @@ async def docs_html():
                 <p>Parameters: current_password, new_password</p>
             </div>
 
+            <div class="endpoint">
+                <span class="method post">POST</span>
+                <span class="path">/api/v1/auth/device-token</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Issue a long-lived device token for WebSocket connections</strong></p>
+                <p>Parameters: device_id</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method post">POST</span>
+                <span class="path">/api/v1/auth/device-token/revoke</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Revoke a device token</strong></p>
+                <p>Parameters: device_token</p>
+            </div>
+
             <h2>📊 Sensor Data Endpoints</h2>
             <p>Sensor data management and real-time monitoring</p>
 
@@ -533,17 +731,26 @@ async def docs_html():
                 <span class="method websocket">WebSocket</span>
                 <span class="path">/api/v1/sensor/ws</span>
                 <p><strong>Real-time sensor data WebSocket connection</strong></p>
-                <p>Authentication: ?token=jwt-token OR ?email=user@example.com</p>
+                <p>Authentication: ?device_token=device-token OR ?token=jwt-token OR ?email=user@example.com</p>
                 <p>Data format: JSON with temperature, humidity, obstacle status</p>
                 <p>Features: Real-time data streaming, Ping/pong health checks</p>
             </div>
 
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="path">/api/v1/sensor/stream</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Server-Sent Events stream of live sensor readings</strong></p>
+                <p>Authentication: Authorization header OR ?token=jwt-token</p>
+                <p>Features: Last-Event-ID resume, keep-alive comments</p>
+            </div>
+
             <div class="endpoint">
                 <span class="method get">GET</span>
                 <span class="path">/api/v1/sensor/data</span>
                 <span class="auth-required">🔒 Auth Required</span>
                 <p><strong>Get paginated sensor data with optional filtering</strong></p>
-                <p>Parameters: start_date, end_date, page, page_size</p>
+                <p>Parameters: start_date, end_date, page, page_size, device_id</p>
             </div>
 
             <div class="endpoint">
@@ -551,9 +758,105 @@ async def docs_html():
                 <span class="path">/api/v1/sensor/data/latest</span>
                 <span class="auth-required">🔒 Auth Required</span>
                 <p><strong>Get the latest sensor reading for authenticated user</strong></p>
+                <p>Parameters: device_id (optional)</p>
                 <p>Returns: Most recent temperature, humidity, obstacle status</p>
             </div>
 
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="path">/api/v1/sensor/dashboard</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Get the dashboard snapshot in one request</strong></p>
+                <p>Parameters: device_id (optional), points (default 144)</p>
+                <p>Returns: Latest reading, downsampled last 24h, summary statistics, daily counts</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="path">/api/v1/sensor/history/{day}</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Get all readings of one UTC day (completed days are served from an immutable file cache)</strong></p>
+                <p>Parameters: day (YYYY-MM-DD), device_id (optional)</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="path">/api/v1/sensor/obstacle/intervals</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Get obstacle intervals and total occupied time for a range</strong></p>
+                <p>Parameters: start_date, end_date, device_id (optional)</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="path">/api/v1/sensor/conditions/periods</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Find periods where a condition held for a minimum duration</strong></p>
+                <p>Parameters: metric (temperature, humidity), operator (&gt;, &gt;=, &lt;, &lt;=), threshold, start_date, end_date, min_duration, device_id (optional), max_gap (optional)</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="path">/api/v1/sensor/devices</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>List registered devices</strong></p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method post">POST</span>
+                <span class="path">/api/v1/sensor/devices</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Register a device so its readings get their own stream</strong></p>
+                <p>Parameters: name, ingest_deadband (optional)</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="path">/api/v1/sensor/devices/silent</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>List devices that haven't sent a reading recently (in-memory last-seen times)</strong></p>
+                <p>Parameters: min_silence (seconds, default 300)</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method put">PATCH</span>
+                <span class="path">/api/v1/sensor/devices/{device_id}</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Set a device's ingest deadband (readings within it of the last stored one are not stored)</strong></p>
+                <p>Parameters: ingest_deadband (null for the server default)</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="path">/api/v1/sensor/devices/{device_id}/series</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Get a device's readings resampled step-wise (stored rows carried forward)</strong></p>
+                <p>Parameters: start_date, end_date, step (seconds, default 60)</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="path">/api/v1/sensor/devices/{device_id}/gaps</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Get the gaps in a device's readings (when it stopped reporting and for how long)</strong></p>
+                <p>Parameters: start_date, end_date, min_gap (seconds, default 600)</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="path">/api/v1/sensor/devices/{device_id}/data</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Get paginated sensor data from one device</strong></p>
+                <p>Parameters: start_date, end_date, page, page_size</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="path">/api/v1/sensor/devices/{device_id}/data/latest</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Get the latest sensor reading from one device</strong></p>
+            </div>
+
             <div class="endpoint">
                 <span class="method get">GET</span>
                 <span class="path">/api/v1/sensor/data/check</span>
@@ -562,6 +865,45 @@ async def docs_html():
                 <p>Returns: Record count and date range of available data</p>
             </div>
 
+            <h2>🔔 Alert Rule Endpoints</h2>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="path">/api/v1/alerts/rules</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>List alert rules</strong></p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method post">POST</span>
+                <span class="path">/api/v1/alerts/rules</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Create an alert rule, e.g. temperature &gt; 30 for 300 seconds</strong></p>
+                <p>Parameters: name, metric (temperature, humidity, obstacle), operator (&gt;, &gt;=, &lt;, &lt;=), threshold, duration_seconds, device_id (optional), is_active</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method get">GET</span>
+                <span class="path">/api/v1/alerts/rules/{rule_id}</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Get an alert rule</strong></p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method put">PATCH</span>
+                <span class="path">/api/v1/alerts/rules/{rule_id}</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Update an alert rule</strong></p>
+                <p>Parameters: name, operator, threshold, duration_seconds, is_active</p>
+            </div>
+
+            <div class="endpoint">
+                <span class="method put">DELETE</span>
+                <span class="path">/api/v1/alerts/rules/{rule_id}</span>
+                <span class="auth-required">🔒 Auth Required</span>
+                <p><strong>Delete an alert rule</strong></p>
+            </div>
+
             <h2>🛠️ Utility Endpoints</h2>
 
             <div class="endpoint">
@@ -1,2 +1,6 @@
 from app.models.user import User
 from app.models.sensor import SensorData
+from app.models.device import Device
+from app.models.device_token import RevokedDeviceToken
+from app.models.obstacle_event import ObstacleEvent
+from app.models.alert_rule import AlertRule
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey
+from datetime import datetime, timezone
+from app.db.database import Base
+
+class AlertRule(Base):
+    """A threshold condition on one metric, e.g. temperature > 30 for 300 seconds"""
+    __tablename__ = "alert_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=True)  # NULL applies to all the user's devices
+    name = Column(String)
+    metric = Column(String)  # temperature, humidity or obstacle (1 present, 0 clear)
+    operator = Column(String)  # >, >=, < or <=
+    threshold = Column(Float)
+    duration_seconds = Column(Integer, default=0)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
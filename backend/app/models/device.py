@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+from datetime import datetime, timezone
+from app.db.database import Base
+
+class Device(Base):
+    __tablename__ = "devices"
+    __table_args__ = (
+        # A user can't register two devices under the same name
+        UniqueConstraint("user_id", "name", name="uq_devices_user_id_name"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    name = Column(String)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Readings within this tolerance of the last stored one are not stored (NULL uses INGEST_DEADBAND)
+    ingest_deadband = Column(Float, nullable=True)
+
+    # Relationship with sensor data
+    sensor_data = relationship("SensorData", back_populates="device")
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from datetime import datetime, timezone
+from app.db.database import Base
+
+class RevokedDeviceToken(Base):
+    __tablename__ = "revoked_device_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    token_id = Column(String, unique=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    revoked_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
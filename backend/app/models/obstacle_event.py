@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
+from app.db.database import Base
+
+class ObstacleEvent(Base):
+    """One period with an obstacle present: from the reading that turned it on to the one that turned it off"""
+    __tablename__ = "obstacle_events"
+    __table_args__ = (
+        # Range queries look up a user's (or device's) events by start time
+        Index("ix_obstacle_events_user_id_device_id_started_at", "user_id", "device_id", "started_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=True)
+    started_at = Column(DateTime, nullable=False)
+    ended_at = Column(DateTime, nullable=True)  # NULL while the obstacle is still present
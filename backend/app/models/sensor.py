@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, Float, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Float, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from app.db.database import Base
 
 class SensorData(Base):
     __tablename__ = "sensor_data"
+    __table_args__ = (
+        # Device-scoped queries read one device's series in time order
+        Index("ix_sensor_data_device_id_timestamp", "device_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     temperature = Column(Float)
@@ -12,8 +16,10 @@ class SensorData(Base):
     obstacle = Column(Boolean)
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     user_id = Column(Integer, ForeignKey("users.id"))
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=True)
 
     # Relationship with user
     # Use foreign_keys to explicitly specify which column to use
     # This avoids conflicts with BasicUser
     user = relationship("User", back_populates="sensor_data", foreign_keys=[user_id])
+    device = relationship("Device", back_populates="sensor_data")
@@ -0,0 +1,27 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class AlertRuleCreate(BaseModel):
+    name: str
+    metric: str
+    operator: str
+    threshold: float
+    duration_seconds: int = 0
+    device_id: Optional[int] = None
+    is_active: bool = True
+
+class AlertRuleUpdate(BaseModel):
+    name: Optional[str] = None
+    operator: Optional[str] = None
+    threshold: Optional[float] = None
+    duration_seconds: Optional[int] = None
+    is_active: Optional[bool] = None
+
+class AlertRule(AlertRuleCreate):
+    id: int
+    user_id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class DeviceCreate(BaseModel):
+    name: str
+    ingest_deadband: Optional[float] = None
+
+class DeviceUpdate(BaseModel):
+    ingest_deadband: Optional[float] = None
+
+class Device(DeviceCreate):
+    id: int
+    user_id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
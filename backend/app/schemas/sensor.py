@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 
 class SensorDataBase(BaseModel):
     temperature: float
@@ -13,6 +14,7 @@ class SensorData(SensorDataBase):
     id: int
     timestamp: datetime
     user_id: int
+    device_id: Optional[int] = None
 
     class Config:
         from_attributes = True
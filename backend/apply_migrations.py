@@ -3,6 +3,7 @@ Combined migration script to apply all database migrations.
 This script will:
 1. Add brute force protection fields
 2. Add password reset fields
+3. Add the devices table and sensor_data.device_id
 """
 import os
 import sys
@@ -132,6 +133,258 @@ def apply_password_reset_migration():
     
     return True
 
+def apply_device_migration():
+    """Apply the device registry migration."""
+    try:
+        # Connect to the database
+        conn = psycopg2.connect(
+            host=host,
+            database=database,
+            user=db_user,
+            password=db_password,
+            port=port
+        )
+        
+        # Create a cursor
+        cur = conn.cursor()
+        
+        # Check if the column already exists
+        cur.execute("""
+            SELECT column_name 
+            FROM information_schema.columns 
+            WHERE table_name = 'sensor_data' AND column_name = 'device_id';
+        """)
+        
+        if cur.fetchone():
+            print("Device migration already applied.")
+            cur.close()
+            conn.close()
+            return True
+        
+        # Create the devices table
+        print("Creating devices table...")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS devices (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER REFERENCES users(id),
+                name VARCHAR,
+                created_at TIMESTAMP,
+                CONSTRAINT uq_devices_user_id_name UNIQUE (user_id, name)
+            );
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS ix_devices_user_id ON devices (user_id);")
+        
+        # Add device_id to sensor_data
+        print("Adding device_id column to sensor_data table...")
+        cur.execute("""
+            ALTER TABLE sensor_data 
+            ADD COLUMN device_id INTEGER REFERENCES devices(id);
+        """)
+        
+        # Index device-scoped queries
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS ix_sensor_data_device_id_timestamp
+            ON sensor_data (device_id, timestamp);
+        """)
+        
+        # Commit the transaction
+        conn.commit()
+        print("Device migration completed successfully.")
+        
+        # Close the cursor and connection
+        cur.close()
+        conn.close()
+        
+    except Exception as e:
+        print(f"Error during device migration: {e}")
+        return False
+    
+    return True
+
+def apply_ingest_deadband_migration():
+    """Apply the per-device ingest deadband migration."""
+    try:
+        # Connect to the database
+        conn = psycopg2.connect(
+            host=host,
+            database=database,
+            user=db_user,
+            password=db_password,
+            port=port
+        )
+        
+        # Create a cursor
+        cur = conn.cursor()
+        
+        # Check if the column already exists
+        cur.execute("""
+            SELECT column_name 
+            FROM information_schema.columns 
+            WHERE table_name = 'devices' AND column_name = 'ingest_deadband';
+        """)
+        
+        if cur.fetchone():
+            print("Ingest deadband migration already applied.")
+            cur.close()
+            conn.close()
+            return True
+        
+        # Add ingest_deadband to devices
+        print("Adding ingest_deadband column to devices table...")
+        cur.execute("""
+            ALTER TABLE devices 
+            ADD COLUMN ingest_deadband DOUBLE PRECISION;
+        """)
+        
+        # Commit the transaction
+        conn.commit()
+        print("Ingest deadband migration completed successfully.")
+        
+        # Close the cursor and connection
+        cur.close()
+        conn.close()
+        
+    except Exception as e:
+        print(f"Error during ingest deadband migration: {e}")
+        return False
+    
+    return True
+
+def apply_obstacle_events_migration():
+    """Apply the obstacle events migration."""
+    try:
+        # Connect to the database
+        conn = psycopg2.connect(
+            host=host,
+            database=database,
+            user=db_user,
+            password=db_password,
+            port=port
+        )
+        
+        # Create a cursor
+        cur = conn.cursor()
+        
+        # Check if the table already exists
+        cur.execute("""
+            SELECT table_name 
+            FROM information_schema.tables 
+            WHERE table_name = 'obstacle_events';
+        """)
+        
+        if cur.fetchone():
+            print("Obstacle events migration already applied.")
+            cur.close()
+            conn.close()
+            return True
+        
+        # Create the obstacle_events table
+        print("Creating obstacle_events table...")
+        cur.execute("""
+            CREATE TABLE obstacle_events (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER REFERENCES users(id),
+                device_id INTEGER REFERENCES devices(id),
+                started_at TIMESTAMP NOT NULL,
+                ended_at TIMESTAMP
+            );
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS ix_obstacle_events_user_id_device_id_started_at
+            ON obstacle_events (user_id, device_id, started_at);
+        """)
+        
+        # Backfill events from the obstacle changes in existing readings
+        print("Backfilling obstacle events from sensor_data...")
+        cur.execute("""
+            WITH changes AS (
+                SELECT user_id, device_id, timestamp, obstacle,
+                       LAG(obstacle) OVER (PARTITION BY user_id, device_id ORDER BY timestamp, id) AS previous
+                FROM sensor_data
+            ), edges AS (
+                SELECT user_id, device_id, timestamp, obstacle,
+                       LEAD(timestamp) OVER (PARTITION BY user_id, device_id ORDER BY timestamp) AS next_edge
+                FROM changes
+                WHERE obstacle != COALESCE(previous, FALSE)
+            )
+            INSERT INTO obstacle_events (user_id, device_id, started_at, ended_at)
+            SELECT user_id, device_id, timestamp, next_edge FROM edges WHERE obstacle;
+        """)
+        
+        # Commit the transaction
+        conn.commit()
+        print("Obstacle events migration completed successfully.")
+        
+        # Close the cursor and connection
+        cur.close()
+        conn.close()
+        
+    except Exception as e:
+        print(f"Error during obstacle events migration: {e}")
+        return False
+    
+    return True
+
+def apply_alert_rules_migration():
+    """Apply the alert rules migration."""
+    try:
+        # Connect to the database
+        conn = psycopg2.connect(
+            host=host,
+            database=database,
+            user=db_user,
+            password=db_password,
+            port=port
+        )
+        
+        # Create a cursor
+        cur = conn.cursor()
+        
+        # Check if the table already exists
+        cur.execute("""
+            SELECT table_name 
+            FROM information_schema.tables 
+            WHERE table_name = 'alert_rules';
+        """)
+        
+        if cur.fetchone():
+            print("Alert rules migration already applied.")
+            cur.close()
+            conn.close()
+            return True
+        
+        # Create the alert_rules table
+        print("Creating alert_rules table...")
+        cur.execute("""
+            CREATE TABLE alert_rules (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER REFERENCES users(id),
+                device_id INTEGER REFERENCES devices(id),
+                name VARCHAR,
+                metric VARCHAR,
+                operator VARCHAR,
+                threshold DOUBLE PRECISION,
+                duration_seconds INTEGER,
+                is_active BOOLEAN,
+                created_at TIMESTAMP
+            );
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS ix_alert_rules_user_id ON alert_rules (user_id);")
+        
+        # Commit the transaction
+        conn.commit()
+        print("Alert rules migration completed successfully.")
+        
+        # Close the cursor and connection
+        cur.close()
+        conn.close()
+        
+    except Exception as e:
+        print(f"Error during alert rules migration: {e}")
+        return False
+    
+    return True
+
 def apply_all_migrations():
     """Apply all migrations."""
     print("Starting database migrations...")
@@ -148,6 +401,30 @@ def apply_all_migrations():
     else:
         print("Password reset migration failed.")
     
+    # Apply device migration
+    if apply_device_migration():
+        print("Device migration successful.")
+    else:
+        print("Device migration failed.")
+    
+    # Apply ingest deadband migration
+    if apply_ingest_deadband_migration():
+        print("Ingest deadband migration successful.")
+    else:
+        print("Ingest deadband migration failed.")
+    
+    # Apply obstacle events migration
+    if apply_obstacle_events_migration():
+        print("Obstacle events migration successful.")
+    else:
+        print("Obstacle events migration failed.")
+    
+    # Apply alert rules migration
+    if apply_alert_rules_migration():
+        print("Alert rules migration successful.")
+    else:
+        print("Alert rules migration failed.")
+    
     print("All migrations completed.")
 
 if __name__ == "__main__":
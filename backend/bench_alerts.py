@@ -0,0 +1,104 @@
+"""
+Measure the per-reading cost of alert rule evaluation with many active rules.
+
+Runs the real AlertEngine (sorted threshold indexes + duration state
+machines) against a naive scan that tests every rule's condition on every
+reading, in two layouts:
+
+  fleet  rules spread over many users and devices, as in production
+  hot    every rule on the same device and metric (worst case for the index)
+
+Usage:
+    python bench_alerts.py --rules 10000 --readings 100000 --hot-readings 5000
+"""
+import argparse
+import operator
+import random
+import time
+
+from app.core.alerts import AlertEngine, ALERT_METRICS, ALERT_OPERATORS
+
+COMPARE = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+THRESHOLDS = {"temperature": (10.0, 40.0), "humidity": (10.0, 90.0), "obstacle": (0.5, 0.5)}
+
+def make_rules(count, users, devices_per_user, rng, hot):
+    rules = []
+    for rule_id in range(1, count + 1):
+        if hot:
+            user_id, device_id, metric = 1, 1, "temperature"
+        else:
+            user_id = rng.randrange(users) + 1
+            device_id = rng.choice([None, (user_id - 1) * devices_per_user + rng.randrange(devices_per_user) + 1])
+            metric = rng.choice(ALERT_METRICS)
+        low, high = THRESHOLDS[metric]
+        rules.append({
+            "id": rule_id, "user_id": user_id, "device_id": device_id, "name": f"rule {rule_id}",
+            "metric": metric, "operator": rng.choice(ALERT_OPERATORS), "threshold": round(rng.uniform(low, high), 1),
+            "duration_seconds": rng.choice([0, 60, 300]), "is_active": True
+        })
+    return rules
+
+def make_readings(count, users, devices_per_user, rng, hot):
+    readings = []
+    for i in range(count):
+        if hot:
+            user_id, device_id = 1, 1
+        else:
+            user_id = rng.randrange(users) + 1
+            device_id = (user_id - 1) * devices_per_user + rng.randrange(devices_per_user) + 1
+        readings.append({
+            "id": i, "user_id": user_id, "device_id": device_id,
+            "temperature": round(rng.gauss(24, 4), 1), "humidity": round(rng.gauss(50, 15), 1),
+            "obstacle": rng.random() < 0.1
+        })
+    return readings
+
+def naive_scan(rules, readings):
+    """Test every rule against every reading (conditions only, no duration state)"""
+    matched = 0
+    started = time.perf_counter()
+    for reading in readings:
+        for rule in rules:
+            if rule["user_id"] != reading["user_id"]:
+                continue
+            if rule["device_id"] is not None and rule["device_id"] != reading["device_id"]:
+                continue
+            if COMPARE[rule["operator"]](float(reading[rule["metric"]]), rule["threshold"]):
+                matched += 1
+    return time.perf_counter() - started, matched
+
+def indexed(rules, readings):
+    engine = AlertEngine()
+    engine.load(rules)
+    events = 0
+    started = time.perf_counter()
+    for i, reading in enumerate(readings):
+        events += len(engine.evaluate(reading, now=i * 2.0))
+    elapsed = time.perf_counter() - started
+    return elapsed, events, engine.stats()["tracked_conditions"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark alert rule evaluation per reading")
+    parser.add_argument("--rules", type=int, default=10000)
+    parser.add_argument("--readings", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--devices-per-user", type=int, default=3)
+    parser.add_argument("--hot-readings", type=int, default=5000, help="Readings for the hot layout, where every reading matches thousands of rules")
+    parser.add_argument("--naive-readings", type=int, default=2000, help="Readings for the (slow) naive scan")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for layout in ("fleet", "hot"):
+        rng = random.Random(args.seed)
+        hot = layout == "hot"
+        rules = make_rules(args.rules, args.users, args.devices_per_user, rng, hot)
+        readings = make_readings(args.hot_readings if hot else args.readings, args.users, args.devices_per_user, rng, hot)
+
+        elapsed, events, tracked = indexed(rules, readings)
+        print(f"{layout:5s} indexed: {elapsed / len(readings) * 1e6:9.2f} us/reading | {events} events | {tracked} conditions tracked")
+        naive_readings = readings[:args.naive_readings]
+        elapsed, matched = naive_scan(rules, naive_readings)
+        print(f"{layout:5s} naive  : {elapsed / len(naive_readings) * 1e6:9.2f} us/reading | {matched / len(naive_readings):.1f} rules matched/reading")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Time the dashboard's first load: the old sequence of /data/latest, /data and
+/data/check against the single /dashboard snapshot.
+
+Runs the real app in-process against a throwaway SQLite database filled with
+a week of readings for one user. Each HTTP request also pays `--rtt`
+milliseconds of simulated network round trip, since the old sequence needs
+three of them before the dashboard can render.
+
+Usage:
+    python bench_dashboard.py --days 7 --interval 10 --rtt 50 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.main import app
+from app.core.auth import create_access_token
+from app.db.database import Base, SessionLocal, engine
+
+OLD_SEQUENCE = ["/api/v1/sensor/data/latest", "/api/v1/sensor/data", "/api/v1/sensor/data/check"]
+SNAPSHOT = ["/api/v1/sensor/dashboard"]
+
+def fill(days: int, interval: int) -> int:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.execute(text("INSERT INTO users (id, username, email, hashed_password, is_active) VALUES (1, 'bench', 'bench@example.com', 'x', 1)"))
+    now = datetime.utcnow()
+    rows = [
+        {"t": now - timedelta(seconds=age), "temperature": 20 + (age // 600) % 8, "humidity": 50 + (age // 900) % 10, "obstacle": age % 7 == 0}
+        for age in range(0, days * 86400, interval)
+    ]
+    db.execute(
+        text("INSERT INTO sensor_data (user_id, temperature, humidity, obstacle, timestamp) VALUES (1, :temperature, :humidity, :obstacle, :t)"),
+        rows
+    )
+    db.commit()
+    db.close()
+    return len(rows)
+
+def load(client: TestClient, paths: list, headers: dict, rtt: float) -> float:
+    started = time.perf_counter()
+    for path in paths:
+        time.sleep(rtt)
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, response.text
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dashboard first load")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--interval", type=int, default=10, help="Seconds between readings")
+    parser.add_argument("--rtt", type=float, default=50, help="Simulated network round trip per request, ms")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = fill(args.days, args.interval)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'bench'}, timedelta(hours=1))}"}
+    print(f"{rows} readings, simulated round trip {args.rtt:.0f} ms")
+
+    with TestClient(app) as client:
+        for name, paths in (("old sequence", OLD_SEQUENCE), ("snapshot", SNAPSHOT)):
+            load(client, paths, headers, 0)
+            server = [load(client, paths, headers, 0) for _ in range(args.repeat)]
+            total = [load(client, paths, headers, args.rtt / 1000) for _ in range(args.repeat)]
+            print(
+                f"{name:12s}: {len(paths)} request(s) | server {statistics.median(server) * 1000:7.1f} ms"
+                f" | first paint {statistics.median(total) * 1000:7.1f} ms (median of {args.repeat})"
+            )
+
+if __name__ == "__main__":
+    main()
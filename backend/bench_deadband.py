@@ -0,0 +1,118 @@
+"""
+Measure how much storage ingest deadband compression saves on a week of
+realistic indoor DHT22 readings, and how far the step-wise reconstruction
+strays from the raw series.
+
+The synthetic week is one device sending every 2 seconds: a daily temperature
+and humidity swing, heating cycles, sensor noise and the DHT22's 0.1
+resolution, plus an obstacle (someone walking past) every ~20 minutes.
+Readings go through the real IngestDeadband filter and the stored rows are
+written to a throwaway SQLite database with the production schema and indexes.
+
+Usage:
+    python bench_deadband.py --days 7 --tolerances 0,0.2,0.5
+"""
+import argparse
+import math
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from app.db.database import Base
+from app.core.ingest_deadband import IngestDeadband
+import app.models  # noqa: F401  (registers the tables on Base.metadata)
+
+def simulate(days, interval, seed):
+    rng = random.Random(seed)
+    readings = []
+    heating = 0.0
+    obstacle_until = -1.0
+    next_obstacle = rng.expovariate(1 / 1200)
+    t = 0.0
+    while t < days * 86400:
+        day_phase = 2 * math.pi * (t % 86400) / 86400
+        # Thermostat: heat for ~15 minutes every hour, then drift back down
+        heating = min(heating + 0.002, 0.8) if (t % 3600) < 900 else max(heating - 0.0007, 0.0)
+        temperature = 21.0 + 1.2 * math.sin(day_phase - 2.0) + heating + rng.gauss(0, 0.04)
+        humidity = 46.0 - 4.0 * math.sin(day_phase - 2.0) + rng.gauss(0, 0.15)
+        if t >= next_obstacle:
+            obstacle_until = t + rng.uniform(4, 90)
+            next_obstacle = t + rng.expovariate(1 / 1200)
+        readings.append((t, round(temperature, 1), round(humidity, 1), t < obstacle_until))
+        t += interval
+    return readings
+
+def store(readings, tolerance, heartbeat):
+    deadband = IngestDeadband(default_tolerance=tolerance, heartbeat_interval=heartbeat)
+    stored = []
+    for t, temperature, humidity, obstacle in readings:
+        if deadband.should_store(1, 1, temperature, humidity, obstacle, tolerance, now=t):
+            deadband.remember(1, 1, temperature, humidity, obstacle, reading_id=len(stored) + 1, now=t)
+            stored.append((t, temperature, humidity, obstacle))
+    return stored
+
+def database_size(rows):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2026, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(
+            text("""
+                INSERT INTO sensor_data (temperature, humidity, obstacle, user_id, device_id, timestamp)
+                VALUES (:temperature, :humidity, :obstacle, 1, 1, :timestamp)
+            """),
+            [
+                {"temperature": temperature, "humidity": humidity, "obstacle": obstacle, "timestamp": start + timedelta(seconds=t)}
+                for t, temperature, humidity, obstacle in rows
+            ]
+        )
+    with engine.connect() as conn:
+        conn.execute(text("VACUUM"))
+    engine.dispose()
+    return os.path.getsize(path)
+
+def reconstruction_error(readings, stored):
+    """Largest difference between each raw reading and the stored row in force at its time"""
+    max_temperature = max_humidity = 0.0
+    obstacle_mismatches = 0
+    index = -1
+    for t, temperature, humidity, obstacle in readings:
+        while index + 1 < len(stored) and stored[index + 1][0] <= t:
+            index += 1
+        _, stored_temperature, stored_humidity, stored_obstacle = stored[index]
+        max_temperature = max(max_temperature, abs(temperature - stored_temperature))
+        max_humidity = max(max_humidity, abs(humidity - stored_humidity))
+        obstacle_mismatches += obstacle != stored_obstacle
+    return max_temperature, max_humidity, obstacle_mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest deadband compression on synthetic DHT22 data")
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--interval", type=float, default=2, help="Seconds between readings")
+    parser.add_argument("--tolerances", default="0,0.1,0.2,0.5")
+    parser.add_argument("--heartbeat", type=float, default=300, help="Seconds between forced heartbeat rows")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    readings = simulate(args.days, args.interval, args.seed)
+    print(f"{len(readings)} readings over {args.days:g} days, heartbeat every {args.heartbeat:g}s")
+
+    baseline_rows = baseline_bytes = None
+    for tolerance in (float(value) for value in args.tolerances.split(",")):
+        stored = store(readings, tolerance, args.heartbeat)
+        size = database_size(stored)
+        if baseline_rows is None:
+            baseline_rows, baseline_bytes = len(stored), size
+        max_temperature, max_humidity, obstacle_mismatches = reconstruction_error(readings, stored)
+        print(
+            f"tolerance {tolerance:4.2f}: {len(stored):7d} rows ({len(stored) / baseline_rows:6.1%}) | "
+            f"{size / 1024:8.0f} KiB ({size / baseline_bytes:6.1%}) | "
+            f"max error T {max_temperature:.2f} H {max_humidity:.2f} | obstacle mismatches {obstacle_mismatches}"
+        )
+
+if __name__ == "__main__":
+    main()
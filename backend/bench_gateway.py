@@ -0,0 +1,116 @@
+"""
+Compare the server cost per reading of one WebSocket per device against one
+gateway connection carrying tagged, batched readings for many devices.
+
+Both paths run the real ingest code against a throwaway SQLite database with
+fake sockets, so the numbers cover parsing, INSERT + commit, broadcast and
+acks, but not network I/O. The per-device path issues the same statements as
+the single-device handler (one INSERT, one commit and one ack per reading).
+
+Usage:
+    python bench_gateway.py --devices 50 --readings 20 --batch 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db.database import Base
+from app.api.v1.endpoints.sensor import _ingest_gateway_readings
+from app.core.gateway import GatewaySession
+from app.core.websocket import ConnectionManager
+from app.api.v1.endpoints import sensor as sensor_endpoints
+
+class FakeWebSocket:
+    def __init__(self):
+        self.messages = 0
+
+    async def send_text(self, message):
+        self.messages += 1
+
+def make_db():
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.execute(text("INSERT INTO users (id, username, email, hashed_password, is_active) VALUES (1, 'bench', 'bench@example.com', 'x', 1)"))
+    db.commit()
+    return db
+
+def register_devices(db, count):
+    for i in range(count):
+        db.execute(text("INSERT INTO devices (user_id, name) VALUES (1, :name)"), {"name": f"sensor-{i}"})
+    db.commit()
+    return [row[0] for row in db.execute(text("SELECT id FROM devices ORDER BY id"))]
+
+def reading(device_id, seq):
+    return {"device_id": device_id, "seq": seq, "temperature": 20.0 + seq % 10, "humidity": 50.0, "obstacle": seq % 7 == 0}
+
+async def per_device(db, manager, devices, readings_per_device):
+    sockets = {device_id: FakeWebSocket() for device_id in devices}
+    started = time.perf_counter()
+    for seq in range(readings_per_device):
+        for device_id in devices:
+            message = json.dumps(reading(device_id, seq))
+            data = json.loads(message)
+            row = db.execute(text("""
+                INSERT INTO sensor_data (temperature, humidity, obstacle, user_id, device_id, timestamp)
+                VALUES (:temperature, :humidity, :obstacle, 1, :device_id, CURRENT_TIMESTAMP)
+                RETURNING id, timestamp
+            """), {key: data[key] for key in ("temperature", "humidity", "obstacle", "device_id")}).fetchone()
+            db.commit()
+            await sockets[device_id].send_text(json.dumps({"status": "success", "message": "Data received and saved", "id": row[0]}))
+            await manager.broadcast_reading(dict(data, id=row[0], timestamp=str(row[1]), user_id=1), 1)
+    elapsed = time.perf_counter() - started
+    return elapsed, sum(socket.messages for socket in sockets.values())
+
+async def gateway(db, devices, readings_per_device, batch):
+    socket = FakeWebSocket()
+    session = GatewaySession(socket, 1, devices)
+    user = {"id": 1}
+    pending = []
+    started = time.perf_counter()
+    for seq in range(readings_per_device):
+        for device_id in devices:
+            pending.append(reading(device_id, seq))
+            if len(pending) == batch:
+                await _ingest_gateway_readings(db, user, session, json.loads(json.dumps({"type": "readings", "readings": pending}))["readings"])
+                pending = []
+    if pending:
+        await _ingest_gateway_readings(db, user, session, pending)
+    await session.acks.flush()
+    elapsed = time.perf_counter() - started
+    return elapsed, socket.messages
+
+async def run(args):
+    total = args.devices * args.readings
+
+    db = make_db()
+    devices = register_devices(db, args.devices)
+    sensor_endpoints.manager = ConnectionManager()
+    elapsed, acks = await per_device(db, sensor_endpoints.manager, devices, args.readings)
+    print(f"per-device sockets: {elapsed / total * 1e6:8.1f} us/reading | {acks} ack messages | {args.devices} connections")
+
+    db = make_db()
+    devices = register_devices(db, args.devices)
+    sensor_endpoints.manager = ConnectionManager()
+    elapsed, acks = await gateway(db, devices, args.readings, args.batch)
+    print(f"gateway (batch {args.batch:3d}): {elapsed / total * 1e6:8.1f} us/reading | {acks} ack messages | 1 connection")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gateway multiplexing against one socket per device")
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--readings", type=int, default=20, help="Readings per device")
+    parser.add_argument("--batch", type=int, default=50, help="Readings per gateway message")
+    args = parser.parse_args()
+
+    print(f"{args.devices} devices x {args.readings} readings = {args.devices * args.readings} readings")
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare per-connection cost of the old per-message `asyncio.wait_for` timeout
+against the shared timer-wheel heartbeat scheduler.
+
+Each simulated connection is a task blocked on its own queue, the same way
+`websocket_endpoint` blocks on `receive_text()`.
+
+Usage:
+    python bench_heartbeat.py --connections 10000 --rounds 5
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from app.core.heartbeat import HeartbeatScheduler
+
+async def run_wait_for(connections, rounds):
+    queues = [asyncio.Queue() for _ in range(connections)]
+    received = 0
+
+    async def connection(queue):
+        nonlocal received
+        for _ in range(rounds):
+            await asyncio.wait_for(queue.get(), timeout=300)
+            received += 1
+
+    tasks = [asyncio.create_task(connection(q)) for q in queues]
+    await asyncio.sleep(0)
+    return queues, tasks, None
+
+async def run_timer_wheel(connections, rounds):
+    queues = [asyncio.Queue() for _ in range(connections)]
+    scheduler = HeartbeatScheduler(idle_timeout=300)
+    scheduler._ensure_task = lambda: None  # the benchmark drives ticks itself
+
+    async def connection(queue):
+        key = id(queue)
+        for _ in range(rounds):
+            await queue.get()
+            scheduler.touch(key)
+
+    for q in queues:
+        scheduler.register(id(q))
+    tasks = [asyncio.create_task(connection(q)) for q in queues]
+    await asyncio.sleep(0)
+    return queues, tasks, scheduler
+
+async def measure(name, setup, connections, rounds):
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    queues, tasks, scheduler = await setup(connections, rounds)
+    await asyncio.sleep(0)
+    waiting_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    cpu_start = time.process_time()
+    for _ in range(rounds):
+        for q in queues:
+            q.put_nowait("{}")
+        # Let every connection consume its message
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        if scheduler is not None:
+            await scheduler.tick()
+    await asyncio.gather(*tasks)
+    cpu = time.process_time() - cpu_start
+
+    messages = connections * rounds
+    print(f"{name:<12} memory while idle: {waiting_bytes / connections:8.0f} B/conn | "
+          f"CPU: {cpu * 1e6 / messages:6.2f} us/message")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WebSocket idle detection strategies")
+    parser.add_argument("--connections", "-c", type=int, default=10000, help="Simulated connections")
+    parser.add_argument("--rounds", "-r", type=int, default=5, help="Messages per connection")
+    args = parser.parse_args()
+
+    print(f"{args.connections} connections x {args.rounds} messages")
+    asyncio.run(measure("wait_for", run_wait_for, args.connections, args.rounds))
+    asyncio.run(measure("timer wheel", run_timer_wheel, args.connections, args.rounds))
+
+if __name__ == "__main__":
+    main()
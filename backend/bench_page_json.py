@@ -0,0 +1,78 @@
+"""
+Time /sensor/data pages built from rows in Python against pages rendered
+as JSON by the database.
+
+Runs the real app in-process against a throwaway SQLite database. The
+response cache is bypassed so every request runs its queries. The row path
+is forced by raising SENSOR_PAGE_SQL_JSON_MIN above the page size.
+
+Usage:
+    python bench_page_json.py --readings 50000 --page-sizes 1000 10000 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.main import app
+from app.api.v1.endpoints import sensor as sensor_endpoints
+from app.core.auth import create_access_token
+from app.db.database import Base, SessionLocal, engine
+
+def fill(readings: int):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.execute(text("INSERT INTO users (id, username, email, hashed_password, is_active) VALUES (1, 'bench', 'bench@example.com', 'x', 1)"))
+    now = datetime.utcnow()
+    db.execute(
+        text("INSERT INTO sensor_data (user_id, temperature, humidity, obstacle, timestamp) VALUES (1, :temperature, :humidity, :obstacle, :t)"),
+        [
+            {"t": now - timedelta(seconds=10 * i, microseconds=i), "temperature": 20 + (i % 80) / 10, "humidity": 40 + (i % 200) / 10, "obstacle": i % 7 == 0}
+            for i in range(readings)
+        ]
+    )
+    db.commit()
+    db.close()
+
+def timed(client: TestClient, headers: dict, page_size: int, repeat: int):
+    samples = []
+    for _ in range(repeat + 1):
+        sensor_endpoints.response_cache.bump(1)
+        started = time.perf_counter()
+        response = client.get("/api/v1/sensor/data", params={"page_size": page_size}, headers=headers)
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+    return statistics.median(samples[1:]), response
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark database-rendered JSON pages")
+    parser.add_argument("--readings", type=int, default=50000)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    fill(args.readings)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'bench'}, timedelta(hours=1))}"}
+    print(f"{args.readings} readings, median of {args.repeat} requests")
+
+    with TestClient(app) as client:
+        for page_size in args.page_sizes:
+            sensor_endpoints.SENSOR_PAGE_SQL_JSON_MIN = page_size + 1
+            rows, rows_response = timed(client, headers, page_size, args.repeat)
+            sensor_endpoints.SENSOR_PAGE_SQL_JSON_MIN = page_size
+            sql, sql_response = timed(client, headers, page_size, args.repeat)
+            assert rows_response.json() == sql_response.json()
+            print(
+                f"page_size {page_size:6d}: row loop {rows * 1000:8.1f} ms | database JSON {sql * 1000:8.1f} ms"
+                f" ({rows / sql:.1f}x) | {len(sql_response.content)} bytes"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Time encoding a /sensor/data page and WebSocket reading frames with each
+serializer.
+
+The "dict loop" row is the previous path: a dict per row with
+`isoformat()` timestamps, encoded the way Starlette's JSONResponse does. The
+other rows hand `ReadingRow`s with native datetimes to the stdlib and (if
+installed) orjson serializers from app.core.serialization. Frames are single
+readings encoded for `send_text`.
+
+Usage:
+    python bench_serialization.py --rows 1000 --repeat 200
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app.core import serialization
+from app.core.serialization import ReadingRow
+
+def make_rows(count: int) -> list:
+    start = datetime(2026, 1, 1)
+    return [
+        (i, 20 + (i % 80) / 10, 40 + (i % 200) / 10, i % 7 == 0, 1, start + timedelta(seconds=10 * i, microseconds=i), i % 4)
+        for i in range(1, count + 1)
+    ]
+
+def page(data: list, count: int) -> dict:
+    return {
+        "data": data,
+        "pagination": {"page": 1, "page_size": count, "total_count": count, "total_pages": 1, "has_next": False, "has_prev": False}
+    }
+
+def dict_loop(rows: list) -> bytes:
+    data = []
+    for row in rows:
+        data.append({
+            "id": row[0],
+            "temperature": float(row[1]),
+            "humidity": float(row[2]),
+            "obstacle": bool(row[3]),
+            "user_id": int(row[4]),
+            "timestamp": row[5].isoformat(),
+            "device_id": row[6]
+        })
+    return json.dumps(page(data, len(rows)), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def timed(fn, repeat: int) -> float:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON encoding of sensor pages and frames")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    readings = [
+        {"id": row[0], "temperature": row[1], "humidity": row[2], "obstacle": row[3], "user_id": row[4],
+         "timestamp": row[5].isoformat(), "device_id": row[6]}
+        for row in rows
+    ]
+    serializers = [serialization.StdlibSerializer()]
+    if serialization.orjson is not None:
+        serializers.append(serialization.OrjsonSerializer())
+    else:
+        print("orjson is not installed, only the stdlib serializer is measured")
+
+    baseline = timed(lambda: dict_loop(rows), args.repeat)
+    print(f"{args.rows}-row page, median of {args.repeat}")
+    print(f"  {'dict loop + json':22s}: {baseline * 1000:7.3f} ms  {len(dict_loop(rows))} bytes")
+    for encoder in serializers:
+        def encode(encoder=encoder):
+            return encoder.dumps(page([ReadingRow.from_row(row) for row in rows], len(rows)))
+        elapsed = timed(encode, args.repeat)
+        print(f"  {'ReadingRow + ' + encoder.name:22s}: {elapsed * 1000:7.3f} ms  {len(encode())} bytes  ({baseline / elapsed:.1f}x)")
+
+    frame_baseline = timed(lambda: [json.dumps(reading) for reading in readings], args.repeat)
+    print(f"{args.rows} WebSocket frames, median of {args.repeat}")
+    print(f"  {'json.dumps':22s}: {frame_baseline / args.rows * 1e6:7.2f} us/frame")
+    for encoder in serializers:
+        elapsed = timed(lambda encoder=encoder: [encoder.dumps(reading).decode("utf-8") for reading in readings], args.repeat)
+        print(f"  {encoder.name + ' frame':22s}: {elapsed / args.rows * 1e6:7.2f} us/frame  ({frame_baseline / elapsed:.1f}x)")
+
+if __name__ == "__main__":
+    main()
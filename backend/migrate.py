@@ -1,6 +1,10 @@
 """
-Simple migration script to add all required columns to the users table.
+Simple migration script to add all required columns to existing tables.
 This script will be run during the Render deployment.
+
+Every step is idempotent. Tables that don't exist yet are left to
+`Base.metadata.create_all` when the app starts, which creates them with all
+of their columns and indexes.
 """
 import os
 import sys
@@ -18,6 +22,88 @@ db_user = os.getenv("POSTGRES_USER", "envirosense_db_user")
 db_password = os.getenv("POSTGRES_PASSWORD", "Ij9Yd9Yd9Yd9Yd9Yd9Yd9Yd9Yd9Yd9")
 port = os.getenv("POSTGRES_PORT", "5432")
 
+def _table_exists(cur, table_name):
+    cur.execute("""
+        SELECT table_name
+        FROM information_schema.tables
+        WHERE table_name = %s;
+    """, (table_name,))
+    return cur.fetchone() is not None
+
+def _run_step(conn, cur, description, statements):
+    """Run one migration step in its own transaction, logging instead of aborting on errors"""
+    try:
+        logger.info(f"{description}...")
+        for statement in statements:
+            cur.execute(statement)
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error during '{description}': {e}")
+        conn.rollback()
+
+def apply_device_registry(conn, cur):
+    """Devices table plus sensor_data.device_id and its (device_id, timestamp) index"""
+    if not _table_exists(cur, "sensor_data"):
+        logger.info("sensor_data does not exist yet, the app will create it with device_id.")
+        return
+    _run_step(conn, cur, "Adding the device registry", [
+        """
+        CREATE TABLE IF NOT EXISTS devices (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            name VARCHAR,
+            created_at TIMESTAMP,
+            CONSTRAINT uq_devices_user_id_name UNIQUE (user_id, name)
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_devices_user_id ON devices (user_id);",
+        "ALTER TABLE sensor_data ADD COLUMN IF NOT EXISTS device_id INTEGER REFERENCES devices(id);",
+        "CREATE INDEX IF NOT EXISTS ix_sensor_data_device_id_timestamp ON sensor_data (device_id, timestamp);"
+    ])
+
+def apply_ingest_deadband(conn, cur):
+    """Per-device ingest deadband column"""
+    if not _table_exists(cur, "devices"):
+        return
+    _run_step(conn, cur, "Adding devices.ingest_deadband", [
+        "ALTER TABLE devices ADD COLUMN IF NOT EXISTS ingest_deadband DOUBLE PRECISION;"
+    ])
+
+def apply_obstacle_events(conn, cur):
+    """obstacle_events table, backfilled from existing readings when it is first created"""
+    if not _table_exists(cur, "sensor_data") or _table_exists(cur, "obstacle_events"):
+        return
+    # One transaction, so a failed backfill leaves no empty table behind to be skipped next deploy
+    _run_step(conn, cur, "Creating and backfilling obstacle_events", [
+        """
+        CREATE TABLE obstacle_events (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            device_id INTEGER REFERENCES devices(id),
+            started_at TIMESTAMP NOT NULL,
+            ended_at TIMESTAMP
+        );
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_obstacle_events_user_id_device_id_started_at
+        ON obstacle_events (user_id, device_id, started_at);
+        """,
+        """
+        WITH changes AS (
+            SELECT user_id, device_id, timestamp, obstacle,
+                   LAG(obstacle) OVER (PARTITION BY user_id, device_id ORDER BY timestamp, id) AS previous
+            FROM sensor_data
+        ), edges AS (
+            SELECT user_id, device_id, timestamp, obstacle,
+                   LEAD(timestamp) OVER (PARTITION BY user_id, device_id ORDER BY timestamp) AS next_edge
+            FROM changes
+            WHERE obstacle != COALESCE(previous, FALSE)
+        )
+        INSERT INTO obstacle_events (user_id, device_id, started_at, ended_at)
+        SELECT user_id, device_id, timestamp, next_edge FROM edges WHERE obstacle;
+        """
+    ])
+
 def apply_migration():
     """Apply all migrations to the database."""
     try:
@@ -68,6 +154,10 @@ def apply_migration():
                 # Continue with next column even if this one fails
                 conn.rollback()
         
+        apply_device_registry(conn, cur)
+        apply_ingest_deadband(conn, cur)
+        apply_obstacle_events(conn, cur)
+
         # Close the cursor and connection
         cur.close()
         conn.close()
@@ -0,0 +1,28 @@
+"""Add devices.ingest_deadband
+
+Revision ID: 3f9a1c7d2b64
+Revises: 8c4d2f61a7e9
+Create Date: 2026-10-18 15:12:47.208311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c7d2b64'
+down_revision: Union[str, None] = '8c4d2f61a7e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('devices', sa.Column('ingest_deadband', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('devices', 'ingest_deadband')
@@ -0,0 +1,40 @@
+"""Add revoked device tokens
+
+Revision ID: 5b1e7c0a9f3d
+Revises: d33c9e6f42d2
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e7c0a9f3d'
+down_revision: Union[str, None] = 'd33c9e6f42d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'revoked_device_tokens',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('token_id', sa.String(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('revoked_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_revoked_device_tokens_id'), 'revoked_device_tokens', ['id'], unique=False)
+    op.create_index(op.f('ix_revoked_device_tokens_token_id'), 'revoked_device_tokens', ['token_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_revoked_device_tokens_token_id'), table_name='revoked_device_tokens')
+    op.drop_index(op.f('ix_revoked_device_tokens_id'), table_name='revoked_device_tokens')
+    op.drop_table('revoked_device_tokens')
@@ -0,0 +1,47 @@
+"""Add devices and sensor_data.device_id
+
+Revision ID: 8c4d2f61a7e9
+Revises: 5b1e7c0a9f3d
+Create Date: 2026-10-18 11:40:02.513877
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4d2f61a7e9'
+down_revision: Union[str, None] = '5b1e7c0a9f3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'devices',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'name', name='uq_devices_user_id_name')
+    )
+    op.create_index(op.f('ix_devices_id'), 'devices', ['id'], unique=False)
+    op.create_index(op.f('ix_devices_user_id'), 'devices', ['user_id'], unique=False)
+    op.add_column('sensor_data', sa.Column('device_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_sensor_data_device_id', 'sensor_data', 'devices', ['device_id'], ['id'])
+    op.create_index('ix_sensor_data_device_id_timestamp', 'sensor_data', ['device_id', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sensor_data_device_id_timestamp', table_name='sensor_data')
+    op.drop_constraint('fk_sensor_data_device_id', 'sensor_data', type_='foreignkey')
+    op.drop_column('sensor_data', 'device_id')
+    op.drop_index(op.f('ix_devices_user_id'), table_name='devices')
+    op.drop_index(op.f('ix_devices_id'), table_name='devices')
+    op.drop_table('devices')
@@ -0,0 +1,59 @@
+"""Add obstacle_events
+
+Revision ID: a72e5d18c4f0
+Revises: 3f9a1c7d2b64
+Create Date: 2026-10-18 16:03:21.774092
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a72e5d18c4f0'
+down_revision: Union[str, None] = '3f9a1c7d2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'obstacle_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('device_id', sa.Integer(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('ended_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['device_id'], ['devices.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_obstacle_events_id'), 'obstacle_events', ['id'], unique=False)
+    op.create_index('ix_obstacle_events_user_id_device_id_started_at', 'obstacle_events', ['user_id', 'device_id', 'started_at'], unique=False)
+
+    # Backfill from existing readings: every off -> on change starts an event,
+    # and the next on -> off change for the same user and device ends it
+    op.execute("""
+        WITH changes AS (
+            SELECT user_id, device_id, timestamp, obstacle,
+                   LAG(obstacle) OVER (PARTITION BY user_id, device_id ORDER BY timestamp, id) AS previous
+            FROM sensor_data
+        ), edges AS (
+            SELECT user_id, device_id, timestamp, obstacle,
+                   LEAD(timestamp) OVER (PARTITION BY user_id, device_id ORDER BY timestamp) AS next_edge
+            FROM changes
+            WHERE obstacle != COALESCE(previous, FALSE)
+        )
+        INSERT INTO obstacle_events (user_id, device_id, started_at, ended_at)
+        SELECT user_id, device_id, timestamp, next_edge FROM edges WHERE obstacle
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_obstacle_events_user_id_device_id_started_at', table_name='obstacle_events')
+    op.drop_index(op.f('ix_obstacle_events_id'), table_name='obstacle_events')
+    op.drop_table('obstacle_events')
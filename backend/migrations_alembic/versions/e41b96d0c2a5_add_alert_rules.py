@@ -0,0 +1,47 @@
+"""Add alert_rules
+
+Revision ID: e41b96d0c2a5
+Revises: a72e5d18c4f0
+Create Date: 2026-10-18 17:26:09.415530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41b96d0c2a5'
+down_revision: Union[str, None] = 'a72e5d18c4f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'alert_rules',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('device_id', sa.Integer(), nullable=True),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('metric', sa.String(), nullable=True),
+        sa.Column('operator', sa.String(), nullable=True),
+        sa.Column('threshold', sa.Float(), nullable=True),
+        sa.Column('duration_seconds', sa.Integer(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['device_id'], ['devices.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_alert_rules_id'), 'alert_rules', ['id'], unique=False)
+    op.create_index(op.f('ix_alert_rules_user_id'), 'alert_rules', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_alert_rules_user_id'), table_name='alert_rules')
+    op.drop_index(op.f('ix_alert_rules_id'), table_name='alert_rules')
+    op.drop_table('alert_rules')
@@ -7,4 +7,12 @@ sys.path.insert(0, os.path.abspath("."))
 
 if __name__ == "__main__":
     print("Starting FastAPI application...")
-    uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True)
+    # Protocol-level WebSocket ping frames are sent by uvicorn; the app only tracks idle time
+    uvicorn.run(
+        "app.main:app",
+        host="127.0.0.1",
+        port=8000,
+        reload=True,
+        ws_ping_interval=float(os.getenv("WS_PING_INTERVAL", "20")),
+        ws_ping_timeout=float(os.getenv("WS_PING_TIMEOUT", "20"))
+    )
@@ -1,6 +1,13 @@
 from app.main import app
 import uvicorn
+import os
 
 if __name__ == "__main__":
     print("Starting FastAPI application...")
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    uvicorn.run(
+        app,
+        host="127.0.0.1",
+        port=8000,
+        ws_ping_interval=float(os.getenv("WS_PING_INTERVAL", "20")),
+        ws_ping_timeout=float(os.getenv("WS_PING_TIMEOUT", "20"))
+    )
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -7,6 +9,8 @@ from sqlalchemy.pool import StaticPool
 from app.main import app
 from app.db.database import Base, get_db
 from app.core.auth import get_password_hash
+from app.core.user_cache import user_cache
+from app.core.response_cache import response_cache
 
 # Create an in-memory SQLite database for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -18,6 +22,18 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+class FakeWebSocket:
+    """Minimal stand-in that records every frame sent to it and how it was closed"""
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, message):
+        self.sent.append(json.loads(message))
+
+    async def close(self, code=1000, reason=None):
+        self.closed_with = code
+
 # Override the get_db dependency
 def override_get_db():
     try:
@@ -32,6 +48,10 @@ app.dependency_overrides[get_db] = override_get_db
 def client():
     # Create the database tables
     Base.metadata.create_all(bind=engine)
+
+    # Don't let cached users leak between tests that recreate the same accounts
+    user_cache.clear()
+    response_cache.clear()
     
     # Use the TestClient
     with TestClient(app) as c:
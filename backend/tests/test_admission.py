@@ -0,0 +1,41 @@
+import json
+import random
+
+import pytest
+from fastapi.websockets import WebSocketDisconnect
+
+from app.core.admission import AdmissionController
+
+def test_token_bucket_bounds_handshake_rate():
+    controller = AdmissionController(rate=10, burst=5, rng=random.Random(1))
+    admitted = [controller.admit(now=0.0) is None for _ in range(20)]
+    assert admitted.count(True) == 5
+
+    # One second later the bucket has refilled by the rate, capped at the burst size
+    admitted = [controller.admit(now=1.0) is None for _ in range(20)]
+    assert admitted.count(True) == 5
+
+def test_retry_hints_are_spread_over_the_backlog():
+    controller = AdmissionController(rate=10, burst=1, min_retry_delay=0.5, max_retry_delay=60, rng=random.Random(1))
+    controller.admit(now=0.0)
+    delays = [controller.admit(now=0.0) for _ in range(300)]
+
+    assert all(0.5 <= delay <= 60 for delay in delays)
+    # 300 rejected clients at 10/s need about 30 seconds to drain; hints should cover that span
+    assert max(delays) > 25
+    assert len(set(delays)) > 100
+
+def test_over_limit_handshake_gets_retry_hint(client, monkeypatch):
+    from app.api.v1.endpoints import sensor as sensor_endpoints
+
+    controller = AdmissionController(rate=1, burst=1)
+    controller.admit()
+    monkeypatch.setattr(sensor_endpoints, "admission", controller)
+
+    with pytest.raises(WebSocketDisconnect) as excinfo:
+        with client.websocket_connect("/api/v1/sensor/ws?token=anything") as websocket:
+            hint = json.loads(websocket.receive_text())
+            assert hint["type"] == "retry"
+            assert hint["retry_after"] >= 1
+            websocket.receive_text()
+    assert excinfo.value.code == 1013
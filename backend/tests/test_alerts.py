@@ -0,0 +1,126 @@
+import json
+
+from app.core.alerts import AlertEngine, ThresholdIndex
+
+def rule(rule_id, metric="temperature", operator=">", threshold=30.0, duration_seconds=0, device_id=None, user_id=1):
+    return {
+        "id": rule_id, "user_id": user_id, "device_id": device_id, "name": f"rule {rule_id}",
+        "metric": metric, "operator": operator, "threshold": threshold,
+        "duration_seconds": duration_seconds, "is_active": True
+    }
+
+def reading(temperature, device_id=3, humidity=50.0, obstacle=False):
+    return {"id": 1, "user_id": 1, "device_id": device_id, "temperature": temperature, "humidity": humidity, "obstacle": obstacle}
+
+def test_threshold_index_boundaries():
+    index = ThresholdIndex()
+    index.add(">", 30.0, 1)
+    index.add(">=", 30.0, 2)
+    index.add("<", 30.0, 3)
+    index.add("<=", 30.0, 4)
+    index.add(">", 10.0, 5)
+    index.add("<", 50.0, 6)
+
+    assert sorted(index.matching(30.0)) == [2, 4, 5, 6]
+    assert sorted(index.matching(30.5)) == [1, 2, 5, 6]
+    assert sorted(index.matching(5.0)) == [3, 4, 6]
+
+    index.remove(">", 10.0, 5)
+    assert sorted(index.matching(60.0)) == [1, 2]
+
+def test_duration_rule_fires_once_and_resolves():
+    engine = AlertEngine()
+    engine.add_rule(rule(1, duration_seconds=300))
+
+    assert engine.evaluate(reading(31.0), now=0.0) == []
+    assert engine.evaluate(reading(32.0), now=200.0) == []
+    events = engine.evaluate(reading(31.5), now=300.0)
+    assert [(e["rule_id"], e["state"], e["value"]) for e in events] == [(1, "firing", 31.5)]
+    assert engine.evaluate(reading(33.0), now=400.0) == []
+
+    events = engine.evaluate(reading(25.0), now=500.0)
+    assert [(e["rule_id"], e["state"]) for e in events] == [(1, "resolved")]
+    # The condition has to hold for the full duration again before the next firing
+    assert engine.evaluate(reading(31.0), now=510.0) == []
+    assert engine.stats()["tracked_conditions"] == 1
+
+def test_rules_for_all_devices_track_each_device_separately():
+    engine = AlertEngine()
+    engine.add_rule(rule(1, metric="humidity", operator="<", threshold=20.0))
+    engine.add_rule(rule(2, device_id=4))
+
+    assert [e["device_id"] for e in engine.evaluate(reading(20.0, device_id=3, humidity=15.0), now=0.0)] == [3]
+    assert [e["device_id"] for e in engine.evaluate(reading(20.0, device_id=4, humidity=15.0), now=0.0)] == [4]
+    # Device 3's rule 2 doesn't exist, and device 3's humidity rule is still firing
+    assert engine.evaluate(reading(35.0, device_id=3, humidity=15.0), now=1.0) == []
+    assert [(e["rule_id"], e["device_id"]) for e in engine.evaluate(reading(35.0, device_id=4, humidity=50.0), now=1.0)] == [(2, 4), (1, 4)]
+
+    engine.remove_rule(1)
+    assert engine.evaluate(reading(20.0, device_id=3, humidity=50.0), now=2.0) == []
+
+def test_alert_rule_crud_and_delivery(client, token, monkeypatch):
+    """Test that a rule created over the API fires over the WebSocket when a reading crosses it"""
+    from app.api.v1.endpoints import alerts as alert_endpoints
+    from app.api.v1.endpoints import sensor as sensor_endpoints
+
+    from app.core.websocket import ConnectionManager
+
+    engine = AlertEngine()
+    monkeypatch.setattr(alert_endpoints, "alert_engine", engine)
+    monkeypatch.setattr(sensor_endpoints, "alert_engine", engine)
+    # A fresh manager, so this reading doesn't end up in the shared resume buffer
+    monkeypatch.setattr(sensor_endpoints, "manager", ConnectionManager())
+    headers = {"Authorization": f"Bearer {token}"}
+    device = client.post("/api/v1/sensor/devices", json={"name": "attic"}, headers=headers).json()
+
+    response = client.post("/api/v1/alerts/rules", json={"name": "too hot", "metric": "temperature", "operator": ">", "threshold": 30}, headers=headers)
+    assert response.status_code == 201
+    created = response.json()
+    assert client.post("/api/v1/alerts/rules", json={"name": "bad", "metric": "pressure", "operator": ">", "threshold": 1}, headers=headers).status_code == 400
+    assert client.patch(f"/api/v1/alerts/rules/{created['id']}", json={"threshold": 28}, headers=headers).json()["threshold"] == 28
+    assert [r["id"] for r in client.get("/api/v1/alerts/rules", headers=headers).json()["rules"]] == [created["id"]]
+
+    with client.websocket_connect(f"/api/v1/sensor/ws?token={token}") as viewer:
+        viewer.receive_text()
+        with client.websocket_connect(f"/api/v1/sensor/ws?token={token}&gateway=true") as gateway:
+            gateway.receive_text()
+            gateway.send_text(json.dumps({"device_id": device["id"], "temperature": 29.0, "humidity": 40.0}))
+            assert json.loads(viewer.receive_text())["temperature"] == 29.0
+            event = json.loads(viewer.receive_text())
+            assert (event["type"], event["state"], event["rule_id"]) == ("alert", "firing", created["id"])
+
+    assert client.delete(f"/api/v1/alerts/rules/{created['id']}", headers=headers).status_code == 200
+    assert engine.stats()["rules"] == 0
+
+def test_periodic_refresh_swaps_index_on_event_loop():
+    """Test that only the rule query runs in a worker thread and load() runs on the loop"""
+    import asyncio
+    import threading
+
+    engine = AlertEngine()
+    engine.refresh_interval = 3600
+    fetch_threads, load_threads = [], []
+
+    def fetch():
+        fetch_threads.append(threading.current_thread())
+        return [rule(1)]
+
+    original_load = engine.load
+
+    def load(rules):
+        load_threads.append(threading.current_thread())
+        original_load(rules)
+
+    engine._fetch_from_new_session = fetch
+    engine.load = load
+
+    async def one_refresh():
+        task = asyncio.ensure_future(engine.run())
+        while not load_threads:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(one_refresh())
+    assert fetch_threads[0] is not threading.main_thread()
+    assert load_threads == [threading.main_thread()]
+    assert list(engine.rules) == [1]
@@ -0,0 +1,43 @@
+import asyncio
+import random
+
+from app.core.anomaly import AnomalyDetector
+from app.core.websocket import ConnectionManager
+from tests.conftest import FakeWebSocket
+
+def reading(temperature, humidity=50.0):
+    return {"temperature": temperature, "humidity": humidity}
+
+def test_spike_is_flagged_after_warmup_and_baseline_survives_it():
+    detector = AnomalyDetector(alpha=0.05, z_threshold=4, warmup=30)
+    rng = random.Random(1)
+    for _ in range(200):
+        assert detector.check(1, 3, reading(21.0 + rng.gauss(0, 0.1), 50.0 + rng.gauss(0, 0.5))) == []
+
+    anomalies = detector.check(1, 3, reading(35.0))
+    assert [(a["metric"], a["kind"]) for a in anomalies] == [("temperature", "spike")]
+    assert anomalies[0]["z_score"] > 4
+
+    # The clamped spike didn't inflate the variance enough to hide a second one
+    assert detector.check(1, 3, reading(35.0))[0]["kind"] == "spike"
+    assert detector.check(1, 3, reading(21.0)) == []
+
+def test_out_of_range_values_are_faults_even_during_warmup():
+    detector = AnomalyDetector(warmup=30)
+    anomalies = detector.check(1, None, reading(-999.0, humidity=float("nan")))
+    assert [(a["metric"], a["kind"]) for a in anomalies] == [("temperature", "out_of_range"), ("humidity", "out_of_range")]
+    assert detector.stats()["flagged"] == 1
+
+def test_anomaly_events_skip_viewer_throttling():
+    manager = ConnectionManager()
+    viewer, device_viewer, other_device = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    manager.active_connections[1] = [viewer]
+    manager.device_connections[3] = [device_viewer]
+    manager.device_connections[4] = [other_device]
+    manager.subscribe(viewer, max_rate=0.1)
+
+    asyncio.run(manager.broadcast_event({"type": "anomaly", "reading_id": 9}, 1, 3))
+
+    assert viewer.sent == [{"type": "anomaly", "reading_id": 9}]
+    assert device_viewer.sent == viewer.sent
+    assert other_device.sent == []
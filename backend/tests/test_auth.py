@@ -69,3 +69,149 @@ def test_get_current_user_invalid_token(client):
         headers={"Authorization": "Bearer invalidtoken"}
     )
     assert response.status_code == 401
+
+def test_current_user_is_served_from_cache(client, token, monkeypatch):
+    """Test that repeated authenticated calls don't look the user up again"""
+    from app.core import db_utils
+    from app.core.user_cache import user_cache
+
+    client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"})
+
+    def fail_lookup(db, username):
+        raise AssertionError("user lookup should have been served from the cache")
+
+    monkeypatch.setattr(db_utils, "get_user_by_username", fail_lookup)
+    response = client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["username"] == "testuser"
+
+def test_password_change_invalidates_cached_user(client, token):
+    """Test that changing the password drops the cached user record"""
+    from app.core.user_cache import user_cache
+
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/api/v1/auth/me", headers=headers)
+    assert user_cache.get("testuser") is not None
+
+    response = client.post(
+        "/api/v1/auth/change-password",
+        json={"current_password": "testpassword", "new_password": "newpassword"},
+        headers=headers
+    )
+    assert response.status_code == 200
+    assert user_cache.get("testuser") is None
+
+def test_login_rejected_when_hash_pool_saturated(client, test_user, monkeypatch):
+    """Test that logins are shed with 429 when the bcrypt pool is full"""
+    from app.core.password_pool import password_pool
+
+    monkeypatch.setattr(password_pool, "max_pending", 0)
+    response = client.post(
+        "/api/v1/auth/token",
+        data={
+            "username": test_user["username"],
+            "password": test_user["password"]
+        }
+    )
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+def test_hash_pool_counts_failures_separately():
+    """Test that a hash call that raises isn't counted as completed"""
+    import asyncio
+    from app.core.password_pool import PasswordHashPool
+
+    pool = PasswordHashPool(workers=1, max_pending=4)
+
+    def broken_hash(password):
+        raise ValueError("invalid salt")
+
+    async def run():
+        assert await pool.run(str.upper, "ok") == "OK"
+        with pytest.raises(ValueError):
+            await pool.run(broken_hash, "secret")
+
+    asyncio.run(run())
+    pool.shutdown()
+
+    assert pool.stats()["completed"] == 1
+    assert pool.stats()["failed"] == 1
+    assert pool.stats()["pending"] == 0
+
+def test_repeated_failures_lock_out_before_password_check(client, test_db, test_user, monkeypatch):
+    """Test that a locked-out username is rejected without verifying the password"""
+    from app.api.v1.endpoints import auth as auth_endpoints
+    from app.core import auth as core_auth
+    from app.core.login_throttle import LoginThrottle
+
+    from app.core import db_utils
+
+    recorded = []
+    monkeypatch.setattr(db_utils, "record_login_lockout", lambda db, username, attempts, *args: recorded.append((str(db.get_bind().url), username, attempts)))
+    monkeypatch.setattr(auth_endpoints, "login_throttle", LoginThrottle(max_failures_per_user=3))
+    for _ in range(3):
+        response = client.post("/api/v1/auth/token", data={"username": test_user["username"], "password": "wrong"})
+        assert response.status_code == 401
+
+    def fail_verify(*args):
+        raise AssertionError("password should not be verified for a locked-out username")
+
+    monkeypatch.setattr(core_auth, "verify_password", fail_verify)
+    response = client.post(
+        "/api/v1/auth/token",
+        data={"username": test_user["username"], "password": test_user["password"]}
+    )
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+
+    # The lockout was recorded through the test database, not the configured one
+    assert recorded == [(str(test_db.get_bind().url), test_user["username"], 3)]
+
+def test_ip_failures_are_limited_across_usernames():
+    """Test that one IP spraying many usernames gets throttled"""
+    from app.core.login_throttle import LoginThrottle
+
+    throttle = LoginThrottle(max_failures_per_user=5, max_failures_per_ip=3, window=60)
+    for i in range(3):
+        assert throttle.check(f"user{i}", "10.0.0.1", now=float(i)) is None
+        throttle.record_failure(f"user{i}", "10.0.0.1", now=float(i))
+
+    assert throttle.check("user9", "10.0.0.1", now=3.0) == 57.0
+    assert throttle.check("user9", "10.0.0.2", now=3.0) is None
+    assert throttle.check("user9", "10.0.0.1", now=61.0) is None
+
+def test_client_ip_ignores_client_supplied_forwarded_hops():
+    """Test that rotating X-Forwarded-For can't change the address the per-IP limit uses"""
+    from app.core.login_throttle import client_ip
+
+    assert client_ip("1.1.1.1, 203.0.113.7", "10.0.0.9") == "203.0.113.7"
+    assert client_ip("2.2.2.2, 203.0.113.7", "10.0.0.9") == "203.0.113.7"
+    assert client_ip("198.51.100.4, 203.0.113.7, 10.0.0.2", "10.0.0.9", trusted_hops=2) == "203.0.113.7"
+    assert client_ip("203.0.113.7", "10.0.0.9", trusted_hops=2) == "203.0.113.7"
+    assert client_ip("1.1.1.1", "10.0.0.9", trusted_hops=0) == "10.0.0.9"
+    assert client_ip(None, None) == "unknown"
+
+def test_device_token_signature_is_checked():
+    """Test that a tampered device token is rejected"""
+    from app.core.device_tokens import create_device_token, decode_device_token
+
+    device_token, token_id = create_device_token(7, 3)
+    claims = decode_device_token(device_token)
+    assert claims["user_id"] == 7
+    assert claims["device_id"] == 3
+    assert claims["token_id"] == token_id
+
+    prefix, payload, signature = device_token.split(".")
+    forged = create_device_token(8, 3)[0].split(".")[1]
+    assert decode_device_token(f"{prefix}.{forged}.{signature}") is None
+    assert decode_device_token("not-a-token") is None
+
+def test_denylist_refresh_keeps_local_revocations():
+    """Test that a refresh snapshot taken before a local revocation doesn't undo it"""
+    from app.core.device_tokens import DeviceTokenDenylist
+
+    denylist = DeviceTokenDenylist()
+    snapshot = {"old"}
+    denylist.add("revoked-meanwhile")
+    denylist.merge(snapshot)
+    assert denylist.is_revoked("old") and denylist.is_revoked("revoked-meanwhile")
@@ -0,0 +1,42 @@
+import asyncio
+
+from app.core.heartbeat import HeartbeatScheduler, TimerWheel
+from tests.conftest import FakeWebSocket
+
+def test_timer_wheel_only_returns_expired_items():
+    wheel = TimerWheel(tick_seconds=1.0, size=16)
+    wheel.schedule("a", deadline=3.0, now=0.0)
+    wheel.schedule("b", deadline=10.0, now=0.0)
+
+    assert wheel.advance(2.5) == []
+    assert wheel.advance(3.0) == ["a"]
+    assert len(wheel) == 1
+    assert wheel.advance(10.0) == ["b"]
+
+def test_idle_connection_is_closed_and_active_one_kept():
+    scheduler = HeartbeatScheduler(idle_timeout=10, json_ping_after=5, tick_seconds=1)
+    idle, active = FakeWebSocket(), FakeWebSocket()
+
+    async def run():
+        scheduler.register(idle, now=0.0)
+        scheduler.register(active, now=0.0)
+        scheduler.touch(active, now=8.0)
+        return await scheduler.tick(now=10.0)
+
+    assert asyncio.run(run()) == 1
+    assert idle.closed_with == 1000
+    assert active.closed_with is None
+    assert active in scheduler.last_seen and idle not in scheduler.last_seen
+
+def test_legacy_connection_gets_json_ping_before_timeout():
+    scheduler = HeartbeatScheduler(idle_timeout=10, json_ping_after=5, tick_seconds=1)
+    legacy = FakeWebSocket()
+
+    async def run():
+        scheduler.register(legacy, json_ping=True, now=0.0)
+        await scheduler.tick(now=5.0)
+
+    asyncio.run(run())
+
+    assert legacy.sent == [{"type": "ping", "message": "Connection check"}]
+    assert legacy.closed_with is None
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+from app.core.ingest_deadband import IngestDeadband, step_series
+
+def test_deadband_keeps_heartbeats_and_obstacle_changes():
+    deadband = IngestDeadband(heartbeat_interval=300)
+    assert deadband.should_store(1, 3, 21.0, 50.0, False, 0.2, now=0.0)
+    deadband.remember(1, 3, 21.0, 50.0, False, reading_id=10, now=0.0)
+
+    assert not deadband.should_store(1, 3, 21.1, 50.1, False, 0.2, now=10.0)
+    assert deadband.last_stored_id(1, 3) == 10
+    # Small drifts are compared with the last stored reading, not the last received one
+    assert deadband.should_store(1, 3, 21.3, 50.0, False, 0.2, now=20.0)
+    assert deadband.should_store(1, 3, 21.0, 50.0, True, 0.2, now=30.0)
+    assert deadband.should_store(1, 3, 21.0, 50.0, False, 0.2, now=300.0)
+
+    # Unregistered devices and a zero tolerance store everything
+    assert deadband.should_store(1, None, 21.0, 50.0, False, 0.2, now=10.0)
+    assert deadband.should_store(1, 3, 21.0, 50.0, False, 0.0, now=10.0)
+    assert deadband.stats()["skipped"] == 1
+
+def test_step_series_carries_rows_forward_until_gap():
+    start = datetime(2026, 1, 1, 12, 0, 0)
+    rows = [
+        (start - timedelta(seconds=30), 20.0, 40.0, False),
+        (start + timedelta(seconds=90), 21.0, 41.0, True)
+    ]
+    points = step_series(rows, start, start + timedelta(seconds=300), step=60, max_gap=150)
+
+    assert [p["temperature"] for p in points] == [20.0, 20.0, 21.0, 21.0, 21.0, None]
+    assert points[2]["obstacle"] is True
+    assert points[0]["timestamp"] == "2026-01-01T12:00:00"
@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+
+from app.core.recent import RecentReadings
+
+def reading(i, user_id=1, second=None):
+    return {"id": i, "user_id": user_id, "timestamp": f"2026-01-01T12:00:{second if second is not None else i:02d}"}
+
+def test_since_id_is_served_only_from_an_unbroken_run_of_ids():
+    recent = RecentReadings(max_per_user=10)
+    for i in (1, 2, 3):
+        recent.append(1, reading(i))
+    # Ids 4 and 5 were saved by another worker
+    for i in (6, 7):
+        recent.append(1, reading(i))
+
+    assert [r["id"] for r in recent.since_id(1, 5)] == [6, 7]
+    assert recent.since_id(1, 2) is None
+    # A cursor newer than anything this process broadcast can't be answered here either
+    assert recent.since_id(1, 8) is None
+    assert recent.since_id(2, 6) == []
+    assert (recent.hits, recent.misses) == (2, 2)
+
+def test_since_id_misses_once_readings_may_have_been_evicted():
+    recent = RecentReadings(max_per_user=3)
+    for i in range(1, 6):
+        recent.append(1, reading(i))
+
+    assert recent.since_id(1, 2) is None
+    assert [r["id"] for r in recent.since_id(1, 3)] == [4, 5]
+
+def test_since_timestamp_compares_in_utc():
+    recent = RecentReadings(max_per_user=10)
+    for i in (1, 2, 3, 4):
+        recent.append(1, reading(i, second=10 * i))
+
+    # 12:00:25 UTC, given with an offset
+    since = datetime.fromisoformat("2026-01-01T14:00:25+02:00")
+    assert [r["id"] for r in recent.since_timestamp(1, since)] == [3, 4]
+    assert [r["id"] for r in recent.since_timestamp(1, datetime(2026, 1, 1, 12, 0, 20, tzinfo=timezone.utc))] == [3, 4]
+    # Nothing buffered at or before the cursor, so older readings may be missing
+    assert recent.since_timestamp(1, datetime(2026, 1, 1, 12, 0, 5)) is None
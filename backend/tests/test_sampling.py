@@ -0,0 +1,59 @@
+import asyncio
+
+from app.core.sampling import AdaptiveSampling
+from app.core.websocket import ConnectionManager
+from tests.conftest import FakeWebSocket
+
+def test_level_rises_immediately_and_falls_after_cooldown():
+    sampling = AdaptiveSampling(db_latency_thresholds=(50, 200, 500), queue_depth_thresholds=(20, 100, 500), cooldown=30, smoothing=1.0)
+
+    sampling.record_db_latency(0.25)
+    control = sampling.evaluate(now=0.0)
+    assert control["level"] == 2
+    assert control["reason"] == "db_latency"
+    assert control["batch_size"] > 1
+
+    # Load is gone, but the level holds until it has stayed low for the cooldown
+    sampling.record_db_latency(0.005)
+    assert sampling.evaluate(now=1.0) is None
+    assert sampling.evaluate(now=20.0) is None
+    assert sampling.level == 2
+    control = sampling.evaluate(now=31.0)
+    assert control["level"] == 0
+    assert control["deadband"] == 0
+
+def test_queue_depth_raises_level():
+    sampling = AdaptiveSampling(db_latency_thresholds=(50, 200, 500), queue_depth_thresholds=(20, 100, 500), cooldown=30)
+    sampling.ingest_started(150)
+    control = sampling.evaluate(now=0.0)
+    assert control["level"] == 2
+    assert control["reason"] == "ingest_queue_depth"
+
+    sampling.ingest_finished(150)
+    assert sampling.stats()["in_flight"] == 0
+
+def test_control_is_pushed_to_publishers_only():
+    manager = ConnectionManager()
+    device, viewer = FakeWebSocket(), FakeWebSocket()
+    manager.active_connections[1] = [device, viewer]
+    assert manager.mark_publisher(device, 1)
+    assert not manager.mark_publisher(device, 1)
+
+    sampling = AdaptiveSampling(cooldown=30)
+    sampling.ingest_started(1000)
+    asyncio.run(manager.push_control(sampling.evaluate(now=0.0)))
+
+    assert device.sent == [sampling.control_message()]
+    assert device.sent[0]["type"] == "control"
+    assert viewer.sent == []
+
+def test_extra_thresholds_stay_on_the_last_profile():
+    from app.core.sampling import SAMPLING_PROFILES
+
+    sampling = AdaptiveSampling(db_latency_thresholds=(10, 20, 30, 40, 50), queue_depth_thresholds=(1, 2, 3, 4, 5), smoothing=1.0)
+    sampling.record_db_latency(1.0)
+    sampling.ingest_started(100)
+
+    control = sampling.evaluate(now=0.0)
+    assert control["level"] == len(SAMPLING_PROFILES) - 1
+    assert control["send_interval_ms"] == SAMPLING_PROFILES[-1][0]
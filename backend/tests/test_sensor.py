@@ -39,3 +39,337 @@ def test_get_sensor_data_with_data(client, token, test_db, test_user):
     assert response.json()[0]["temperature"] == 25.5
     assert response.json()[0]["humidity"] == 60.2
     assert response.json()[0]["obstacle"] is False
+
+def test_device_scoped_data_only_returns_that_device(client, token, test_db, test_user):
+    """Test that /devices/{id}/data and /data/latest?device_id= only see one device's readings"""
+    from app.models.sensor import SensorData
+
+    headers = {"Authorization": f"Bearer {token}"}
+    kitchen = client.post("/api/v1/sensor/devices", json={"name": "kitchen"}, headers=headers).json()
+    garage = client.post("/api/v1/sensor/devices", json={"name": "garage"}, headers=headers).json()
+    assert client.post("/api/v1/sensor/devices", json={"name": "garage"}, headers=headers).status_code == 400
+
+    test_db.add(SensorData(temperature=21.0, humidity=50.0, obstacle=False, user_id=test_user["id"], device_id=kitchen["id"]))
+    test_db.add(SensorData(temperature=30.0, humidity=40.0, obstacle=True, user_id=test_user["id"], device_id=garage["id"]))
+    test_db.commit()
+
+    response = client.get(f"/api/v1/sensor/devices/{kitchen['id']}/data", headers=headers)
+    assert response.status_code == 200
+    assert [row["temperature"] for row in response.json()["data"]] == [21.0]
+    assert response.json()["pagination"]["total_count"] == 1
+
+    response = client.get(f"/api/v1/sensor/data/latest?device_id={garage['id']}", headers=headers)
+    assert response.json()["temperature"] == 30.0
+    assert response.json()["device_id"] == garage["id"]
+
+    devices = client.get("/api/v1/sensor/devices", headers=headers).json()["devices"]
+    assert [device["name"] for device in devices] == ["kitchen", "garage"]
+
+def test_obstacle_intervals_come_from_transitions(client, token, test_db, test_user):
+    """Test that occupied time is clipped to the range and overlapping devices are counted once"""
+    from datetime import datetime
+    from app.models.obstacle_event import ObstacleEvent
+
+    headers = {"Authorization": f"Bearer {token}"}
+    hall = client.post("/api/v1/sensor/devices", json={"name": "hall"}, headers=headers).json()
+    door = client.post("/api/v1/sensor/devices", json={"name": "door"}, headers=headers).json()
+    test_db.add(ObstacleEvent(user_id=test_user["id"], device_id=hall["id"], started_at=datetime(2026, 1, 1, 11, 50), ended_at=datetime(2026, 1, 1, 12, 10)))
+    test_db.add(ObstacleEvent(user_id=test_user["id"], device_id=door["id"], started_at=datetime(2026, 1, 1, 12, 5), ended_at=datetime(2026, 1, 1, 12, 20)))
+    test_db.add(ObstacleEvent(user_id=test_user["id"], device_id=hall["id"], started_at=datetime(2026, 1, 1, 12, 50), ended_at=None))
+    test_db.commit()
+
+    params = {"start_date": "2026-01-01T12:00:00Z", "end_date": "2026-01-01T13:00:00Z"}
+    response = client.get("/api/v1/sensor/obstacle/intervals", params=params, headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["count"] == 3
+    assert body["intervals"][0]["start"] == "2026-01-01T12:00:00"
+    assert body["intervals"][2]["ongoing"] is True
+    # 12:00-12:20 across both devices, plus 12:50-13:00 still ongoing
+    assert body["total_occupied_seconds"] == 30 * 60
+
+    response = client.get("/api/v1/sensor/obstacle/intervals", params=dict(params, device_id=door["id"]), headers=headers)
+    assert response.json()["total_occupied_seconds"] == 15 * 60
+
+def test_condition_periods_follow_runs_and_gaps(client, token, test_db, test_user):
+    """Test that periods end at the first non-matching reading or at a silent gap"""
+    from datetime import datetime, timedelta
+    from app.models.sensor import SensorData
+
+    headers = {"Authorization": f"Bearer {token}"}
+    device = client.post("/api/v1/sensor/devices", json={"name": "attic"}, headers=headers).json()
+    start = datetime(2026, 1, 1, 12, 0)
+    for minute, temperature in [(0, 25), (1, 31), (2, 32), (3, 31), (4, 29), (5, 31), (6, 31), (30, 31), (31, 25)]:
+        test_db.add(SensorData(
+            user_id=test_user["id"], device_id=device["id"], temperature=temperature, humidity=50,
+            obstacle=False, timestamp=start + timedelta(minutes=minute)
+        ))
+    test_db.commit()
+
+    params = {
+        "metric": "temperature", "operator": ">", "threshold": 30, "max_gap": 300,
+        "start_date": "2026-01-01T12:00:00Z", "end_date": "2026-01-01T13:00:00Z"
+    }
+    response = client.get("/api/v1/sensor/conditions/periods", params=params, headers=headers)
+    assert response.status_code == 200
+    periods = response.json()["periods"]
+    # 12:01-12:04 ends at the 29 reading; 12:05-12:06 ends where the device went silent
+    assert [(p["start"], p["end"], p["readings"]) for p in periods] == [
+        ("2026-01-01T12:01:00", "2026-01-01T12:04:00", 3),
+        ("2026-01-01T12:05:00", "2026-01-01T12:06:00", 2),
+        ("2026-01-01T12:30:00", "2026-01-01T12:31:00", 1),
+    ]
+    assert periods[0]["max_value"] == 32
+
+    response = client.get("/api/v1/sensor/conditions/periods", params=dict(params, min_duration=120), headers=headers)
+    assert response.json()["count"] == 1
+    assert response.json()["total_seconds"] == 180
+
+    response = client.get("/api/v1/sensor/conditions/periods", params=dict(params, operator="!="), headers=headers)
+    assert response.status_code == 400
+
+def test_device_gaps_include_earlier_and_ongoing_silence(client, token, test_db, test_user):
+    """Test that gaps are found between consecutive readings, from before the range to its end"""
+    from datetime import datetime
+    from app.models.sensor import SensorData
+
+    headers = {"Authorization": f"Bearer {token}"}
+    device = client.post("/api/v1/sensor/devices", json={"name": "garage"}, headers=headers).json()
+    for hour, minute in [(11, 40), (12, 10), (12, 11), (12, 30)]:
+        test_db.add(SensorData(
+            user_id=test_user["id"], device_id=device["id"], temperature=20, humidity=50,
+            obstacle=False, timestamp=datetime(2026, 1, 1, hour, minute)
+        ))
+    test_db.commit()
+
+    params = {"start_date": "2026-01-01T12:00:00Z", "end_date": "2026-01-01T13:00:00Z", "min_gap": 600}
+    response = client.get(f"/api/v1/sensor/devices/{device['id']}/gaps", params=params, headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert [(gap["start"], gap["end"], gap["ongoing"]) for gap in body["gaps"]] == [
+        ("2026-01-01T11:40:00", "2026-01-01T12:10:00", False),
+        ("2026-01-01T12:11:00", "2026-01-01T12:30:00", False),
+        ("2026-01-01T12:30:00", "2026-01-01T13:00:00", True),
+    ]
+    assert body["last_reading"] == "2026-01-01T12:30:00"
+
+    response = client.get(f"/api/v1/sensor/devices/{device['id']}/gaps", params=dict(params, min_gap=1500), headers=headers)
+    assert [gap["duration_seconds"] for gap in response.json()["gaps"]] == [1800, 1800]
+
+    response = client.get("/api/v1/sensor/devices/999999/gaps", params=params, headers=headers)
+    assert response.status_code == 404
+
+def test_dashboard_snapshot(client, token, test_db, test_user):
+    """Test that the dashboard gets the latest reading, the bucketed last 24h and daily counts at once"""
+    from datetime import datetime, timedelta
+    from app.models.sensor import SensorData
+
+    headers = {"Authorization": f"Bearer {token}"}
+    now = datetime.utcnow()
+    for age, temperature in [(timedelta(days=3), 10.0), (timedelta(hours=2), 20.0), (timedelta(hours=1), 24.0), (timedelta(minutes=30), 22.0)]:
+        test_db.add(SensorData(
+            user_id=test_user["id"], temperature=temperature, humidity=50.0,
+            obstacle=temperature > 23, timestamp=now - age
+        ))
+    test_db.commit()
+
+    response = client.get("/api/v1/sensor/dashboard", headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["latest"]["temperature"] == 22.0
+    assert len(body["series"]["points"]) == 3
+    assert body["stats"]["count"] == 3
+    assert body["stats"]["temperature"] == {"min": 20.0, "max": 24.0, "avg": 22.0}
+    assert body["stats"]["obstacle_ratio"] == round(1 / 3, 4)
+    assert sum(day["count"] for day in body["daily_counts"]) == 4
+
+    assert client.get("/api/v1/sensor/dashboard", params={"points": 0}, headers=headers).status_code == 400
+
+def test_dashboard_snapshot_skips_null_metrics(test_db, test_user):
+    """Test that NULL temperatures and humidities are left out of the series and statistics"""
+    from datetime import datetime, timedelta
+    from app.core.dashboard import dashboard_snapshot
+    from app.models.sensor import SensorData
+
+    now = datetime.utcnow()
+    for age, temperature, humidity in [(timedelta(hours=3), 20.0, None), (timedelta(hours=1), 24.0, 40.0), (timedelta(minutes=59), None, 60.0)]:
+        test_db.add(SensorData(user_id=test_user["id"], temperature=temperature, humidity=humidity, obstacle=False, timestamp=now - age))
+    test_db.commit()
+
+    snapshot = dashboard_snapshot(test_db, test_user["id"], points=24, now=now)
+    points = snapshot["series"]["points"]
+    assert [point["humidity"] for point in points] == [None, 50.0]
+    assert [point["temperature"] for point in points] == [20.0, 24.0]
+    assert snapshot["stats"]["count"] == 3
+    assert snapshot["stats"]["temperature"] == {"min": 20.0, "max": 24.0, "avg": 22.0}
+    assert snapshot["stats"]["humidity"] == {"min": 40.0, "max": 60.0, "avg": 50.0}
+
+    test_db.query(SensorData).update({SensorData.humidity: None})
+    test_db.commit()
+    assert dashboard_snapshot(test_db, test_user["id"], points=24, now=now)["stats"]["humidity"] is None
+
+def test_sensor_data_pages_cached_until_ingest(client, token, test_db, test_user, monkeypatch):
+    """Test that repeated pages are served from the response cache and ingest invalidates them"""
+    import json
+    from app.api.v1.endpoints import sensor as sensor_endpoints
+    from app.core.response_cache import ResponseCache
+    from app.core.websocket import ConnectionManager
+    from app.models.sensor import SensorData
+
+    cache = ResponseCache()
+    monkeypatch.setattr(sensor_endpoints, "response_cache", cache)
+    monkeypatch.setattr(sensor_endpoints, "manager", ConnectionManager())
+    headers = {"Authorization": f"Bearer {token}"}
+    test_db.add(SensorData(user_id=test_user["id"], temperature=20.0, humidity=50.0, obstacle=False))
+    test_db.commit()
+
+    first = client.get("/api/v1/sensor/data", headers=headers)
+    second = client.get("/api/v1/sensor/data", headers=headers)
+    assert first.content == second.content
+    assert second.json()["pagination"]["total_count"] == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    device = client.post("/api/v1/sensor/devices", json={"name": "office"}, headers=headers).json()
+    with client.websocket_connect(f"/api/v1/sensor/ws?token={token}&gateway=true") as websocket:
+        websocket.receive_text()
+        websocket.send_text(json.dumps({"type": "readings", "readings": [{"device_id": device["id"], "seq": 1, "temperature": 25.0, "humidity": 40.0}]}))
+        assert json.loads(websocket.receive_text())["acks"][0]["count"] == 1
+
+    third = client.get("/api/v1/sensor/data", headers=headers)
+    assert third.json()["pagination"]["total_count"] == 2
+    assert cache.stats()["invalidations"] == 1
+
+def test_accept_encoding_q_values():
+    """Test that gzip is only used when the client's Accept-Encoding allows it"""
+    from app.core.day_archive import accepts_gzip
+
+    assert accepts_gzip("gzip, deflate, br")
+    assert accepts_gzip("br;q=1.0, gzip;q=0.5")
+    assert accepts_gzip("*")
+    assert not accepts_gzip("gzip;q=0")
+    assert not accepts_gzip("GZIP; q=0.000, *")
+    assert not accepts_gzip("identity")
+    assert not accepts_gzip("")
+
+def test_history_days_served_from_disk_once_complete(client, token, test_db, test_user, monkeypatch, tmp_path):
+    """Test that a past day is archived to a gzipped file once and today is read live"""
+    from datetime import datetime
+    from app.api.v1.endpoints import sensor as sensor_endpoints
+    from app.core.day_archive import DayArchive
+    from app.models.sensor import SensorData
+
+    archive = DayArchive(str(tmp_path))
+    monkeypatch.setattr(sensor_endpoints, "day_archive", archive)
+    headers = {"Authorization": f"Bearer {token}"}
+    for hour in (9, 15):
+        test_db.add(SensorData(user_id=test_user["id"], temperature=20.0 + hour, humidity=50.0, obstacle=False, timestamp=datetime(2026, 1, 1, hour)))
+    test_db.add(SensorData(user_id=test_user["id"], temperature=30.0, humidity=50.0, obstacle=False, timestamp=datetime(2026, 1, 2, 0, 0, 1)))
+    test_db.commit()
+
+    for _ in range(2):
+        response = client.get("/api/v1/sensor/history/2026-01-01", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "private, max-age=31536000, immutable"
+        assert response.headers["content-encoding"] == "gzip"
+        assert [reading["temperature"] for reading in response.json()["data"]] == [29.0, 35.0]
+    assert (archive.materialized, archive.file_hits) == (1, 1)
+
+    # An explicit q=0 refuses gzip, so the file is decompressed for this client
+    response = client.get("/api/v1/sensor/history/2026-01-01", headers={**headers, "Accept-Encoding": "gzip;q=0, identity"})
+    assert "content-encoding" not in response.headers
+    assert response.json()["count"] == 2
+
+    # Empty days are not written to disk
+    assert client.get("/api/v1/sensor/history/2025-06-01", headers=headers).json()["count"] == 0
+    assert archive.materialized == 1
+
+    today = datetime.utcnow().date().isoformat()
+    response = client.get(f"/api/v1/sensor/history/{today}", headers=headers)
+    assert response.headers["cache-control"] == "no-cache"
+    assert archive.live_queries == 1
+
+    assert client.get("/api/v1/sensor/history/yesterday", headers=headers).status_code == 400
+
+def test_identical_concurrent_reads_share_one_query(client, token, test_db, test_user, monkeypatch):
+    """Test that concurrent identical reads are coalesced into one query and later reads run their own"""
+    import asyncio
+    import threading
+    from app.api.v1.endpoints import sensor as sensor_endpoints
+    from app.core.single_flight import SingleFlight
+
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow_query(value):
+        calls.append(value)
+        release.wait(5)
+        return value * 2
+
+    async def burst():
+        waiters = [asyncio.ensure_future(flights.run("latest", (1, 0), slow_query, 21)) for _ in range(5)]
+        other = asyncio.ensure_future(flights.run("latest", (2, 0), slow_query, 1))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*waiters), await other
+
+    results, other = asyncio.run(burst())
+    assert results == [42] * 5 and other == 2
+    assert sorted(calls) == [1, 21]
+    stats = flights.stats()
+    assert stats["in_flight"] == 0
+    assert stats["latest"] == {"requests": 6, "queries": 2, "coalesced": 4, "coalescing_ratio": 0.6667}
+
+    # The endpoints go through the shared flights
+    monkeypatch.setattr(sensor_endpoints, "single_flight", flights)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/v1/sensor/data/latest", headers=headers).status_code == 200
+    assert client.get("/api/v1/sensor/data", headers=headers).status_code == 200
+    assert client.get("/api/v1/sensor/data", params={"page": 2}, headers=headers).status_code == 200
+    assert flights.stats()["latest"]["requests"] == 7
+    assert flights.stats()["data"]["requests"] == 1
+
+def test_serializers_encode_rows_alike():
+    """Test that orjson and the stdlib fallback produce the same JSON for reading rows"""
+    import json
+    from datetime import datetime
+    from decimal import Decimal
+    from app.core import serialization
+
+    rows = [
+        serialization.ReadingRow.from_row((1, 21.5, Decimal("40.25"), 0, 7, datetime(2026, 1, 2, 3, 4, 5, 123456), 3)),
+        serialization.ReadingRow.from_row((2, None, None, None, 7, "2026-01-02 03:04:06")),
+    ]
+    expected = [
+        {"id": 1, "temperature": 21.5, "humidity": 40.25, "obstacle": False, "user_id": 7, "timestamp": "2026-01-02T03:04:05.123456", "device_id": 3},
+        {"id": 2, "temperature": 0.0, "humidity": 0.0, "obstacle": False, "user_id": 7, "timestamp": "2026-01-02 03:04:06", "device_id": None},
+    ]
+    content = {"data": rows, "at": datetime(2026, 1, 2), 5: "non-string key"}
+    stdlib = serialization.StdlibSerializer().dumps(content)
+    assert json.loads(stdlib) == {"data": expected, "at": "2026-01-02T00:00:00", "5": "non-string key"}
+    if serialization.orjson is not None:
+        assert serialization.OrjsonSerializer().dumps(content) == stdlib
+    assert serialization.get_serializer("json").name == "json"
+
+def test_large_pages_rendered_by_database_match_row_path(client, token, test_db, test_user):
+    """Test that a page rendered as JSON in SQL has the same content as one built from rows"""
+    from datetime import datetime, timedelta
+    from app.core.page_json import SENSOR_PAGE_SQL_JSON_MIN
+    from app.models.sensor import SensorData
+
+    start = datetime(2026, 3, 1)
+    for i in range(12):
+        test_db.add(SensorData(user_id=test_user["id"], temperature=20.0 + i / 4, humidity=None if i == 3 else 50.0,
+                               obstacle=None if i == 5 else i % 2 == 0, timestamp=start + timedelta(minutes=i, microseconds=i)))
+    test_db.commit()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    rows = client.get("/api/v1/sensor/data", params={"page_size": 12}, headers=headers).json()
+    rendered = client.get("/api/v1/sensor/data", params={"page_size": SENSOR_PAGE_SQL_JSON_MIN}, headers=headers).json()
+    assert rendered["data"] == rows["data"]
+    assert len(rendered["data"]) == 12 and rendered["data"][8]["humidity"] == 0.0 and rendered["data"][6]["obstacle"] is False
+    assert rendered["pagination"] == {"page": 1, "page_size": SENSOR_PAGE_SQL_JSON_MIN, "total_count": 12,
+                                      "total_pages": 1, "has_next": False, "has_prev": False}
+
+    empty = client.get("/api/v1/sensor/data", params={"page_size": SENSOR_PAGE_SQL_JSON_MIN, "page": 2}, headers=headers).json()
+    assert empty["data"] == [] and empty["pagination"]["has_prev"] is True
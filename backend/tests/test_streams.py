@@ -0,0 +1,66 @@
+import asyncio
+
+from app.core.streams import StreamHub, format_event
+
+def reading(i):
+    return {"id": i, "temperature": 25.0, "humidity": 60.0, "obstacle": False, "user_id": 1}
+
+def test_publish_shares_one_encoded_event():
+    """Every stream for a user gets the same encoded bytes"""
+    async def run():
+        hub = StreamHub(queue_size=10, keepalive_interval=60)
+        first, second = hub.subscribe(1), hub.subscribe(1)
+        other_user = hub.subscribe(2)
+        hub.publish(reading(7), 1)
+        return first.get_nowait(), second.get_nowait(), other_user.empty()
+
+    first, second, other_empty = asyncio.run(run())
+
+    assert first == (7, format_event(reading(7)))
+    assert first[1] is second[1]
+    assert other_empty
+    assert first[1].startswith(b"id: 7\nevent: reading\ndata: ")
+
+def test_slow_stream_drops_oldest_events():
+    async def run():
+        hub = StreamHub(queue_size=2, keepalive_interval=60)
+        queue = hub.subscribe(1)
+        for i in range(1, 5):
+            hub.publish(reading(i), 1)
+        hub.unsubscribe(1, queue)
+        return [queue.get_nowait()[0] for _ in range(queue.qsize())], hub
+
+    ids, hub = asyncio.run(run())
+
+    assert ids == [3, 4]
+    assert hub.dropped_events == 2
+    assert hub.listener_count == 0
+
+def test_stream_requires_authentication(client):
+    response = client.get("/api/v1/sensor/stream")
+    assert response.status_code == 401
+
+def test_stream_releases_queue_when_closed(monkeypatch, test_db, token):
+    """Closing the event stream, as a disconnect does, unsubscribes its queue"""
+    from starlette.requests import Request
+    from app.api.v1.endpoints import sensor as sensor_endpoints
+
+    hub = StreamHub(queue_size=10, keepalive_interval=60)
+    monkeypatch.setattr(sensor_endpoints, "streams", hub)
+    request = Request({
+        "type": "http", "method": "GET", "path": "/api/v1/sensor/stream", "query_string": b"",
+        "headers": [(b"authorization", f"Bearer {token}".encode())]
+    })
+
+    async def run():
+        response = await sensor_endpoints.stream_sensor_data(request, db=test_db)
+        first = await response.body_iterator.__anext__()
+        open_streams = hub.listener_count
+        await response.body_iterator.aclose()
+        return first, open_streams
+
+    first, open_streams = asyncio.run(run())
+
+    assert first == b"retry: 5000\n\n"
+    assert open_streams == 1
+    assert hub.listener_count == 0
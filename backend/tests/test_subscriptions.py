@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+
+from app.core.websocket import ConnectionManager
+from tests.conftest import FakeWebSocket
+
+def make_manager(*connections, user_id=1):
+    manager = ConnectionManager()
+    manager.active_connections[user_id] = list(connections)
+    return manager
+
+def reading(i, temperature=25.0, humidity=60.0, obstacle=False):
+    return {"id": i, "temperature": temperature, "humidity": humidity, "obstacle": obstacle, "user_id": 1}
+
+def test_throttled_viewer_only_gets_newest_reading():
+    """Readings arriving between ticks are coalesced into the newest one"""
+    device, viewer = FakeWebSocket(), FakeWebSocket()
+    manager = make_manager(device, viewer)
+    manager.subscribe(viewer, max_rate=1)
+
+    async def run():
+        for i in range(1, 6):
+            await manager.broadcast_reading(reading(i, temperature=20.0 + i), 1)
+        await manager.flush_subscriptions(now=100.0)
+        # Still inside the 1 second window, so nothing more is sent
+        await manager.broadcast_reading(reading(6, temperature=30.0), 1)
+        await manager.flush_subscriptions(now=100.5)
+        assert [m["id"] for m in viewer.sent] == [5]
+        await manager.flush_subscriptions(now=101.0)
+
+    asyncio.run(run())
+
+    assert [m["id"] for m in device.sent] == [1, 2, 3, 4, 5, 6]
+    assert [m["id"] for m in viewer.sent] == [5, 6]
+
+def test_deadband_skips_small_changes_but_not_obstacle_changes():
+    """Readings within the deadband of the last sent one are dropped"""
+    viewer = FakeWebSocket()
+    manager = make_manager(viewer)
+    manager.subscribe(viewer, deadband=0.5)
+
+    async def run():
+        for i, (temperature, obstacle) in enumerate([(25.0, False), (25.3, False), (25.4, True), (26.0, True)], start=1):
+            await manager.broadcast_reading(reading(i, temperature=temperature, obstacle=obstacle), 1)
+            await manager.flush_subscriptions(now=float(i))
+
+    asyncio.run(run())
+
+    assert [m["id"] for m in viewer.sent] == [1, 3, 4]
+
+def test_subscribe_rejects_invalid_rate():
+    manager = ConnectionManager()
+    with pytest.raises(ValueError):
+        manager.subscribe(FakeWebSocket(), max_rate=-1)
+
+def test_device_reading_only_reaches_that_device_channel():
+    """Connections scoped to one device never see another device's readings"""
+    user_wide, kitchen_viewer, garage_viewer = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    manager = make_manager(user_wide)
+    manager.device_connections = {10: [kitchen_viewer], 20: [garage_viewer]}
+    manager.connection_devices = {kitchen_viewer: 10, garage_viewer: 20}
+
+    asyncio.run(manager.broadcast_reading(dict(reading(1), device_id=10), 1))
+
+    assert [m["id"] for m in user_wide.sent] == [1]
+    assert [m["id"] for m in kitchen_viewer.sent] == [1]
+    assert garage_viewer.sent == []
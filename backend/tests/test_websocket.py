@@ -53,3 +53,274 @@ def test_websocket_invalid_json(client, token):
         # Check the response
         assert response_data["status"] == "error"
         assert response_data["message"] == "Invalid JSON data"
+
+def test_websocket_replays_missed_readings(client, token, test_db, test_user):
+    """Test that since_id replays stored readings before live data"""
+    from app.models.sensor import SensorData
+
+    for temperature in (21.0, 22.0, 23.0):
+        test_db.add(SensorData(temperature=temperature, humidity=50.0, obstacle=False, user_id=test_user["id"]))
+    test_db.commit()
+    first_id = test_db.query(SensorData).order_by(SensorData.id).first().id
+
+    with client.websocket_connect(f"/api/v1/sensor/ws?token={token}&since_id={first_id}") as websocket:
+        assert json.loads(websocket.receive_text())["status"] == "connected"
+
+        page = json.loads(websocket.receive_text())
+        assert page["type"] == "backfill"
+        assert [reading["temperature"] for reading in page["data"]] == [22.0, 23.0]
+
+        done = json.loads(websocket.receive_text())
+        assert done["complete"] is True
+        assert done["count"] == 2
+
+def test_replay_holds_back_readings_broadcast_during_connect():
+    """Test that a reading broadcast while the welcome is sent is held back, not sent live and replayed again"""
+    import asyncio
+    from app.core.websocket import ConnectionManager
+    from tests.conftest import FakeWebSocket
+
+    manager = ConnectionManager()
+    reading = {"id": 5, "temperature": 21.0, "humidity": 50.0, "obstacle": False, "user_id": 1}
+
+    class SlowWelcomeWebSocket(FakeWebSocket):
+        async def accept(self):
+            pass
+
+        async def send_text(self, message):
+            if not self.sent:
+                # Another connection saves a reading while this one is still being welcomed
+                await manager.broadcast_reading(reading, 1)
+            await super().send_text(message)
+
+    websocket = SlowWelcomeWebSocket()
+
+    async def run():
+        await manager.connect(websocket, 1, replay=True)
+        held_back = list(manager.replaying[websocket])
+        # The replay already covered id 5, so releasing the hold-back sends nothing more
+        manager.begin_replay(websocket)
+        await manager.end_replay(websocket, last_replayed_id=5)
+        return held_back
+
+    held_back = asyncio.run(run())
+    manager.heartbeat.unregister(websocket)
+
+    assert [message.get("id") for message in held_back] == [5]
+    assert [message.get("status") for message in websocket.sent] == ["connected"]
+
+def test_websocket_device_token_skips_user_lookup(client, token, monkeypatch):
+    """Test that device tokens authenticate without a DB lookup and stop working once revoked"""
+    from app.api.v1.endpoints import sensor as sensor_endpoints
+
+    headers = {"Authorization": f"Bearer {token}"}
+    device = client.post("/api/v1/sensor/devices", json={"name": "esp32-kitchen"}, headers=headers).json()
+    response = client.post("/api/v1/auth/device-token", json={"device_id": device["id"]}, headers=headers)
+    assert response.status_code == 201
+    device_token = response.json()["device_token"]
+
+    def fail_lookup(*args):
+        raise AssertionError("device tokens should not need a user lookup")
+
+    monkeypatch.setattr(sensor_endpoints, "verify_token", fail_lookup)
+    monkeypatch.setattr(sensor_endpoints, "get_user_by_email", fail_lookup)
+    with client.websocket_connect(f"/api/v1/sensor/ws?device_token={device_token}") as websocket:
+        welcome = json.loads(websocket.receive_text())
+        assert welcome["status"] == "connected"
+        assert welcome["device_id"] == device["id"]
+
+    response = client.post("/api/v1/auth/device-token/revoke", json={"device_token": device_token}, headers=headers)
+    assert response.status_code == 200
+
+    with pytest.raises(WebSocketDisconnect) as excinfo:
+        with client.websocket_connect(f"/api/v1/sensor/ws?device_token={device_token}") as websocket:
+            websocket.receive_text()
+    assert excinfo.value.code == 1008
+
+def test_gateway_batches_readings_and_acks_per_device(client, token, test_db):
+    """Test that one gateway connection stores tagged readings for several devices"""
+    from app.models.sensor import SensorData
+
+    headers = {"Authorization": f"Bearer {token}"}
+    kitchen = client.post("/api/v1/sensor/devices", json={"name": "kitchen"}, headers=headers).json()
+    garage = client.post("/api/v1/sensor/devices", json={"name": "garage"}, headers=headers).json()
+
+    with client.websocket_connect(f"/api/v1/sensor/ws?token={token}&gateway=true") as websocket:
+        assert json.loads(websocket.receive_text())["gateway"] is True
+        websocket.send_text(json.dumps({
+            "type": "readings",
+            "readings": [
+                {"device_id": kitchen["id"], "seq": 1, "temperature": 21.0, "humidity": 50.0, "obstacle": False},
+                {"device_id": kitchen["id"], "seq": 2, "temperature": 21.5, "humidity": 51.0, "obstacle": False},
+                {"device_id": garage["id"], "seq": 7, "temperature": 30.0, "humidity": 40.0, "obstacle": True},
+                {"device_id": 9999, "seq": 8, "temperature": 1.0, "humidity": 1.0}
+            ]
+        }))
+
+        ack = json.loads(websocket.receive_text())
+        assert ack["type"] == "ack"
+        acks = {entry["device_id"]: entry for entry in ack["acks"]}
+        assert acks[kitchen["id"]]["count"] == 2
+        assert acks[kitchen["id"]]["last_seq"] == 2
+        assert acks[garage["id"]]["last_seq"] == 7
+        assert ack["errors"] == [{"device_id": 9999, "seq": 8, "message": "Unknown device"}]
+
+    stored = test_db.query(SensorData).filter(SensorData.device_id == kitchen["id"]).count()
+    assert stored == 2
+
+def test_gateway_skips_readings_within_device_deadband(client, token, test_db, monkeypatch):
+    """Test that readings inside a device's ingest deadband are acked but not stored"""
+    from app.api.v1.endpoints import sensor as sensor_endpoints
+    from app.core.ingest_deadband import IngestDeadband
+    from app.models.sensor import SensorData
+
+    monkeypatch.setattr(sensor_endpoints, "ingest_deadband", IngestDeadband(heartbeat_interval=300))
+    headers = {"Authorization": f"Bearer {token}"}
+    device = client.post("/api/v1/sensor/devices", json={"name": "hallway", "ingest_deadband": 0.5}, headers=headers).json()
+    assert device["ingest_deadband"] == 0.5
+
+    with client.websocket_connect(f"/api/v1/sensor/ws?token={token}&gateway=true") as websocket:
+        websocket.receive_text()
+        websocket.send_text(json.dumps({
+            "type": "readings",
+            "readings": [
+                {"device_id": device["id"], "seq": 1, "temperature": 21.0, "humidity": 50.0, "obstacle": False},
+                {"device_id": device["id"], "seq": 2, "temperature": 21.2, "humidity": 50.3, "obstacle": False},
+                {"device_id": device["id"], "seq": 3, "temperature": 21.4, "humidity": 49.8, "obstacle": False},
+                {"device_id": device["id"], "seq": 4, "temperature": 21.6, "humidity": 50.0, "obstacle": False},
+                {"device_id": device["id"], "seq": 5, "temperature": 21.6, "humidity": 50.0, "obstacle": True}
+            ]
+        }))
+
+        ack = json.loads(websocket.receive_text())["acks"][0]
+        assert ack["count"] == 5
+        assert ack["skipped"] == 2
+        assert ack["last_seq"] == 5
+
+    stored = test_db.query(SensorData).filter(SensorData.device_id == device["id"]).order_by(SensorData.id).all()
+    assert [(row.temperature, row.obstacle) for row in stored] == [(21.0, False), (21.6, False), (21.6, True)]
+
+def test_ingest_records_obstacle_transitions(client, token, test_db, monkeypatch):
+    """Test that only obstacle on/off changes are written to obstacle_events"""
+    from app.core import gateway as gateway_module
+    from app.core.obstacle_events import ObstacleTracker
+    from app.models.obstacle_event import ObstacleEvent
+
+    monkeypatch.setattr(gateway_module, "obstacle_tracker", ObstacleTracker())
+    headers = {"Authorization": f"Bearer {token}"}
+    device = client.post("/api/v1/sensor/devices", json={"name": "porch"}, headers=headers).json()
+
+    with client.websocket_connect(f"/api/v1/sensor/ws?token={token}&gateway=true") as websocket:
+        websocket.receive_text()
+        websocket.send_text(json.dumps({
+            "type": "readings",
+            "readings": [
+                {"device_id": device["id"], "seq": seq, "temperature": 20.0, "humidity": 50.0, "obstacle": obstacle}
+                for seq, obstacle in enumerate([False, True, True, False, True])
+            ]
+        }))
+        websocket.receive_text()
+
+    events = test_db.query(ObstacleEvent).filter(ObstacleEvent.device_id == device["id"]).order_by(ObstacleEvent.id).all()
+    assert len(events) == 2
+    assert events[0].ended_at is not None
+    assert events[1].ended_at is None
+
+def test_silent_devices_come_from_last_seen_times(client, token, test_db, monkeypatch):
+    """Test that devices are listed by how long ago they last sent a reading"""
+    from app.api.v1.endpoints import sensor as sensor_endpoints
+    from app.core.websocket import ConnectionManager
+
+    fresh_manager = ConnectionManager()
+    monkeypatch.setattr(sensor_endpoints, "manager", fresh_manager)
+    headers = {"Authorization": f"Bearer {token}"}
+    reporting = client.post("/api/v1/sensor/devices", json={"name": "kitchen"}, headers=headers).json()
+    never_seen = client.post("/api/v1/sensor/devices", json={"name": "cellar"}, headers=headers).json()
+
+    with client.websocket_connect(f"/api/v1/sensor/ws?token={token}&gateway=true") as websocket:
+        websocket.receive_text()
+        websocket.send_text(json.dumps({
+            "type": "readings",
+            "readings": [{"device_id": reporting["id"], "seq": 1, "temperature": 21.0, "humidity": 50.0}]
+        }))
+        websocket.receive_text()
+
+    response = client.get("/api/v1/sensor/devices/silent", params={"min_silence": 0}, headers=headers)
+    assert response.status_code == 200
+    devices = response.json()["devices"]
+    assert [(device["device_id"], device["name"]) for device in devices] == [(reporting["id"], "kitchen"), (never_seen["id"], "cellar")]
+    assert devices[0]["last_seen"] is not None
+    assert devices[1]["last_seen"] is None
+
+    response = client.get("/api/v1/sensor/devices/silent", params={"min_silence": 3600}, headers=headers)
+    assert [device["device_id"] for device in response.json()["devices"]] == [never_seen["id"]]
+
+def test_ingest_profile_toggles_at_runtime(client, token, test_db, monkeypatch):
+    """Test that only operators can switch ingest profiling, and histograms only fill while it is on"""
+    from app.api.v1.endpoints import metrics as metrics_endpoints
+    from app.api.v1.endpoints import sensor as sensor_endpoints
+    from app.core.ingest_profile import IngestProfiler
+
+    profiler = IngestProfiler(enabled=False)
+    monkeypatch.setattr(sensor_endpoints, "ingest_profile", profiler)
+    monkeypatch.setattr(metrics_endpoints, "ingest_profile", profiler)
+    headers = {"Authorization": f"Bearer {token}"}
+    device = client.post("/api/v1/sensor/devices", json={"name": "kitchen"}, headers=headers).json()
+
+    def send_reading(websocket, seq):
+        websocket.send_text(json.dumps({
+            "type": "readings",
+            "readings": [{"device_id": device["id"], "seq": seq, "temperature": 20.0 + seq, "humidity": 50.0}]
+        }))
+        assert json.loads(websocket.receive_text())["acks"][0]["count"] == 1
+
+    with client.websocket_connect(f"/api/v1/sensor/ws?token={token}&gateway=true") as websocket:
+        websocket.receive_text()
+        send_reading(websocket, 1)
+        assert profiler.stages == {}
+
+        response = client.put("/api/v1/metrics/ingest-profile", params={"enabled": True}, headers=headers)
+        assert response.status_code == 403
+        assert profiler.enabled is False
+
+        monkeypatch.setattr(metrics_endpoints, "INGEST_PROFILE_ADMINS", frozenset({"testuser"}))
+        response = client.put("/api/v1/metrics/ingest-profile", params={"enabled": True}, headers=headers)
+        assert response.json()["enabled"] is True
+        send_reading(websocket, 2)
+        send_reading(websocket, 3)
+        websocket.send_text(json.dumps({"type": "ping"}))
+        websocket.receive_text()
+
+    stages = client.get("/api/v1/metrics/ingest-profile", headers=headers).json()["stages"]
+    assert {"parse", "log", "gateway", "control", "ping"} <= set(stages)
+    assert stages["gateway"]["count"] == 2
+    assert sum(stages["gateway"]["buckets"].values()) == 2
+    assert stages["gateway"]["p50_us"] <= stages["gateway"]["max_us"]
+
+    response = client.put("/api/v1/metrics/ingest-profile", params={"enabled": False, "reset": True}, headers=headers)
+    assert response.json() == {"enabled": False, "enabled_at": response.json()["enabled_at"], "stages": {}}
+
+def test_gateway_ingest_releases_sampling_when_fan_out_fails(client, token, test_db, monkeypatch):
+    """Test that a failing alert evaluation doesn't leave readings counted as in flight"""
+    from app.api.v1.endpoints import sensor as sensor_endpoints
+    from app.core.sampling import AdaptiveSampling
+
+    sampling = AdaptiveSampling()
+    monkeypatch.setattr(sensor_endpoints, "sampling", sampling)
+
+    async def failing_alerts(reading):
+        raise RuntimeError("alert evaluation failed")
+
+    monkeypatch.setattr(sensor_endpoints, "_evaluate_alert_rules", failing_alerts)
+    headers = {"Authorization": f"Bearer {token}"}
+    device = client.post("/api/v1/sensor/devices", json={"name": "kitchen"}, headers=headers).json()
+
+    with client.websocket_connect(f"/api/v1/sensor/ws?token={token}&gateway=true") as websocket:
+        websocket.receive_text()
+        websocket.send_text(json.dumps({
+            "type": "readings",
+            "readings": [{"device_id": device["id"], "seq": 1, "temperature": 21.0, "humidity": 50.0}]
+        }))
+        assert json.loads(websocket.receive_text())["status"] == "error"
+
+    assert sampling.in_flight == 0